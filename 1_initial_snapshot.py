@@ -1,48 +1,33 @@
-from vmbpy import *
+import simulation
+simulation.install()  # ACQ_SIMULATE=all runs the script without hardware
+from acquisition import AcquisitionEngine
+from camera_stream import CameraStream
+from device_loader import lazy_labjack, lazy_vimba, start_all
+from write_behind import WriteBehindQueue
 # from avaspec import *
 import sys, time, signal
-import cv2
-from labjack import ljm
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QSizePolicy
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QSizePolicy
+from live_plots import HistogramCanvas
+from frame_view import FrameView
 
 
 '''
 LabJack (send 5V instead of acquiring temp.) 
 '''
 
-handle = ljm.openS("ANY", "USB", "ANY") #Connect to LabJack
 TRIG_LINE = "FIO4"
 
-# start in input mode
-ljm.eWriteName(handle, TRIG_LINE, 0)   # 0 = input/high-Z
+# opened in the background once the window is up; the trigger line starts
+# in input mode
+lj_device = lazy_labjack(idle_low=[TRIG_LINE])   # 0 = input/high-Z
+vimba_device = lazy_vimba()
 
 
 '''
 Allied Vision Camera Functions
 '''
 
-class HistogramCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=4, height=3, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super().__init__(fig)
-        self.setParent(parent)
-
-    def plot_histogram(self, img):
-        self.axes.clear()
-        color_labels = ('b', 'g', 'r')
-        for i, color in enumerate(color_labels):
-            hist = cv2.calcHist([img], [i], None, [256], [0, 256])
-            self.axes.plot(hist, color=color)
-        self.axes.set_xlim([0, 256])
-        self.axes.set_title("RGB Histogram")
-        self.draw()
-
-
 class CameraApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -50,14 +35,18 @@ class CameraApp(QWidget):
 
         self.vimba = None
         self.cam = None
+        self.stream = None
+        # all camera calls run on this thread
+        self.engine = AcquisitionEngine(self)
+        # snapshots are written on a background thread
+        self.writer = WriteBehindQueue(on_error=lambda message: print(f"Error saving {message}"))
 
         # UI Elements
         self.init_button = QPushButton("Initialize Camera")
         self.snap_button = QPushButton("Take Snapshot")
         self.snap_button.setEnabled(False)
 
-        self.image_label = QLabel("No Image")
-        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label = FrameView("No Image")
         self.image_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         self.hist_canvas = HistogramCanvas(self, width=5, height=3)
@@ -75,76 +64,75 @@ class CameraApp(QWidget):
         self.snap_button.clicked.connect(self.take_snapshot)
 
     def initialize_camera(self):
-        try:
-            self.vimba = VmbSystem.get_instance()
-            self.vimba.__enter__()
-            cams = self.vimba.get_all_cameras()
-            if not cams:
-                self.image_label.setText("No cameras found!")
-                return
-            self.cam = cams[0]
-            self.cam.__enter__()
-
-            # Set pixel format BEFORE grabbing images
-            supported_formats = self.cam.get_pixel_formats()
-            if PixelFormat.Mono8 in supported_formats:
-                self.cam.set_pixel_format(PixelFormat.Mono8)
-            else:
-                self.image_label.setText("No supported pixel format (BGR8/Mono8) found.")
-                return
-
-            self.image_label.setText("Camera initialized!")
-            self.snap_button.setEnabled(True)
-
-        except Exception as e:
-            self.image_label.setText(f"Error initializing camera:\n{e}")
+        self.engine.submit(
+            self._open_camera,
+            on_result=self._on_camera_initialized,
+            on_error=lambda e: self.image_label.setText(f"Error initializing camera:\n{e}"))
+
+    def _open_camera(self):
+        # runs on the acquisition thread; waits for the background open
+        from vmbpy import PixelFormat
+        self.vimba = vimba_device.get()
+        cams = self.vimba.get_all_cameras()
+        if not cams:
+            raise RuntimeError("No cameras found!")
+        self.cam = cams[0]
+        self.cam.__enter__()
+
+        # Set pixel format BEFORE grabbing images
+        supported_formats = self.cam.get_pixel_formats()
+        if PixelFormat.Mono8 in supported_formats:
+            self.cam.set_pixel_format(PixelFormat.Mono8)
+        else:
+            raise RuntimeError("No supported pixel format (BGR8/Mono8) found.")
+
+        # trigger features are set once; the camera streams until close
+        self.stream = CameraStream(self.cam, trigger_source="Software")
+        self.stream.start()
+
+    def _on_camera_initialized(self, _):
+        self.image_label.setText("Camera initialized!")
+        self.snap_button.setEnabled(True)
 
     def take_snapshot(self):
         if not self.cam:
             self.image_label.setText("Camera not initialized!")
             return
 
-        try:
-            # === Configure Camera for Trigger Mode ===
-            self.cam.TriggerSource.set('Software')
-            self.cam.TriggerSelector.set('FrameStart')
-            self.cam.TriggerMode.set('On')
-            self.cam.AcquisitionMode.set('Continuous')
-            
-            def handler(cam: Camera, stream: Stream, frame: Frame):
-                print("Frame acquired.")
-                frame.convert_pixel_format(PixelFormat.Mono8)
-                image = frame.as_opencv_image()
-
-                # Save image
-                cv2.imwrite('frame.jpg', image)
-
-                # Convert to RGB and display
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-                h, w, ch = image_rgb.shape
-                bytes_per_line = 3 * w
-                q_img = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(q_img)
-                self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio))
-
-                self.hist_canvas.plot_histogram(image_rgb)
+        self.engine.submit(
+            self._capture_snapshot,
+            on_result=self.show_snapshot,
+            on_error=lambda e: self.image_label.setText(f"Error capturing snapshot:\n{e}"))
 
-                # Safely stop streaming after this callback exits
-                QTimer.singleShot(0, lambda: cam.stop_streaming())
+    def _capture_snapshot(self):
+        # runs on the acquisition thread
+        # === Trigger and wait for the frame ===
+        seq = self.stream.trigger_software()
+        _, _, view = self.stream.next_frame(seq, timeout=2.0)
+        print("Frame acquired.")
+        # the saver and the display read the image later, so they share
+        # one copy out of the pool
+        image = view.copy()
 
-            # === Start Streaming and Trigger ===
-            self.cam.start_streaming(handler)
+        # Save image; returns straight away
+        self.writer.save_image('frame.jpg', image, copy=False)
+        return image
 
-            time.sleep(0.0001)               # 100 µs delay
-            self.cam.TriggerSoftware.run()   # Software trigger to camera
-            self.image_label.setText("Snapshot taken 100μs after trigger.")
+    def show_snapshot(self, image):
+        self.image_label.show_image(image)
 
+        self.hist_canvas.plot_histogram(image)
 
-        except Exception as e:
-            self.image_label.setText(f"Error capturing snapshot:\n{e}")
-
-    def closeEvent(self, event):
+    def _close_camera(self):
+        # runs on the acquisition thread, which owns the camera
         try:
+            if self.stream:
+                try:
+                    self.stream.stop()
+                    self.stream = None
+                except Exception as stream_err:
+                    print(f"Error stopping camera stream: {stream_err}")
+
             if self.cam:
                 try:
                     self.cam.__exit__(None, None, None)
@@ -154,7 +142,7 @@ class CameraApp(QWidget):
 
             if self.vimba:
                 try:
-                    self.vimba.__exit__(None, None, None)
+                    vimba_device.close()
                     self.vimba = None
                 except Exception as vimba_err:
                     print(f"Error closing Vimba system: {vimba_err}")
@@ -162,6 +150,14 @@ class CameraApp(QWidget):
         except Exception as e:
             print(f"Unhandled error in closeEvent: {e}")
 
+    def closeEvent(self, event):
+        self.engine.submit(self._close_camera)
+        self.engine.close()
+        try:
+            self.writer.close()
+        except Exception as e:
+            print(f"Error flushing saved images: {e}")
+
         event.accept()
 
 class MainApp(QWidget):
@@ -182,7 +178,7 @@ class MainApp(QWidget):
     def closeEvent(self, event):
         # Close LabJack
         self.camera_app.close()
-        ljm.close(handle)
+        lj_device.close()
         event.accept()
 
 if __name__ == "__main__":
@@ -190,4 +186,5 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # Ctrl+C handling
     win = MainApp()
     win.show()
+    start_all(lj_device, vimba_device)
     sys.exit(app.exec_())
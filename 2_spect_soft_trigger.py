@@ -1,171 +1,50 @@
-from vmbpy import *
-from avaspec import *
+import simulation
+simulation.install()  # ACQ_SIMULATE=all runs the script without hardware
+from spectrometer import SpectrometerSession
+from acquisition import AcquisitionEngine
+from camera_profile import load_profile, forget_camera
+from camera_stream import CameraStream
+from spectrum_storage import DataSaver
+from write_behind import WriteBehindQueue
+from labjack_trigger import PulseTrigger
+from device_loader import LazyDevice, lazy_labjack, lazy_spectrometer_library, lazy_vimba, start_all
 import sys, time, signal
-import cv2
-from labjack import ljm
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QObject
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QSizePolicy, QHBoxLayout, QTextEdit, QVBoxLayout, QMainWindow
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QSizePolicy, QHBoxLayout, QTextEdit, QVBoxLayout, QMainWindow
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import csv
-from datetime import datetime
+from live_plots import HistogramCanvas, SpectrumCanvas
+from frame_view import FrameView
 
 
 '''
 LabJack (send 5V instead of acquiring temp.) 
 '''
 
-handle = ljm.openS("ANY", "USB", "ANY") #Connect to LabJack
 TRIG_LINE = "FIO4"
 
-# start in input mode
-ljm.eWriteName(handle, TRIG_LINE, 0)   # 0 = input/high-Z
+# opened in the background once the window is up, or on first use; the line
+# idles low and the pulse width is timed on the LabJack
+lj_device = lazy_labjack()
+trigger = LazyDevice("trigger", lambda: PulseTrigger(lj_device.get(), TRIG_LINE), PulseTrigger.close)
+vimba_device = lazy_vimba()
+avs_library = lazy_spectrometer_library()
 
 def send_trigger(pulse_us=100):
     """
-    drive input low for pulse_us microseconds, then release it so the 5V pull-up resistor 
-    returns the line to logic-high
+    drive the line high for pulse_us microseconds in a single LabJack command
     """
-    ljm.eWriteName(handle, TRIG_LINE, 1)   # output mode
-    ljm.eWriteName(handle, TRIG_LINE, 0)    # drive low
-    time.sleep(pulse_us / 1_000_000)
-    ljm.eWriteName(handle, TRIG_LINE, 0)   # back to input
-    print("5V trigger sent")
+    event = trigger.get().fire(width_us=pulse_us)
+    print(f"5V trigger sent ({event.latency * 1e3:.2f} ms command latency)")
 
 
-'''
-Avantas spectrometer
-'''
-
-# class SpectrometerWorker(QObject):
-#     finished = pyqtSignal()
-#     result = pyqtSignal(object, object, object, object)
-#     error = pyqtSignal(str)
-
-#     def __init__(self, int_time, int_delay, num_ave, num_scans):
-#         super().__init__()
-#         self.int_time = int_time
-#         self.int_delay = int_delay
-#         self.num_ave = num_ave
-#         self.num_scans = num_scans
-
-#     def run(self):
-#         try:
-#             # Setup with hardware trigger
-#             trig_mode = 0   # hardware = 1, software = 0
-#             wavelength_calibration, handle, pixels, measconfig = avantes_init(
-#                 self.int_time, self.int_delay, self.num_ave, trig_mode
-#             )
-
-#             AVS_PrepareMeasure(handle, measconfig)
-
-#             send_trigger(pulse_us=100)
-
-#             AVS_Measure(handle, -1, self.num_scans)
-
-#             for i in range(self.num_scans):
-#                 while not AVS_PollScan(handle):
-#                     time.sleep(0.001)
-
-#             ret_arr, timestamp_arr, spectra_data_arr, wavelengths = avantes_readout(
-#                 pixels, wavelength_calibration, self.num_scans, handle, self.int_time
-#             )
-
-#             self.result.emit(ret_arr, timestamp_arr, spectra_data_arr, wavelengths)
-#         except Exception as e:
-#             self.error.emit(str(e))
-#         finally:
-#             self.finished.emit()
-def avantes_init(int_time, int_delay, num_ave, trig_mode):
-    AVS_Init(0)
-    device_list = AVS_GetList()[0]
-    handle = AVS_Activate(device_list)
-    info = AVS_GetParameter(handle)
-    pixels = info.m_Detector_m_NrPixels
-    wavelength_calibration = AVS_GetLambda(handle)
-    measconfig = MeasConfigType()
-
-    measconfig.m_StartPixel = 0
-    measconfig.m_StopPixel = pixels - 1
-    measconfig.m_IntegrationTime = int_time
-    measconfig.m_IntegrationDelay = int_delay
-    measconfig.m_NrAverages = num_ave
-    measconfig.m_CorDynDark_m_Enable = 0
-    measconfig.m_CorDynDark_m_ForgetPercentage = 100
-    measconfig.m_Smoothing_m_SmoothPix = 0
-    measconfig.m_Smoothing_m_SmoothModel = 0
-    measconfig.m_SaturationDetection = 0
-    measconfig.m_Trigger_m_Mode = trig_mode
-    measconfig.m_Trigger_m_Source = 0
-    measconfig.m_Trigger_m_SourceType = 0
-    measconfig.m_Control_m_StrobeControl = 0
-    measconfig.m_Control_m_LaserDelay = 0
-    measconfig.m_Control_m_LaserWidth = 0
-    measconfig.m_Control_m_LaserWaveLength = 0.0
-    measconfig.m_Control_m_StoreToRam = 0
-
-    return wavelength_calibration, handle, pixels, measconfig
-
-def avantes_measure(handle, measconfig, num_scans):
-    AVS_PrepareMeasure(handle, measconfig)
-    AVS_Measure(handle, -2, num_scans)
-
-def avantes_readout(pixels, wavelength_calibration, spec_num_scans, handle, spec_int_time):
-    wavelengths = []
-    for pixel in range(pixels):
-        wavelengths.append(wavelength_calibration[pixel])
-
-    ret_arr = []
-    timestamp_arr = []
-    spectra_data_arr = []
-
-    for i in range(spec_num_scans):
-        # check if the data is collected
-        dataready = False
-        m = 0
-        while not dataready:
-            # check if data is ready
-            dataready = AVS_PollScan(handle)
-            #print(dataready)
-            # sleep and then check again
-            time.sleep(spec_int_time / 1000)
-
-        # get the scope data
-        ret_arr.append(AVS_GetScopeData(handle))
-        #print("ret_arr", ret_arr)
-    for i in range(len(ret_arr)):
-        timestamp_arr.append(ret_arr[i][0])
-        spectra_data = []
-        for j, pix in enumerate(wavelengths):
-            spectra_data.append(ret_arr[i][1][j])
-        spectra_data_arr.append(spectra_data)
-        #print(len(spectra_data))
-        #print(spectra_data)
-    return ret_arr, timestamp_arr, spectra_data_arr, wavelengths
-
 '''
 Allied Vision Camera Functions
 '''
 
-class HistogramCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=4, height=3, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super().__init__(fig)
-        self.setParent(parent)
-
-    def plot_histogram(self, img):
-        self.axes.clear()
-        color_labels = ('b', 'g', 'r')
-        for i, color in enumerate(color_labels):
-            hist = cv2.calcHist([img], [i], None, [256], [0, 256])
-            self.axes.plot(hist, color=color)
-        self.axes.set_xlim([0, 256])
-        self.axes.set_title("RGB Histogram")
-        self.draw()
-
 class CameraApp(QWidget):
+    storage_error = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Vimba Camera Snapshot GUI")
@@ -175,12 +54,26 @@ class CameraApp(QWidget):
 
         self.vimba = None
         self.cam = None
+        self.stream = None
+        # saved under camera_profiles/<name>.json, or the built-in one
+        self.camera_profile = load_profile("software_trigger")
         self.spec_initialized = False
 
         self.spec_int_time = 10.0         # milliseconds
         self.spec_int_delay = 0           # milliseconds
         self.spec_num_ave = 1
         self.spec_num_scans = 1
+        # activated once, on the acquisition thread, and kept open until exit
+        self.spectrometer = SpectrometerSession(
+            integration_time=self.spec_int_time, integration_delay=self.spec_int_delay,
+            averages=self.spec_num_ave, trigger_mode=0)
+
+        # all camera and spectrometer calls run on this thread
+        self.engine = AcquisitionEngine(self)
+        self.data_saver = DataSaver()
+        # images and spectra are written on a background thread
+        self.writer = WriteBehindQueue(on_error=self.storage_error.emit)
+        self.storage_error.connect(lambda message: self.log(f"Error saving {message}"))
 
         # UI Elements
         self.init_camera_button = QPushButton("Initialize Camera")
@@ -191,13 +84,11 @@ class CameraApp(QWidget):
         self.btn_measure = QPushButton("Single Trigger Measure")
         self.btn_measure.clicked.connect(self.single_trigger_measurement)
 
-        self.snapshot_label = QLabel("No Image")
-        self.snapshot_label.setAlignment(Qt.AlignCenter)
+        self.snapshot_label = FrameView("No Image")
         self.snapshot_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         self.hist_canvas = HistogramCanvas(self, width=4, height=2)
-        self.spectrum_canvas = FigureCanvas(Figure(figsize=(4, 2)))
-        self.spectrum_axes = self.spectrum_canvas.figure.add_subplot(111)
+        self.spectrum_canvas = SpectrumCanvas(self, width=4, height=2, title="Single Software Trigger Spectrum")
 
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
@@ -231,54 +122,51 @@ class CameraApp(QWidget):
         print(message)
         self.log_output.append(message)
 
-    def save_spectral_data(self, wavelengths, intensities, filename_prefix="spectrum"):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_prefix}_{timestamp}.csv"
-        try:
-            with open(filename, mode="w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["Wavelength (nm)", "Intensity"])
-                for wl, intensity in zip(wavelengths, intensities):
-                    writer.writerow([wl, intensity])
-            self.log(f"Spectral data saved to {filename}")
-        except Exception as e:
-            self.log(f"Error saving spectral data: {e}")
+    def save_spectral_data(self, wavelengths, intensities, timestamp=0):
+        # returns straight away; failures are reported through storage_error
+        return self.writer.save_spectrum(self.data_saver, wavelengths, intensities, timestamp)
 
     def initialize_spectrometer(self):
-        try:
-            # Use software trigger = 0 here
-            _, self.avs_handle, _, self.measconfig = avantes_init(
-                self.spec_int_time, self.spec_int_delay, self.spec_num_ave, trig_mode=0
-            )
-            self.spec_initialized = True
-            self.log("Spectrometer initialized with software trigger.")
-        except Exception as e:
-            self.log(f"Failed to initialize spectrometer: {e}")
+        self.log("Initializing spectrometer...")
+        # Use software trigger = 0 here
+        self.engine.submit(
+            self.spectrometer.open,
+            on_result=self._on_spectrometer_initialized,
+            on_error=lambda e: self.log(f"Failed to initialize spectrometer: {e}"))
 
-    def initialize_camera(self):
-        try:
-            self.vimba = VmbSystem.get_instance()
-            self.vimba.__enter__()  # enter context manually
-            cams = self.vimba.get_all_cameras()
-            if not cams:
-                self.log("No cameras found!")
-                return
-            self.cam = cams[0]
-            self.cam.__enter__()  # open camera context manually
-
-            # Set pixel format BEFORE grabbing images
-            supported_formats = self.cam.get_pixel_formats()
-            if PixelFormat.Mono8 in supported_formats:
-                self.cam.set_pixel_format(PixelFormat.Mono8)
-            else:
-                self.log("No supported pixel format (BGR8/Mono8) found.")
-                return
-
-            self.log("Camera initialized!")
-            self.snap_button.setEnabled(True)
+    def _on_spectrometer_initialized(self, session):
+        self.spec_initialized = True
+        self.log("Spectrometer initialized with software trigger.")
 
-        except Exception as e:
-            self.log(f"Error initializing camera:\n{e}")
+    def initialize_camera(self):
+        self.log("Initializing camera...")
+        self.engine.submit(
+            self._open_camera,
+            on_result=self._on_camera_initialized,
+            on_error=lambda e: self.log(f"Error initializing camera:\n{e}"))
+
+    def _open_camera(self):
+        # runs on the acquisition thread; waits for the background open
+        from vmbpy import PixelFormat
+        self.vimba = vimba_device.get()
+        cams = self.vimba.get_all_cameras()
+        if not cams:
+            raise RuntimeError("No cameras found!")
+        self.cam = cams[0]
+        self.cam.__enter__()  # open camera context manually
+
+        # the profile selects Mono8
+        if PixelFormat.Mono8 not in self.cam.get_pixel_formats():
+            raise RuntimeError("No supported pixel format (BGR8/Mono8) found.")
+
+        # trigger source, trigger mode, acquisition mode and pixel format are
+        # written once here, only where they differ from the camera's state;
+        # the camera then streams until close
+        self.stream = CameraStream(self.cam, profile=self.camera_profile).start()
+
+    def _on_camera_initialized(self, _):
+        self.log("Camera initialized!")
+        self.snap_button.setEnabled(True)
 
     def take_snapshot(self):
         if not self.cam:
@@ -288,139 +176,70 @@ class CameraApp(QWidget):
             self.log("Spectrometer not initialized.")
             return
 
-        try:
-            self.log("Sending 5V trigger.")
-            send_trigger(pulse_us=100)
-            time.sleep(0.0001)
-
-            # Trigger settings
-            self.cam.TriggerSource.set("Line1")
-            self.cam.TriggerSelector.set("FrameStart")
-            self.cam.TriggerMode.set("Off")  # or "On" if using HW trigger
-            self.cam.AcquisitionMode.set("SingleFrame")
-
-            # 🔄 NEW: Synchronous capture
-            self.log("Capturing frame from camera...")
-            frame = self.cam.get_frame()
-            frame.convert_pixel_format(PixelFormat.Mono8)
-            image = frame.as_opencv_image()
-
-            # Save and display image
-            cv2.imwrite('frame.jpg', image)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-            h, w, ch = image_rgb.shape
-            bytes_per_line = 3 * w
-            q_img = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_img)
-            self.snapshot_label.setPixmap(
-                pixmap.scaled(
-                    self.snapshot_label.size(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-            )
-
-            self.log("Plotted histogram.")
-            self.hist_canvas.plot_histogram(image_rgb)
-
-            # Proceed to spectrometer
+        self.log("Sending 5V trigger and capturing frame from camera...")
+        self.engine.submit(
+            self._capture_snapshot,
+            on_result=self.show_snapshot,
+            on_error=lambda e: self.log(f"Error capturing snapshot:\n{e}"))
 
-        except Exception as e:
-            self.log(f"Error capturing snapshot:\n{e}")
+    def _capture_snapshot(self):
+        # runs on the acquisition thread
+        send_trigger(pulse_us=100)
 
-    def single_trigger_measurement(self):
-        self.log("Running single trigger spectrometer measurement...")
+        seq = self.stream.trigger_software()
+        _, _, view = self.stream.next_frame(seq, timeout=2.0)
+        # the pool slot is reused after pool_size frames; the saver and the
+        # display both read the image later, so they share one copy
+        image = view.copy()
 
-        integration_time_ms = 100
-        integration_delay_ms = 0
-        num_averages = 1
-        trig_mode = 0  # software trigger
+        self.writer.save_image('frame.jpg', image, copy=False)
+        return image
 
-        try:
-            wavelengths, handle, pixels, measconfig = avantes_init(
-                integration_time_ms, integration_delay_ms, num_averages, trig_mode)
+    def show_snapshot(self, image):
+        self.snapshot_label.show_image(image)
 
-            AVS_PrepareMeasure(handle, measconfig)
-            AVS_Measure(handle, 0, 1)  # 0 = software trigger
+        self.hist_canvas.plot_histogram(image)
+        self.log("Plotted histogram.")
 
-            # Poll until data is ready
-            while not AVS_PollScan(handle):
-                time.sleep(0.01)
+    def single_trigger_measurement(self):
+        self.log("Running single trigger spectrometer measurement...")
+        self.engine.submit(
+            self._measure_single,
+            on_result=self._on_single_measurement,
+            on_error=lambda e: self.log(f"Error during single trigger measurement: {e}"))
 
-            timestamp, spectrum = AVS_GetScopeData(handle)
+    def _measure_single(self):
+        # runs on the acquisition thread; the session is only set up on first use
+        self.spectrometer.open()
+        self.spectrometer.configure(integration_time=100, integration_delay=0, averages=1,
+                                    trigger_mode=0)  # software trigger
 
-            self.spectrum_axes.clear()
-            self.spectrum_axes.plot(wavelengths, spectrum, label="Spectrum")
-            self.spectrum_axes.set_xlabel("Wavelength (nm)")
-            self.spectrum_axes.set_ylabel("Intensity")
-            self.spectrum_axes.set_title("Single Software Trigger Spectrum")
-            self.spectrum_axes.grid(True)
-            self.spectrum_axes.legend()
-            self.spectrum_canvas.draw()
+        timestamp, spectrum = self.spectrometer.measure_one()
+        wavelengths = self.spectrometer.wavelengths
+        self.save_spectral_data(wavelengths, spectrum, timestamp)
+        return wavelengths, spectrum
 
-            self.save_spectral_data(wavelengths, spectrum)
+    def _on_single_measurement(self, result):
+        wavelengths, spectrum = result
 
-            self.log("Spectrometer measurement completed.")
+        self.spectrum_canvas.plot_spectrum(wavelengths, spectrum)
 
-        except Exception as e:
-            self.log(f"Error during single trigger measurement: {e}")
-
-    def _on_frame_acquired(self, cam, stream, frame):
-        self.log("Frame acquired from camera.")
+        self.log("Spectral data queued for saving.")
+        self.log("Spectrometer measurement completed.")
 
+    def _close_camera(self):
+        # runs on the acquisition thread, which owns the camera
         try:
-            frame.convert_pixel_format(PixelFormat.Mono8)
-            image = frame.as_opencv_image()
-
-            cv2.imwrite('frame.jpg', image)
-
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-            h, w, ch = image_rgb.shape
-            bytes_per_line = 3 * w
-            q_img = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_img)
-            self.snapshot_label.setPixmap(
-                pixmap.scaled(
-                    self.snapshot_label.size(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-            )
-
-            # Plot histogram
-            self.hist_canvas.plot_histogram(image_rgb)
-            self.log("Plotted histogram.")
-        except Exception as e:
-            self.log(f"Error processing frame: {e}")
-
-        return cam, stream
-
-    def handle_spectrometer_result(self, ret_arr, timestamp_arr, spectra_data_arr, wavelengths):
-        self.log("Spectrometer capture completed.")
-        if spectra_data_arr:
-            self.spectrum_axes.clear()
-
-            # Plot spectrum
-            self.spectrum_axes.plot(wavelengths, spectra_data_arr[0], label="Spectrum")
-            self.spectrum_axes.set_xlabel("Wavelength (nm)")
-            self.spectrum_axes.set_ylabel("Intensity")
-            self.spectrum_axes.set_title("Single Software Trigger Spectrum")
-            self.spectrum_axes.grid(True)
-            self.spectrum_axes.legend()
-            self.spectrum_canvas.draw()
-
-            # Save spectrum
-            self.save_spectral_data(wavelengths, spectra_data_arr[0])
-        else:
-            self.log("No spectral data received.")
-
-    def handle_spectrometer_error(self, error_msg):
-        self.log(f"Spectrometer error: {error_msg}")
+            if self.stream:
+                try:
+                    self.stream.stop()
+                    self.stream = None
+                except Exception as stream_err:
+                    print(f"Error stopping camera stream: {stream_err}")
 
-    def closeEvent(self, event):
-        try:
             if self.cam:
                 try:
+                    forget_camera(self.cam)
                     self.cam.__exit__(None, None, None)
                     self.cam = None
                 except Exception as cam_err:
@@ -428,7 +247,7 @@ class CameraApp(QWidget):
 
             if self.vimba:
                 try:
-                    self.vimba.__exit__(None, None, None)
+                    vimba_device.close()
                     self.vimba = None
                 except Exception as vimba_err:
                     print(f"Error closing Vimba system: {vimba_err}")
@@ -436,6 +255,15 @@ class CameraApp(QWidget):
         except Exception as e:
             print(f"Unhandled error in closeEvent: {e}")
 
+    def closeEvent(self, event):
+        self.engine.submit(self._close_camera)
+        self.engine.submit(self.spectrometer.close)
+        self.engine.close()
+        try:
+            self.writer.close()
+        except Exception as e:
+            print(f"Error flushing saved data: {e}")
+        self.data_saver.close()
         event.accept()
 
 
@@ -451,23 +279,24 @@ class MainApp(QWidget):
         # Create CameraApp widget
         self.camera_app = CameraApp()
 
-        # Trigger button
-        # self.trigger_btn = QPushButton("Fire 5V Pulse")
-        # self.trigger_btn.clicked.connect(lambda: send_trigger(100))
-
         # Layout setup
         layout = QVBoxLayout()
         layout.addWidget(self.camera_app)           # Embed camera app
-        # layout.addWidget(self.trigger_btn)          # Add trigger button
 
         self.setLayout(layout)
 
     def closeEvent(self, event):
+        self.camera_app.close()
+
         # Close LabJack
         try:
-            ljm.close(handle)
+            if trigger.ready:
+                print(trigger.get().timing_summary())
+            trigger.close()
+            lj_device.close()
         except Exception as e:
             print(f"Error closing LabJack: {e}")
+        avs_library.close()
         event.accept()
 
 if __name__ == "__main__":
@@ -475,4 +304,5 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # Ctrl+C handling
     win = MainApp()
     win.show()
+    start_all(trigger, vimba_device, avs_library)
     sys.exit(app.exec_())
@@ -1,72 +1,57 @@
+import simulation
+simulation.install()  # ACQ_SIMULATE=all runs the script without hardware
 import sys
 import time
 import signal
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QTextEdit
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
 from avaspec import *
-from labjack import ljm
+from spectrometer import SpectrometerSession
+from acquisition import AcquisitionEngine
+from labjack_trigger import PulseTrigger
+from device_loader import LazyDevice, lazy_labjack, lazy_spectrometer_library, start_all
+from live_plots import SpectrumCanvas
 
 # === LabJack Constants ===
 SPEC_TRIG_LINE = "FIO4"
 
 # === Global Variables ===
-spec_handle = None
-meas_config = None
-wavelengths = None
-pixels = None
+# activated once, on the acquisition thread, and kept open until exit;
+# m_Trigger_m_Source 0 is the external trigger input wired to SPEC_TRIG_LINE
+spectrometer = SpectrometerSession(trigger_mode=1, trigger_source=0)
 
-# === LabJack Setup ===
-lj_handle = ljm.openS("ANY", "USB", "ANY")
-ljm.eWriteName(lj_handle, SPEC_TRIG_LINE, 0)  # Set as input/high-Z
+# === Device Setup ===
+# opened in the background once the window is up, or on first use
+lj_device = lazy_labjack()
+spec_trigger = LazyDevice("trigger", lambda: PulseTrigger(lj_device.get(), SPEC_TRIG_LINE, width_us=100),
+                          PulseTrigger.close)  # idles low
+avs_library = lazy_spectrometer_library()
 
 # === Avantes Spectrometer Init ===
 def initialize_spectrometer(int_time=10.0, delay=0, num_ave=1, trig_mode=1):
-    global spec_handle, meas_config, wavelengths, pixels
-
-    AVS_Init(0)
-    device_list = AVS_GetList()[0]
-    spec_handle = AVS_Activate(device_list)
-    info = AVS_GetParameter(spec_handle)
-    pixels = info.m_Detector_m_NrPixels
-    wavelengths = AVS_GetLambda(spec_handle)
-
-    meas_config = MeasConfigType()
-    meas_config.m_StartPixel = 0
-    meas_config.m_StopPixel = pixels - 1
-    meas_config.m_IntegrationTime = int_time
-    meas_config.m_IntegrationDelay = delay
-    meas_config.m_NrAverages = num_ave
-    meas_config.m_CorDynDark_m_Enable = 0
-    meas_config.m_CorDynDark_m_ForgetPercentage = 100
-    meas_config.m_Smoothing_m_SmoothPix = 0
-    meas_config.m_Smoothing_m_SmoothModel = 0
-    meas_config.m_SaturationDetection = 0
-    meas_config.m_Trigger_m_Mode = trig_mode  # 1 = HW trigger
-    meas_config.m_Trigger_m_Source = 0
-    meas_config.m_Trigger_m_SourceType = 0
-    meas_config.m_Control_m_StrobeControl = 0
+    # the device is activated once; initializing again only changes the settings
+    spectrometer.configure(integration_time=int_time, integration_delay=delay, averages=num_ave,
+                           trigger_mode=trig_mode)  # 1 = HW trigger
+    spectrometer.open()
+    return spectrometer.wavelengths
 
 # === Start Spectrometer Measurement and Trigger via LabJack ===
 def trigger_measurement():
-    if spec_handle is None or meas_config is None:
+    if not spectrometer.is_open:
         raise RuntimeError("Spectrometer not initialized.")
 
-    # Start spectrometer in HW trigger mode
-    AVS_PrepareMeasure(spec_handle, meas_config)
-    AVS_Measure(spec_handle, -2, 1)  # -2 = HW trigger
+    # Start spectrometer in HW trigger mode; it waits for the edge
+    spectrometer.start(1)
 
-    # Send trigger pulse via LabJack
-    ljm.eWriteName(lj_handle, SPEC_TRIG_LINE, 1)
-    time.sleep(0.0001)  # 100 microseconds
-    ljm.eWriteName(lj_handle, SPEC_TRIG_LINE, 0)
+    # Send trigger pulse via LabJack, 100 microseconds timed on the device
+    try:
+        spec_trigger.get().fire()
+    except Exception:
+        AVS_StopMeasure(spectrometer.handle)
+        raise
 
-    # Wait for spectrometer to acquire
-    while not AVS_PollScan(spec_handle):
-        time.sleep(0.01)
-
-    timestamp, spectrum = AVS_GetScopeData(spec_handle)
-    return wavelengths, spectrum
+    # Wait for spectrometer to acquire and read the scan
+    spectra, _ = spectrometer.read(1, timeout=2.0)
+    return spectrometer.wavelengths, spectra[0]
 
 # === PyQt5 GUI ===
 class SpectrometerApp(QWidget):
@@ -74,6 +59,9 @@ class SpectrometerApp(QWidget):
         super().__init__()
         self.setWindowTitle("Spectrometer Trigger with Display")
 
+        # spectrometer and LabJack calls run on this thread
+        self.engine = AcquisitionEngine(self)
+
         # Buttons and output
         self.init_btn = QPushButton("Initialize Spectrometer")
         self.trigger_btn = QPushButton("Trigger Spectrometer")
@@ -81,9 +69,7 @@ class SpectrometerApp(QWidget):
         self.log_output.setReadOnly(True)
 
         # Matplotlib plot
-        self.figure = Figure(figsize=(5, 3))
-        self.canvas = FigureCanvas(self.figure)
-        self.ax = self.figure.add_subplot(111)
+        self.canvas = SpectrumCanvas(self, width=5, height=3, title="Captured Spectrum", color="blue")
 
         # Layout
         layout = QVBoxLayout()
@@ -102,35 +88,37 @@ class SpectrometerApp(QWidget):
         self.log_output.append(text)
 
     def init_spectrometer(self):
-        try:
-            initialize_spectrometer()
-            self.log("Spectrometer initialized.")
-        except Exception as e:
-            self.log(f"Error initializing spectrometer: {e}")
+        self.engine.submit(
+            initialize_spectrometer,
+            on_result=lambda _: self.log("Spectrometer initialized."),
+            on_error=lambda e: self.log(f"Error initializing spectrometer: {e}"))
 
     def trigger_spectrometer(self):
-        try:
-            self.log("Triggering measurement...")
-            wls, intensities = trigger_measurement()
-            self.log("Measurement complete.")
-            self.plot_spectrum(wls, intensities)
-        except Exception as e:
-            self.log(f"Error during trigger: {e}")
+        self.log("Triggering measurement...")
+        self.engine.submit(
+            trigger_measurement,
+            on_result=self._on_measurement,
+            on_error=lambda e: self.log(f"Error during trigger: {e}"))
+
+    def _on_measurement(self, result):
+        wls, intensities = result
+        self.log("Measurement complete.")
+        self.plot_spectrum(wls, intensities)
 
     def plot_spectrum(self, wls, intensities):
-        self.ax.clear()
-        self.ax.plot(wls, intensities, color='blue')
-        self.ax.set_title("Captured Spectrum")
-        self.ax.set_xlabel("Wavelength (nm)")
-        self.ax.set_ylabel("Intensity")
-        self.ax.grid(True)
-        self.canvas.draw()
+        self.canvas.plot_spectrum(wls, intensities)
 
     def closeEvent(self, event):
+        self.engine.submit(spectrometer.close)
+        self.engine.close()
         try:
-            ljm.close(lj_handle)
+            if spec_trigger.ready:
+                print(spec_trigger.get().timing_summary())
+            spec_trigger.close()
+            lj_device.close()
         except Exception as e:
             print(f"Error closing LabJack: {e}")
+        avs_library.close()
         event.accept()
 
 # === Main Entry ===
@@ -139,4 +127,5 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # Handle Ctrl+C
     window = SpectrometerApp()
     window.show()
+    start_all(spec_trigger, avs_library)
     sys.exit(app.exec_())
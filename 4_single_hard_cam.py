@@ -1,27 +1,35 @@
+import simulation
+simulation.install()  # ACQ_SIMULATE=all runs the script without hardware
 import sys
 import time
 import signal
-import cv2
-from vmbpy import *
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QSizePolicy
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import Qt
+from camera_stream import CameraStream
+from device_loader import lazy_vimba
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTextEdit, QSizePolicy
+from PyQt5.QtCore import pyqtSignal
+from frame_view import FrameView
+
+# entered in the background once the window is up
+vimba_device = lazy_vimba()
 
 
 class SoftwareTriggerApp(QWidget):
+    # stream position of a new frame, emitted from the Vimba thread
+    frame_ready = pyqtSignal(int)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Vimba Camera Software Trigger")
         self.cam = None
         self.vimba = None
+        self.stream = None
         self.last_image = None
 
         self.init_button = QPushButton("Initialize Camera")
         self.trigger_button = QPushButton("Trigger Snapshot")
         self.trigger_button.setEnabled(False)
 
-        self.image_label = QLabel("No Image")
-        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label = FrameView("No Image")
         self.image_label.setMinimumSize(640, 480)
         self.image_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
@@ -37,6 +45,7 @@ class SoftwareTriggerApp(QWidget):
 
         self.init_button.clicked.connect(self.init_camera)
         self.trigger_button.clicked.connect(self.software_trigger)
+        self.frame_ready.connect(self.show_frame)
 
     def log(self, msg):
         print(msg)
@@ -44,8 +53,7 @@ class SoftwareTriggerApp(QWidget):
 
     def init_camera(self):
         try:
-            self.vimba = VmbSystem.get_instance()
-            self.vimba.__enter__()
+            self.vimba = vimba_device.get()
 
             cams = self.vimba.get_all_cameras()
             if not cams:
@@ -54,15 +62,9 @@ class SoftwareTriggerApp(QWidget):
             self.cam = cams[0]
             self.cam.__enter__()
 
-            if PixelFormat.Mono8 in self.cam.get_pixel_formats():
-                self.cam.set_pixel_format(PixelFormat.Mono8)
-
-            self.cam.TriggerSelector.set("FrameStart")
-            self.cam.TriggerSource.set("Software")
-            self.cam.TriggerMode.set("On")
-            self.cam.AcquisitionMode.set("Continuous")
-
-            self.cam.start_streaming(self.frame_handler)
+            # Mono8, software trigger, streaming into a frame pool until close
+            self.stream = CameraStream(self.cam, trigger_source="Software", on_frame=self.frame_ready.emit)
+            self.stream.start()
             self.trigger_button.setEnabled(True)
             self.log("Camera initialized and ready for software triggering.")
 
@@ -72,40 +74,30 @@ class SoftwareTriggerApp(QWidget):
     def software_trigger(self):
         try:
             self.log("Triggering camera via software...")
-            self.cam.TriggerSoftware.run()
+            self.stream.trigger_software()
         except Exception as e:
             self.log(f"Software trigger failed: {e}")
 
-    def frame_handler(self, cam, stream, frame):
-        if frame.get_status() == FrameStatus.Complete:
-            frame.convert_pixel_format(PixelFormat.Mono8)
-            img = frame.as_opencv_image()
-            self.last_image = img
-            self.display_image(img)
-            self.log("Frame acquired.")
-        cam.queue_frame(frame)
+    def show_frame(self, seq):
+        frame = self.stream.pool.get(seq)
+        if frame is None:
+            return  # already overwritten by newer frames
+        _, frame_id, img = frame
+        self.last_image = img.copy()
+        self.display_image(self.last_image)
+        self.log(f"Frame {frame_id} acquired.")
 
     def display_image(self, img):
-        rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-        h, w, ch = rgb.shape
-        bytes_per_line = ch * w
-        q_img = QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_img)
-        self.image_label.setPixmap(
-            pixmap.scaled(
-                self.image_label.size(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-        )
+        self.image_label.show_image(img)
 
     def closeEvent(self, event):
         try:
+            if self.stream:
+                self.stream.stop()
             if self.cam:
-                self.cam.stop_streaming()
                 self.cam.__exit__(None, None, None)
             if self.vimba:
-                self.vimba.__exit__(None, None, None)
+                vimba_device.close()
         except Exception as e:
             print(f"Cleanup error: {e}")
         event.accept()
@@ -116,4 +108,5 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # Handle Ctrl+C properly
     win = SoftwareTriggerApp()
     win.show()
+    vimba_device.start()
     sys.exit(app.exec_())
@@ -1,87 +1,48 @@
-from vmbpy import *
+import simulation
+simulation.install()  # ACQ_SIMULATE=all runs the script without hardware
 from avaspec import *
+from spectrometer import SpectrometerSession
+from spectrum_storage import DataSaver
+from write_behind import WriteBehindQueue
+from labjack_trigger import SyncTrigger
+from acquisition import AcquisitionEngine
+from camera_stream import CameraStream
+from camera_profile import load_profile, forget_camera
+import timing
+from clock_sync import wall_time
+from device_loader import LazyDevice, lazy_labjack, lazy_spectrometer_library, lazy_vimba, start_all
 import sys, time, signal
-import cv2
-from labjack import ljm
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QSizePolicy, QHBoxLayout, QTextEdit, QVBoxLayout
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import csv
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QSizePolicy, QHBoxLayout, QTextEdit, QVBoxLayout
+from live_plots import HistogramCanvas, SpectrumCanvas
+from frame_view import FrameView
 from datetime import datetime
 
 '''
 LabJack (send 5V instead of acquiring temp.) 
 '''
 
-handle = ljm.openS("ANY", "USB", "ANY") #Connect to LabJack
 SPEC_TRIG_LINE = "FIO4"
 CAM_TRIG_LINE = "FIO5"
 
 
-# start in input mode
-ljm.eWriteName(handle, SPEC_TRIG_LINE, 0)   # 0 = input/high-Z
-ljm.eWriteName(handle, CAM_TRIG_LINE, 0)
+# opened in the background once the window is up, or on first use; the
+# lines start low and Trigger drives both together from there on
+lj_device = lazy_labjack(idle_low=[SPEC_TRIG_LINE, CAM_TRIG_LINE])
+vimba_device = lazy_vimba()
+avs_library = lazy_spectrometer_library()
 
 '''
 Avantas spectrometer
 '''
 
-def avantes_init(int_time, int_delay, num_ave, trig_mode):
-    AVS_Init(0)
-    device_list = AVS_GetList()[0]
-    handle = AVS_Activate(device_list)
-    info = AVS_GetParameter(handle)
-    pixels = info.m_Detector_m_NrPixels
-    wavelength_calibration = AVS_GetLambda(handle)
-    measconfig = MeasConfigType()
-
-    measconfig.m_StartPixel = 0
-    measconfig.m_StopPixel = pixels - 1
-    measconfig.m_IntegrationTime = int_time
-    measconfig.m_IntegrationDelay = int_delay
-    measconfig.m_NrAverages = num_ave
-    measconfig.m_CorDynDark_m_Enable = 0
-    measconfig.m_CorDynDark_m_ForgetPercentage = 100
-    measconfig.m_Smoothing_m_SmoothPix = 0
-    measconfig.m_Smoothing_m_SmoothModel = 0
-    measconfig.m_SaturationDetection = 0
-    measconfig.m_Trigger_m_Mode = trig_mode
-    measconfig.m_Trigger_m_Source = 0
-    measconfig.m_Trigger_m_SourceType = 0
-    measconfig.m_Control_m_StrobeControl = 0
-    measconfig.m_Control_m_LaserDelay = 0
-    measconfig.m_Control_m_LaserWidth = 0
-    measconfig.m_Control_m_LaserWaveLength = 0.0
-    measconfig.m_Control_m_StoreToRam = 0
-
-    return wavelength_calibration, handle, pixels, measconfig
-
 '''
 Allied Vision Camera Functions
 '''
 
-class HistogramCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=4, height=3, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super().__init__(fig)
-        self.setParent(parent)
-
-    def plot_histogram(self, img):
-        self.axes.clear()
-        color_labels = ('b', 'g', 'r')
-        for i, color in enumerate(color_labels):
-            hist = cv2.calcHist([img], [i], None, [256], [0, 256])
-            self.axes.plot(hist, color=color)
-        self.axes.set_xlim([0, 256])
-        self.axes.set_title("RGB Histogram")
-        self.draw()
-
 class CameraApp(QWidget):
     def __init__(self, camera_controller, spectrometer_controller,
-                 snapshot_handler, spectral_handler, data_saver, trigger_controller=None):
+                 snapshot_handler, spectral_handler, data_saver, writer, trigger_controller=None):
         super().__init__()
 
         # === Injected back-end components ===
@@ -90,8 +51,12 @@ class CameraApp(QWidget):
         self.snapshot_handler = snapshot_handler
         self.spectral_handler = spectral_handler
         self.data_saver = data_saver
+        self.writer = writer
         self.trigger_controller = trigger_controller
 
+        # every device call goes through this thread; the GUI thread only draws
+        self.engine = AcquisitionEngine(self)
+
         # === UI Elements ===
         self.init_camera_button = QPushButton("Initialize Camera")
         self.init_spec_button = QPushButton("Initialize Spectrometer")
@@ -99,13 +64,11 @@ class CameraApp(QWidget):
         self.snap_button.setEnabled(False)
 
         self.btn_measure = QPushButton("Single Trigger Measure")
-        self.snapshot_label = QLabel("No Image")
-        self.snapshot_label.setAlignment(Qt.AlignCenter)
+        self.snapshot_label = FrameView("No Image")
         self.snapshot_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         self.hist_canvas = HistogramCanvas(self, width=4, height=2)
-        self.spectrum_canvas = FigureCanvas(Figure(figsize=(4, 2)))
-        self.spectrum_axes = self.spectrum_canvas.figure.add_subplot(111)
+        self.spectrum_canvas = SpectrumCanvas(self, width=4, height=2, title="Single Software Trigger Spectrum")
 
         self.trigger_all_button = QPushButton("Trigger All")
 
@@ -149,131 +112,162 @@ class CameraApp(QWidget):
         self.log_output.append(message)
 
     def initialize_camera(self):
-        try:
-            self.camera_controller.initialize_camera()
-            self.log("Camera initialized.")
-            self.snap_button.setEnabled(True)
-        except Exception as e:
-            self.log(f"Failed to initialize camera: {e}")
+        self.engine.submit(
+            self.camera_controller.initialize_camera,
+            on_result=self._on_camera_initialized,
+            on_error=lambda e: self.log(f"Failed to initialize camera: {e}"))
+
+    def _on_camera_initialized(self, _):
+        self.log("Camera initialized.")
+        self.snap_button.setEnabled(True)
 
     def initialize_spectrometer(self):
-        try:
-            wavelengths = self.spectrometer_controller.initialize(trig_mode=0)
-            self.wavelengths = wavelengths
-            self.log("Spectrometer initialized.")
-        except Exception as e:
-            self.log(f"Failed to initialize spectrometer: {e}")
+        self.engine.submit(
+            self.spectrometer_controller.initialize, trig_mode=1,
+            on_result=self._on_spectrometer_initialized,
+            on_error=lambda e: self.log(f"Failed to initialize spectrometer: {e}"))
+
+    def _on_spectrometer_initialized(self, wavelengths):
+        self.wavelengths = wavelengths
+        self.log("Spectrometer initialized.")
 
     def take_snapshot(self):
-        try:
-            self.log("Taking snapshot...")
-            image = self.snapshot_handler.take_snapshot()
-            self.display_image(image)
-            self.hist_canvas.plot_histogram(cv2.cvtColor(image, cv2.COLOR_GRAY2RGB))
-            self.log("Snapshot and histogram updated.")
-        except Exception as e:
-            self.log(f"Error taking snapshot: {e}")
+        self.log("Taking snapshot...")
+        self.engine.submit(
+            self.snapshot_handler.take_snapshot,
+            on_result=self._on_snapshot,
+            on_error=lambda e: self.log(f"Error taking snapshot: {e}"))
+
+    def _on_snapshot(self, image):
+        self.display_image(image)
+        self.hist_canvas.plot_histogram(image)
+        self.log("Snapshot and histogram updated.")
 
     def run_spectrometer_measurement(self):
-        try:
-            self.log("Running single trigger spectrometer measurement...")
-            timestamp, spectrum = self.spectral_handler.measure()
-            self.plot_spectrum(self.wavelengths, spectrum)
-            saved_file = self.data_saver.save_spectrum(self.wavelengths, spectrum)
-            self.log(f"Spectral data saved to {saved_file}")
-        except Exception as e:
-            self.log(f"Spectrometer error: {e}")
+        self.log("Running single trigger spectrometer measurement...")
+        self.engine.submit(
+            self._measure_and_save,
+            on_result=self._on_spectrum_saved,
+            on_error=lambda e: self.log(f"Spectrometer error: {e}"))
+
+    def _measure_and_save(self):
+        # runs on the acquisition thread
+        timestamp, spectrum = self.spectral_handler.measure()
+        self.writer.save_spectrum(self.data_saver, self.wavelengths, spectrum, timestamp)
+        return spectrum
+
+    def _on_spectrum_saved(self, spectrum):
+        self.plot_spectrum(self.wavelengths, spectrum)
+        self.log("Spectral data queued for saving.")
 
     def display_image(self, image):
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-        h, w, ch = image_rgb.shape
-        bytes_per_line = 3 * w
-        q_img = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_img)
-        self.snapshot_label.setPixmap(
-            pixmap.scaled(
-                self.snapshot_label.size(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-        )
+        self.snapshot_label.show_image(image)
 
     def plot_spectrum(self, wavelengths, spectrum):
-        self.spectrum_axes.clear()
-        self.spectrum_axes.plot(wavelengths, spectrum, label="Spectrum")
-        self.spectrum_axes.set_xlabel("Wavelength (nm)")
-        self.spectrum_axes.set_ylabel("Intensity")
-        self.spectrum_axes.set_title("Single Software Trigger Spectrum")
-        self.spectrum_axes.grid(True)
-        self.spectrum_axes.legend()
-        self.spectrum_canvas.draw()
+        self.spectrum_canvas.plot_spectrum(wavelengths, spectrum)
 
     def run_full_trigger(self):
         if not self.trigger_controller:
             self.log("Trigger controller not set.")
             return
 
-        try:
-            self.log("Sending full trigger sequence...")
-            self.trigger_controller.run(wavelengths=getattr(self, "wavelengths", None))
-            self.log("Full trigger sequence complete.")
-        except Exception as e:
-            self.log(f"Trigger failed: {e}")
+        self.log("Sending full trigger sequence...")
+        self.engine.submit(
+            self.trigger_controller.run, wavelengths=getattr(self, "wavelengths", None),
+            on_result=lambda _: self.log("Full trigger sequence complete."),
+            on_error=lambda e: self.log(f"Trigger failed: {e}"))
 
 class CameraController:
-    def __init__(self):
-        self.vimba = VmbSystem.get_instance()
+    def __init__(self, buffer_count=10, profile="hardware_trigger"):
+        self.vimba = None
         self.cam = None
+        self.buffer_count = buffer_count
+        # saved under camera_profiles/<name>.json, or one of the built-in profiles
+        self.profile = load_profile(profile)
+        self.stream = None
 
     def initialize_camera(self):
-        self.vimba.__enter__()
+        from vmbpy import PixelFormat
+        self.vimba = vimba_device.get()
         cams = self.vimba.get_all_cameras()
         if not cams:
             raise RuntimeError("No cameras found.")
         self.cam = cams[0]
         self.cam.__enter__()
 
-        if PixelFormat.Mono8 in self.cam.get_pixel_formats():
-            self.cam.set_pixel_format(PixelFormat.Mono8)
-        else:
+        # the profile selects Mono8
+        if PixelFormat.Mono8 not in self.cam.get_pixel_formats():
             raise RuntimeError("Mono8 format not supported.")
 
+        # the profile is written once here; the camera then streams until
+        # close, one frame per edge on Line1 (CAM_TRIG_LINE)
+        self.stream = CameraStream(self.cam, buffer_count=self.buffer_count, profile=self.profile).start()
+
     def close(self):
+        if self.stream:
+            self.stream.stop()
+            print(f"Camera stream: {self.stream.stats()}")
         if self.cam:
+            forget_camera(self.cam)
             self.cam.__exit__(None, None, None)
         if self.vimba:
-            self.vimba.__exit__(None, None, None)
+            vimba_device.close()
+            self.vimba = None
 
 class SpectrometerController:
     def __init__(self, int_time=10.0, delay=0, num_ave=1):
         self.int_time = int_time
         self.delay = delay
         self.num_ave = num_ave
+        self.trig_mode = 1
+        self.session = None
         self.handle = None
         self.measconfig = None
+        self.pixels = None
+
+    def initialize(self, trig_mode=1):
+        # the device is activated once; initializing again only changes the trigger mode.
+        # 1 starts each scan on an edge at the external trigger input (SPEC_TRIG_LINE)
+        if self.session is None:
+            self.session = SpectrometerSession(integration_time=self.int_time, integration_delay=self.delay,
+                                               averages=self.num_ave, trigger_source=0)
+        self.trig_mode = trig_mode
+        self.session.configure(trigger_mode=trig_mode)
+        self.session.open()
+        self.handle = self.session.handle
+        self.measconfig = self.session.measconfig
+        self.pixels = self.session.pixels
+        return self.session.wavelengths
 
-    def initialize(self, trig_mode=0):
-        wavelengths, handle, pixels, measconfig = avantes_init(
-            self.int_time, self.delay, self.num_ave, trig_mode)
-        self.handle = handle
-        self.measconfig = measconfig
-        return wavelengths
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.handle = None
 
 class SnapshotHandler:
-    def __init__(self, cam):
-        self.cam = cam
-
-    def take_snapshot(self, output_path="frame.jpg"):
-        self.cam.TriggerSource.set("Line1")
-        self.cam.TriggerSelector.set("FrameStart")
-        self.cam.TriggerMode.set("Off")
-        self.cam.AcquisitionMode.set("SingleFrame")
-
-        frame = self.cam.get_frame()
-        frame.convert_pixel_format(PixelFormat.Mono8)
-        image = frame.as_opencv_image()
-
-        cv2.imwrite(output_path, image)
+    def __init__(self, camera_controller, writer):
+        self.camera_controller = camera_controller
+        self.writer = writer
+
+    def next_seq(self):
+        """Stream position of the next frame; take it before firing the hardware trigger."""
+        return self.camera_controller.stream.next_seq
+
+    def take_snapshot(self, output_path="frame.jpg", seq=None, timeout=2.0):
+        """
+        Saves and returns the frame with stream position seq, or triggers one
+        frame from software when seq is None.
+        """
+        stream = self.camera_controller.stream
+        if stream is None:
+            raise RuntimeError("Camera not initialized.")
+        if seq is None:
+            seq = stream.trigger_software()
+        _, _, image = stream.next_frame(seq, timeout)
+        # out of the pool before the camera laps it; the copy is also what gets saved
+        image = image.copy()
+
+        self.writer.save_image(output_path, image, copy=False)
         return image
 
 class SpectralMeasurementHandler:
@@ -281,83 +275,138 @@ class SpectralMeasurementHandler:
         self.ctrl = spec_ctrl
 
     def measure(self):
-        AVS_PrepareMeasure(self.ctrl.handle, self.ctrl.measconfig)
-        AVS_Measure(self.ctrl.handle, 0, 1)
-
-        while not AVS_PollScan(self.ctrl.handle):
-            time.sleep(0.01)
-
-        timestamp, spectrum = AVS_GetScopeData(self.ctrl.handle)
-        return timestamp, spectrum
+        """
+        One software-started scan as (timestamp, spectrum), e.g. without the
+        LabJack. The session times the stages and anchors its clock on the
+        start command, then goes back to the configured trigger mode.
+        """
+        session = self.ctrl.session
+        session.configure(trigger_mode=0)
+        try:
+            return session.measure_one()
+        finally:
+            session.configure(trigger_mode=self.ctrl.trig_mode)
+
+    def arm(self):
+        """Starts a one-scan measurement that waits for the next hardware trigger edge."""
+        if self.ctrl.session is None:
+            raise RuntimeError("Spectrometer not initialized.")
+        self.ctrl.session.start(1)
+
+    def read(self, timeout=1.0):
+        """(timestamp, spectrum) of the scan started by the edge after arm()."""
+        spectra, timestamps = self.ctrl.session.read(1, timeout=timeout)
+        return int(timestamps[0]), spectra[0]
+
+    def disarm(self):
+        """Stops an armed measurement whose trigger never came."""
+        AVS_StopMeasure(self.ctrl.handle)
     
 class Trigger:
-    def __init__(self, snapshot_handler, spectral_handler, data_saver, handle=None, spec_trig_line="FIO4"):
+    def __init__(self, snapshot_handler, spectral_handler, data_saver, writer, labjack=None,
+                 spec_trig_line="FIO4", cam_trig_line="FIO5", cam_delay_us=0):
         self.snapshot_handler = snapshot_handler
         self.spectral_handler = spectral_handler
         self.data_saver = data_saver
+        self.writer = writer
         self.spec_trig_line = spec_trig_line
+        self.cam_trig_line = cam_trig_line
+
+        # LabJack: a lazy_labjack shared with the script, or one of its own
+        self.labjack = labjack or lazy_labjack(idle_low=[spec_trig_line, cam_trig_line])
 
-        # LabJack handle: use existing or create a new one
-        self.handle = handle or ljm.openS("ANY", "USB", "ANY")
+        # spectrometer and camera lines are pulsed by one LabJack command;
+        # lines idle low and the edges are timed on the device. Set up on
+        # first use, or in the background with self.sync.start()
+        self.sync = LazyDevice("sync trigger",
+                               lambda: SyncTrigger(self.labjack.get(), [self.spec_trig_line, self.cam_trig_line],
+                                                   delays_us={self.cam_trig_line: cam_delay_us}),
+                               SyncTrigger.close)
 
-        # Set line to input/high-Z initially
-        ljm.eWriteName(self.handle, self.spec_trig_line, 0)
+    @property
+    def handle(self):
+        return self.labjack.get()
 
     def send_trigger(self, pulse_us=100):
-        """Send a short digital pulse on TRIG_LINE to trigger external hardware."""
+        """
+        Send a short digital pulse on both trigger lines at once. Returns the
+        SyncEvent with the host time of every edge.
+        """
         print("Triggering LabJack output...")
 
-        # Set pin to output-high
-        ljm.eWriteName(self.handle, self.spec_trig_line, 1)
-        time.sleep(pulse_us / 1_000_000.0)  # e.g., 100 µs
-        # Return to high-Z input (simulates open circuit)
-        ljm.eWriteName(self.handle, self.spec_trig_line, 0)
+        event = self.sync.get().fire(width_us=pulse_us)
 
-        print(f"LabJack trigger pulse sent on {self.spec_trig_line} for {pulse_us}µs")
+        print(f"LabJack trigger #{event.sequence} sent on {self.spec_trig_line}+{self.cam_trig_line} "
+              f"for {pulse_us}µs (edges +-{event.uncertainty * 1e6:.0f}µs)")
+        return event
 
     def run(self, wavelengths=None):
-        """Perform the full trigger routine: trigger → snapshot → spectrum"""
+        """Perform the full trigger routine: arm spectrometer → trigger → snapshot → spectrum"""
+        armed = False
         try:
-            self.send_trigger()
+            # the spectrometer waits for the edge on spec_trig_line, so it is armed first
+            self.spectral_handler.arm()
+            armed = True
+            frame_seq = self.snapshot_handler.next_seq()
+            event = self.send_trigger()
 
             print("Running snapshot handler...")
-            image = self.snapshot_handler.take_snapshot()
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_path = f"snapshot_{timestamp}.jpg"
-            print(f"Image saved to {image_path}")
-
-            print("Running spectrometer measurement...")
-            timestamp, spectrum = self.spectral_handler.measure()
-
-            if wavelengths:
-                csv_path = self.data_saver.save_spectrum(wavelengths, spectrum)
-                print(f"Spectrum saved to {csv_path}")
+            image_path = f"snapshot_{timestamp}_{event.sequence:05d}.jpg"
+            image = self.snapshot_handler.take_snapshot(image_path, seq=frame_seq)
+            print(f"Image queued for {image_path}")
+            # the camera edge anchors the camera clock to the host clock
+            stream = self.snapshot_handler.camera_controller.stream
+            cam_edge = event.edges[self.cam_trig_line][0]
+            frame = stream.pool.get(frame_seq)
+            frame_time = np.nan
+            if frame is not None:
+                stream.add_anchor(frame[0], cam_edge, event.uncertainty)
+                frame_time = wall_time(stream.host_time(frame_seq))
+            if timing.enabled():
+                arrival = stream.pool.arrival_time(frame_seq)
+                if arrival is not None:
+                    timing.add("frame_arrival", arrival - cam_edge)
+
+            print("Reading spectrometer measurement...")
+            timestamp, spectrum = self.spectral_handler.read()
+            armed = False
+            # the integration started on the spectrometer edge, which anchors its clock
+            session = self.spectral_handler.ctrl.session
+            session.add_anchor(timestamp, event.edges[self.spec_trig_line][0], event.uncertainty)
+
+            if wavelengths is not None:
+                # trigger_time links the spectrum to the snapshot of the same event
+                # host_time is the end of the integration from the device timestamp
+                spectrum_time = wall_time(session.host_times(timestamp))
+                saved = self.writer.save_spectrum(self.data_saver, wavelengths, spectrum, timestamp,
+                                                  host_time=spectrum_time,
+                                                  trigger_time=event.edge_wall_time(self.spec_trig_line),
+                                                  trigger_sequence=event.sequence, frame_time=frame_time)
+                if timing.enabled():
+                    edge = event.edges[self.spec_trig_line][0]
+                    saved.add_done_callback(lambda _: timing.since("trigger_to_saved", edge))
+                print("Spectrum queued for saving")
             else:
                 print("Wavelengths not provided, skipping spectrum save.")
 
         except Exception as e:
             print(f"Error during trigger routine: {e}")
+            # an armed measurement would take the next cycle's edge
+            if armed:
+                self.spectral_handler.disarm()
+            raise
 
     def close(self):
         try:
-            ljm.close(self.handle)
+            if self.sync.ready:
+                print(self.sync.get().timing_summary())
+            self.sync.close()
+            self.labjack.close()
             print("LabJack closed.")
         except Exception as e:
             print(f"Error closing LabJack: {e}")
 
-class DataSaver:
-    @staticmethod
-    def save_spectrum(wavelengths, intensities, prefix="spectrum"):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{prefix}_{timestamp}.csv"
-        with open(filename, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Wavelength (nm)", "Intensity"])
-            for wl, intensity in zip(wavelengths, intensities):
-                writer.writerow([wl, intensity])
-        return filename
-
-
 '''
 Window config
 '''
@@ -370,45 +419,67 @@ class MainApp(QWidget):
         # === Initialize back-end logic modules ===
         self.camera_controller = CameraController()
         self.spectrometer_controller = SpectrometerController()
-        self.snapshot_handler = SnapshotHandler(self.camera_controller.cam)  # You may delay this until camera is initialized
+        # images and spectra are written on a background thread
+        self.writer = WriteBehindQueue(on_error=lambda message: print(f"Error saving {message}"))
+        self.snapshot_handler = SnapshotHandler(self.camera_controller, self.writer)
         self.spectral_handler = SpectralMeasurementHandler(self.spectrometer_controller)
+        self.data_saver = DataSaver(columns=("trigger_time", "trigger_sequence", "frame_time"))
 
-        # === Pass controllers to GUI ===
-        self.camera_app = CameraApp(
-            camera_controller=self.camera_controller,
-            spectrometer_controller=self.spectrometer_controller,
+        self.trigger = Trigger(
             snapshot_handler=self.snapshot_handler,
             spectral_handler=self.spectral_handler,
-            data_saver=DataSaver
+            data_saver=self.data_saver,
+            writer=self.writer,
+            labjack=lj_device,
+            spec_trig_line=SPEC_TRIG_LINE,
+            cam_trig_line=CAM_TRIG_LINE
         )
 
-        self.trigger = Trigger(
+        # === Pass controllers to GUI ===
+        self.camera_app = CameraApp(
+            camera_controller=self.camera_controller,
+            spectrometer_controller=self.spectrometer_controller,
             snapshot_handler=self.snapshot_handler,
             spectral_handler=self.spectral_handler,
-            data_saver=DataSaver,
-            # handle=ljm_handle,
-            spec_trig_line="FIO4"
+            data_saver=self.data_saver,
+            writer=self.writer,
+            trigger_controller=self.trigger
         )
 
         layout = QVBoxLayout()
         layout.addWidget(self.camera_app)
         self.setLayout(layout)
 
-    def closeEvent(self, event):
+    def _close_camera(self):
+        # runs on the acquisition thread, which owns the camera
         try:
             self.camera_controller.close()
         except Exception as e:
             print(f"Error closing camera: {e}")
 
+    def _close_spectrometer(self):
+        # runs on the acquisition thread, which owns the spectrometer
         try:
-            pass  # Optional: handle spectrometer shutdown
+            self.spectrometer_controller.close()
         except Exception as e:
             print(f"Error closing spectrometer: {e}")
 
+    def closeEvent(self, event):
+        self.camera_app.engine.submit(self._close_camera)
+        self.camera_app.engine.submit(self._close_spectrometer)
+        self.camera_app.engine.close()
         try:
-            ljm.close(handle)  # Optional
+            self.writer.close()
         except Exception as e:
-            print(f"Error closing LabJack: {e}")
+            print(f"Error flushing saved data: {e}")
+        self.data_saver.close()
+        self.trigger.close()
+        avs_library.close()
+
+        if timing.enabled():
+            # ACQ_TIMING=1: where the time of each trigger cycle went
+            print(timing.timings.summary())
+            print(f"Stage timings saved to {timing.timings.save(f'timing_{datetime.now():%Y%m%d_%H%M%S}.json')}")
 
         event.accept()
 
@@ -417,4 +488,5 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # Ctrl+C handling
     win = MainApp()
     win.show()
+    start_all(win.trigger.sync, vimba_device, avs_library)
     sys.exit(app.exec_())
\ No newline at end of file
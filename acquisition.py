@@ -0,0 +1,106 @@
+import functools
+import itertools
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+'''
+Background acquisition engine: runs device jobs on a dedicated QThread so the
+GUI thread only ever draws
+'''
+
+
+class _AcquisitionWorker(QObject):
+    done = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+    @pyqtSlot(int, object)
+    def run_job(self, job_id, job):
+        try:
+            value = job()
+        except Exception as e:
+            self.failed.emit(job_id, str(e))
+            return
+        self.done.emit(job_id, value)
+
+
+class AcquisitionEngine(QObject):
+    """
+    Owns one worker thread on which all hardware calls are made. Jobs are run
+    one at a time in submission order, so device handles opened by a job are
+    only ever used from that thread.
+
+    Results come back through the finished/failed signals and the optional
+    per-job callbacks, which are called on the thread the engine lives in
+    (normally the GUI thread). Jobs themselves must not touch widgets.
+    """
+    finished = pyqtSignal(int, object)   # job id, return value
+    failed = pyqtSignal(int, str)        # job id, error message
+    busy_changed = pyqtSignal(bool)
+
+    _submit = pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = itertools.count(1)
+        self._callbacks = {}
+
+        self._thread = QThread()
+        self._thread.setObjectName("acquisition")
+        self._worker = _AcquisitionWorker()
+        self._worker.moveToThread(self._thread)
+
+        # the worker lives in another thread, so these are queued connections
+        self._submit.connect(self._worker.run_job)
+        self._worker.done.connect(self._on_done)
+        self._worker.failed.connect(self._on_failed)
+
+        self._thread.start()
+
+    def submit(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) to run on the acquisition thread.
+
+        :param on_result: optional callable(value), called on the engine's
+        thread when fn returns
+        :param on_error: optional callable(message), called on the engine's
+        thread when fn raises
+        :return: job id, as reported by finished/failed
+        """
+        job_id = next(self._ids)
+        if not self._callbacks:
+            self.busy_changed.emit(True)
+        self._callbacks[job_id] = (on_result, on_error)
+        self._submit.emit(job_id, functools.partial(fn, *args, **kwargs))
+        return job_id
+
+    def is_busy(self):
+        return bool(self._callbacks)
+
+    def _on_done(self, job_id, value):
+        if job_id not in self._callbacks:
+            return
+        on_result, _ = self._callbacks.pop(job_id)
+        if on_result:
+            on_result(value)
+        self.finished.emit(job_id, value)
+        if not self._callbacks:
+            self.busy_changed.emit(False)
+
+    def _on_failed(self, job_id, message):
+        if job_id not in self._callbacks:
+            return
+        _, on_error = self._callbacks.pop(job_id)
+        if on_error:
+            on_error(message)
+        self.failed.emit(job_id, message)
+        if not self._callbacks:
+            self.busy_changed.emit(False)
+
+    def close(self):
+        """
+        Lets the queued jobs finish, then stops the thread. Submit jobs that
+        release the devices before calling this.
+        """
+        # queued behind every job submitted so far
+        self._submit.emit(0, self._thread.quit)
+        self._thread.wait()
@@ -1,28 +1,105 @@
 ﻿import sys
 import ctypes
-import struct
+import threading
+import traceback
 from PyQt5.QtCore import *
 from enum import Enum
 import os
 
-dll_path = os.path.abspath("C:/Users/VattanaryTevy/OneDrive - PowerLight Technologies/Desktop/PV_testing/test_files/avantas_spec/avaspecx64.dll")
+# The library is loaded on the first SDK call, not at import, so importing
+# avaspec costs nothing and needs no spectrometer software. AVASPEC_LIB
+# overrides the platform default, e.g. to run against a stub library; on
+# Windows the default is the DLL shipped next to this file.
+LIBRARY_ENV = "AVASPEC_LIB"
+_here = os.path.dirname(os.path.abspath(__file__))
 
 if 'linux' in sys.platform: # Linux will have 'linux' or 'linux2'
-    lib = ctypes.CDLL("/usr/local/lib/libavs.so.0")
+    _default_library = "/usr/local/lib/libavs.so.0"
+    _loader = ctypes.CDLL
     func = ctypes.CFUNCTYPE
 elif 'darwin' in sys.platform: # macOS will have 'darwin'
-    lib = ctypes.CDLL("/usr/local/lib/libavs.0.dylib")
+    _default_library = "/usr/local/lib/libavs.0.dylib"
+    _loader = ctypes.CDLL
     func = ctypes.CFUNCTYPE
 else: # Windows will have 'win32' or 'cygwin'
     import ctypes.wintypes
     if (ctypes.sizeof(ctypes.c_voidp) == 8): # 64 bit
         WM_MEAS_READY = 0x8001
-        lib = ctypes.WinDLL(dll_path)
-        func = ctypes.WINFUNCTYPE
+        _default_library = os.path.join(_here, "avaspecx64.dll")
     else:
         WM_MEAS_READY = 0x0401
-        lib = ctypes.WinDLL("C:/Users/VattanaryTevy/OneDrive - PowerLight Technologies/Desktop/PV_testing/test_files/avantas_spec/avaspec.dll")
-        func = ctypes.WINFUNCTYPE
+        _default_library = os.path.join(_here, "avaspec.dll")
+    _loader = ctypes.WinDLL
+    func = ctypes.WINFUNCTYPE
+
+lib = None
+_library_lock = threading.Lock()
+
+def library_path():
+    """
+    Path of the AvaSpec library that load_library() opens by default.
+    """
+    return os.environ.get(LIBRARY_ENV) or _default_library
+
+def load_library(path=None):
+    """
+    Returns the loaded AvaSpec library, loading it on the first call.
+
+    :param path: load this library instead, replacing one already loaded;
+    defaults to library_path()
+    :raises OSError: if the library cannot be loaded
+    """
+    global lib
+    with _library_lock:
+        if lib is None or path is not None:
+            path = path or library_path()
+            try:
+                lib = _loader(path)
+            except OSError as e:
+                raise OSError(f"Cannot load the AvaSpec library {path} (set {LIBRARY_ENV}): {e}") from e
+            _bindings.clear()
+        return lib
+
+# Foreign functions are typed and resolved from lib once, then reused. Building
+# a prototype and looking up the symbol costs more than the call itself,
+# which matters for AVS_PollScan in the acquisition busy-wait loops.
+_bindings = {}
+
+def _bind(name, restype, argtypes, paramflags=None):
+    """
+    Returns the foreign function for SDK entry point name, creating and caching
+    it on first use.
+    
+    :param name: exported symbol name, e.g. "AVS_PollScan"
+    :param restype: ctypes return type (fixed per entry point, not part of the key)
+    :param argtypes: tuple of ctypes argument types
+    :param paramflags: optional ctypes paramflags tuple
+    :return: callable foreign function
+    """
+    key = (name, argtypes)
+    try:
+        return _bindings[key]
+    except KeyError:
+        pass
+    prototype = func(restype, *argtypes)
+    library = lib or load_library()
+    # input-only paramflags just name the arguments, but push every call
+    # through the slower output-parameter path in ctypes
+    if paramflags is not None and all(flag[0] == 1 for flag in paramflags):
+        paramflags = None
+    if paramflags is None:
+        function = prototype((name, library))
+    else:
+        function = prototype((name, library), paramflags)
+    _bindings[key] = function
+    return function
+
+def clear_bindings():
+    """
+    Drops all cached foreign functions. Call after replacing lib other than
+    through load_library().
+    """
+    _bindings.clear()
 
 AVS_SERIAL_LEN = 10
 VERSION_LEN = 16
@@ -143,9 +220,8 @@ def AVS_Init(a_Port = 0):
     :return: Number of connected and/or found devices; ERR_CONNECTION_FAILURE,
     ERR_ETHCONN_REUSE
     """    
-    prototype = func(ctypes.c_int, ctypes.c_int)
     paramflags = (1, "port",),
-    AVS_Init = prototype(("AVS_Init", lib), paramflags)
+    AVS_Init = _bind("AVS_Init", ctypes.c_int, (ctypes.c_int,), paramflags)
     ret = AVS_Init(a_Port) 
     return ret 
 
@@ -155,9 +231,10 @@ def AVS_Done():
     
     :return: SUCCESS
     """
-    prototype = func(ctypes.c_int)
-    AVS_Done = prototype(("AVS_Done",lib),)
+    AVS_Done = _bind("AVS_Done", ctypes.c_int, ())
     ret = AVS_Done()
+    _measure_callbacks.clear()
+    _prepared_configs.clear()
     return ret    
 
 def AVS_GetNrOfDevices():
@@ -167,8 +244,7 @@ def AVS_GetNrOfDevices():
     
     :return: Number of devices found.
     """
-    prototype = func(ctypes.c_int)
-    AVS_GetNrOfDevices = prototype(("AVS_GetNrOfDevices", lib),)
+    AVS_GetNrOfDevices = _bind("AVS_GetNrOfDevices", ctypes.c_int, ())
     ret = AVS_GetNrOfDevices()
     return ret
 
@@ -180,8 +256,7 @@ def AVS_UpdateUSBDevices():
     
     :return: Number of devices found.    
     """
-    prototype = func(ctypes.c_int)
-    AVS_UpdateUSBDevices = prototype(("AVS_UpdateUSBDevices", lib),)
+    AVS_UpdateUSBDevices = _bind("AVS_UpdateUSBDevices", ctypes.c_int, ())
     ret = AVS_UpdateUSBDevices()
     return ret
 
@@ -196,9 +271,8 @@ def AVS_UpdateETHDevices(listsize = 75):
     :return: Tuple containing the required list size (position 0) and 
     AvsIdentityType for each found device.
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(AvsIdentityType))
     paramflags = (1, "listsize",), (2, "requiredsize",), (2, "IDlist",),
-    AVS_UpdateETHDevices = prototype(("AVS_UpdateETHDevices", lib), paramflags)
+    AVS_UpdateETHDevices = _bind("AVS_UpdateETHDevices", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(AvsIdentityType)), paramflags)
     ret = AVS_UpdateETHDevices(listsize)
     return ret    
 
@@ -213,9 +287,8 @@ def AVS_GetList(spectrometers = 1):
     :return: Tuple containing AvsIdentityType for each found device. Devices 
     are sorted by UserFriendlyName
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(AvsIdentityType*spectrometers))
     paramflags = (1, "listsize",), (2, "requiredsize",), (2, "IDlist",),
-    PT_GetList = prototype(("AVS_GetList", lib), paramflags)
+    PT_GetList = _bind("AVS_GetList", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(AvsIdentityType*spectrometers)), paramflags)
     reqBufferSize, spectrometerList = PT_GetList(spectrometers*75)
     if reqBufferSize != spectrometers*75:
         spectrometerList = AVS_GetList(reqBufferSize//75)
@@ -230,12 +303,11 @@ def AVS_GetHandleFromSerial(deviceSerial):
     :type deviceSerial: str, bytes
     :return: AvsHandle, handle to be used in subsequent function calls
     """
-    prototype = func(ctypes.c_int, ctypes.c_char_p)
     paramflags = (1, "deviceSerial",),
-    AVS_Activate = prototype(("AVS_Activate", lib), paramflags)
+    AVS_GetHandleFromSerial = _bind("AVS_GetHandleFromSerial", ctypes.c_int, (ctypes.c_char_p,), paramflags)
     if type(deviceSerial) is str:
         deviceSerial = deviceSerial.encode("utf-8")
-    ret = AVS_Activate(deviceSerial)
+    ret = AVS_GetHandleFromSerial(deviceSerial)
     return ret     
 
 
@@ -247,12 +319,26 @@ def AVS_Activate(deviceId):
     :type deviceId: AvsIdentityType
     :return: AvsHandle, handle to be used in subsequent function calls
     """
-    prototype = func(ctypes.c_int, ctypes.POINTER(AvsIdentityType))
     paramflags = (1, "deviceId",),
-    AVS_Activate = prototype(("AVS_Activate", lib), paramflags)
+    AVS_Activate = _bind("AVS_Activate", ctypes.c_int, (ctypes.POINTER(AvsIdentityType),), paramflags)
     ret = AVS_Activate(deviceId)
     return ret
 
+def AVS_Deactivate(handle):
+    """
+    Closes communication with the spectrometer and releases its handle.
+    
+    :param handle: AvsHandle of the spectrometer
+    :return: True if the device was deactivated, False if the handle was 
+    unknown
+    """
+    paramflags = (1, "handle",),
+    AVS_Deactivate = _bind("AVS_Deactivate", ctypes.c_bool, (ctypes.c_int,), paramflags)
+    ret = AVS_Deactivate(handle)
+    _measure_callbacks.pop(handle, None)
+    _prepared_configs.pop(handle, None)
+    return ret
+
 def AVS_UseHighResAdc(handle, enable):
     """
     Sets the ADC range of the spectrometer readout.
@@ -261,58 +347,46 @@ def AVS_UseHighResAdc(handle, enable):
     :param enable: Boolean, True enables 16 bit resolution (65535 max value), 
     false uses 14 bit resolution (16383 max value)
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_bool)
     paramflags = (1, "handle",), (1, "enable",),
-    AVS_UseHighResAdc = prototype(("AVS_UseHighResAdc", lib), paramflags)
+    AVS_UseHighResAdc = _bind("AVS_UseHighResAdc", ctypes.c_int, (ctypes.c_int, ctypes.c_bool), paramflags)
     ret = AVS_UseHighResAdc(handle, enable)
     return ret
 
 def AVS_GetVersionInfo(handle, FPGAversion, FWversion, DLLversion):
 
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_char * VERSION_LEN, ctypes.c_char * VERSION_LEN, ctypes.c_char * VERSION_LEN)
     paramflags = (1, "handle",), (2, "FPGAversion",), (2, "FWversion",), (2, "DLLversion",),
-    AVS_GetVersionInfo =prototype(("AVS_GetVersionInfo", lib), paramflags) 
+    AVS_GetVersionInfo = _bind("AVS_GetVersionInfo", ctypes.c_int, (ctypes.c_int, ctypes.c_char * VERSION_LEN, ctypes.c_char * VERSION_LEN, ctypes.c_char * VERSION_LEN), paramflags)
     ret = AVS_GetVersionInfo(handle)
     return ret
 
-def AVS_PrepareMeasure(handle, measconf):
+# Packed MeasConfigType last prepared on each handle. AVS_PrepareMeasure is a
+# USB round trip, and the config stays on the device until it is changed, so
+# an unchanged config is not sent again.
+_prepared_configs = {}
+
+def AVS_PrepareMeasure(handle, measconf, force=False):
     """
     Prepares measurement on the spectrometer using the specificed configuration.
+    Does nothing if measconf is identical to the configuration last prepared
+    on this handle.
+    
     :param handle: AvsHandle returned by AVS_Activate or others
     :param measconf: MeasConfigType containing measurement configuration.
-    """    
-    datatype = ctypes.c_byte * 41
-    data = datatype()
-    temp = datatype()
-    temp = struct.pack("HHfIIBBHBBBBBHIIfH", measconf.m_StartPixel,
-                                             measconf.m_StopPixel,
-                                             measconf.m_IntegrationTime,
-                                             measconf.m_IntegrationDelay,
-                                             measconf.m_NrAverages,
-                                             measconf.m_CorDynDark_m_Enable,
-                                             measconf.m_CorDynDark_m_ForgetPercentage,
-                                             measconf.m_Smoothing_m_SmoothPix,
-                                             measconf.m_Smoothing_m_SmoothModel,
-                                             measconf.m_SaturationDetection,
-                                             measconf.m_Trigger_m_Mode,
-                                             measconf.m_Trigger_m_Source,
-                                             measconf.m_Trigger_m_SourceType,
-                                             measconf.m_Control_m_StrobeControl,
-                                             measconf.m_Control_m_LaserDelay,
-                                             measconf.m_Control_m_LaserWidth,
-                                             measconf.m_Control_m_LaserWaveLength,
-                                             measconf.m_Control_m_StoreToRam )
-
-    # copy bytes from temp to data, otherwise you will get a typing error below
-    # why is this necessary?? they have the same type to start with ??
-    x = 0
-    while (x < 41): # 0 through 40
-        data[x] = temp[x]
-        x += 1
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_byte * 41)
-    paramflags = (1, "handle",), (1, "measconf",),  
-    AVS_PrepareMeasure = prototype(("AVS_PrepareMeasure", lib), paramflags)
-    ret = AVS_PrepareMeasure(handle, data)
+    :param force: send the configuration even if it has not changed
+    :return: SUCCESS or error code
+    """
+    # MeasConfigType is declared with _pack_ = 1, so its memory already is the
+    # 41-byte layout the library expects and is passed by reference as is
+    config = bytes(measconf)
+    if not force and _prepared_configs.get(handle) == config:
+        return 0
+    paramflags = (1, "handle",), (1, "measconf",),
+    AVS_PrepareMeasure = _bind("AVS_PrepareMeasure", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(MeasConfigType)), paramflags)
+    ret = AVS_PrepareMeasure(handle, measconf)
+    if ret == 0:
+        _prepared_configs[handle] = config
+    else:
+        _prepared_configs.pop(handle, None)
     return ret
 
 def AVS_Measure(handle, windowhandle, nummeas):
@@ -329,43 +403,69 @@ def AVS_Measure(handle, windowhandle, nummeas):
     start Dynamic StoreToRam
     """
     if not (('linux' in sys.platform) or ('darwin' in sys.platform)):
-        prototype = func(ctypes.c_int, ctypes.c_int, ctypes.wintypes.HWND, ctypes.c_uint16)
+        argtypes = (ctypes.c_int, ctypes.wintypes.HWND, ctypes.c_uint16)
     else:
-        prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_uint16)
+        argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_uint16)
     paramflags = (1, "handle",), (1, "windowhandle",), (1, "nummeas"),
-    AVS_Measure = prototype(("AVS_Measure", lib), paramflags)
+    AVS_Measure = _bind("AVS_Measure", ctypes.c_int, argtypes, paramflags)
     ret = AVS_Measure(handle, windowhandle, nummeas) 
     return ret
 
+# C signature of the measurement callback: void callback(AvsHandle*, int* result).
+# The library calls it from its own thread once per finished scan.
+MeasureCallbackType = func(None, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int))
+
+# ctypes callback objects handed to the library, keyed by AvsHandle. They must
+# stay referenced for as long as the library may call them, otherwise they are
+# garbage collected and the next callback jumps into freed memory.
+_measure_callbacks = {}
+
 class callbackclass(QObject):
-    newdata = pyqtSignal()
-    def __init__(self):
+    """
+    Forwards AVS_MeasureCallback notifications to Qt. Pass the callback method
+    to AVS_MeasureCallback and connect newdata(handle, result) to a slot;
+    signal emission is thread-safe, so the slot runs in the receiver's thread.
+    """
+    newdata = pyqtSignal(int, int)
+    def __init__(self, parent=None):
         QObject.__init__(self, parent)
-        self.newdata.connect(PyQt5_demo.MainWindow.handle_newdata)
-    def callback(self, handle, error):
-        self.newdata.emit() # signal must be from a class !!
-
-# We have not succeeded in getting the callback to execute without problem
-# please use AVS_Measure instead using Windows messaging or polling
+    def callback(self, handle, result):
+        self.newdata.emit(handle, result) # signal must be from a class !!
 
-def AVS_MeasureCallback(handle, adres, nummeas):
-    CBTYPE = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int))
-    prototype = func(ctypes.c_int, ctypes.c_int, CBTYPE, ctypes.c_uint16)
+def AVS_MeasureCallback(handle, callback, nummeas):
+    """
+    Starts measurement on the spectrometer and notifies through a callback
+    instead of Windows messages or polling.
+    
+    :param handle: AvsHandle of the spectrometer
+    :param callback: Python callable taking (handle, result), with result 0 on
+    success or a negative error code. It is called from a library thread, so it
+    must not touch GUI objects directly; emit a Qt signal (see callbackclass) or
+    set an Event/Future instead. Exceptions raised by it are printed and dropped.
+    :param nummeas: number of measurements to do. -1 is infinite
+    """
+    def trampoline(p_handle, p_result):
+        # an exception escaping into the C library would take the process down
+        try:
+            callback(p_handle[0], p_result[0])
+        except Exception:
+            traceback.print_exc()
+    c_callback = MeasureCallbackType(trampoline)
+    _measure_callbacks[handle] = c_callback
     paramflags = (1, "handle",), (1, "adres",), (1, "nummeas"),
-    AVS_MeasureCallback = prototype(("AVS_MeasureCallback", lib), paramflags)
-    ret = AVS_MeasureCallback(handle, CBTYPE(callbackclass.callback), nummeas)  # CRASHES python
+    AVS_MeasureCallback = _bind("AVS_MeasureCallback", ctypes.c_int, (ctypes.c_int, MeasureCallbackType, ctypes.c_uint16), paramflags)
+    ret = AVS_MeasureCallback(handle, c_callback, nummeas)
+    return ret
 
 def AVS_StopMeasure(handle):
-    prototype = func(ctypes.c_int, ctypes.c_int)
     paramflags = (1, "handle",),
-    AVS_StopMeasure = prototype(("AVS_StopMeasure", lib), paramflags)
+    AVS_StopMeasure = _bind("AVS_StopMeasure", ctypes.c_int, (ctypes.c_int,), paramflags)
     ret = AVS_StopMeasure(handle)
     return ret
 
 def AVS_PollScan(handle):
-    prototype = func(ctypes.c_bool, ctypes.c_int)
     paramflags = (1, "handle",),
-    AVS_PollScan = prototype(("AVS_PollScan", lib), paramflags)
+    AVS_PollScan = _bind("AVS_PollScan", ctypes.c_bool, (ctypes.c_int,), paramflags)
     ret = AVS_PollScan(handle)
     return ret
     
@@ -379,12 +479,26 @@ def AVS_GetScopeData(handle):
     microcontroller ticks in 10 microsecond units since spectrometer started
     :return spectrum: 4096 element array of doubles, pixels values of spectrometer
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_double * 4096))
     paramflags = (1, "handle",), (2, "timelabel",), (2, "spectrum",),
-    AVS_GetScopeData = prototype(("AVS_GetScopeData", lib), paramflags)
+    AVS_GetScopeData = _bind("AVS_GetScopeData", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_double * 4096)), paramflags)
     timestamp, spectrum = AVS_GetScopeData(handle)
     return timestamp, spectrum
 
+def AVS_GetScopeDataBuffer(handle, timelabel, spectrum):
+    """
+    Same as AVS_GetScopeData, but writes into caller-owned storage instead of
+    allocating a new 4096 element array for every scan.
+    
+    :param handle: the AvsHandle of the spectrometer
+    :param timelabel: ctypes.c_uint32 that receives the tick count
+    :param spectrum: address of a writable block of at least 4096 doubles, e.g.
+    numpy_array.ctypes.data
+    :return: SUCCESS or error code
+    """
+    AVS_GetScopeData = _bind("AVS_GetScopeData", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_uint32), ctypes.c_void_p))
+    ret = AVS_GetScopeData(handle, ctypes.byref(timelabel), spectrum)
+    return ret
+
 def AVS_GetLambda(handle):
     """
     Returns the wavelength values corresponding to the pixels if available. 
@@ -394,9 +508,8 @@ def AVS_GetLambda(handle):
     :return: 4096 element array of wavelength values for pixels. If the detector
     is less than 4096 pixels, zeros are returned for extra pixels.
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_double * 4096))
     paramflags = (1, "handle",), (2, "wavelength",),
-    AVS_GetLambda = prototype(("AVS_GetLambda", lib), paramflags)
+    AVS_GetLambda = _bind("AVS_GetLambda", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_double * 4096)), paramflags)
     ret = AVS_GetLambda(handle)
     return ret
 
@@ -408,23 +521,20 @@ def AVS_GetNumPixels(handle):
     :param handle: the AvsHandle of the spectrometer
     :return: unsigned integer, number of pixels in spectrometer
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_short))
     paramflags = (1, "handle",), (2, "numPixels",),
-    AVS_GetNumPixels = prototype(("AVS_GetNumPixels",lib), paramflags)
+    AVS_GetNumPixels = _bind("AVS_GetNumPixels", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(ctypes.c_short)), paramflags)
     ret = AVS_GetNumPixels(handle)
     return ret    
 
 def AVS_SetDigOut(handle, portId, value):
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_uint8, ctypes.c_uint8)
     paramflags = (1, "handle",), (1, "portId",), (1, "value",),
-    AVS_SetDigOut = prototype(("AVS_SetDigOut", lib), paramflags)
+    AVS_SetDigOut = _bind("AVS_SetDigOut", ctypes.c_int, (ctypes.c_int, ctypes.c_uint8, ctypes.c_uint8), paramflags)
     ret = AVS_SetDigOut(handle, portId, value)
     return ret
 
 def AVS_GetAnalogIn(handle, AnalogInId, AnalogIn):
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_uint8, ctypes.POINTER(ctypes.c_float))
     paramflags = (1, "handle",), (1, "AnalogInId",), (2, "AnalogIn",),
-    AVS_GetAnalogIn = prototype(("AVS_GetAnalogIn", lib), paramflags)
+    AVS_GetAnalogIn = _bind("AVS_GetAnalogIn", ctypes.c_int, (ctypes.c_int, ctypes.c_uint8, ctypes.POINTER(ctypes.c_float)), paramflags)
     ret = AVS_GetAnalogIn(handle, AnalogInId)
     return ret
 
@@ -437,103 +547,35 @@ def AVS_GetParameter(handle, size = 63484):
     :param size: size in bytes allocated to store DeviceConfigType
     :return: DeviceConfigType containing spectrometer configuration data
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(DeviceConfigType))
-    paramflags = (1, "handle",), (1, "size",), (2, "reqsize",), (2, "deviceconfig",),
-    AVS_GetParameter = prototype(("AVS_GetParameter", lib), paramflags)
-    ret = AVS_GetParameter(handle, size)
-    if ret[0] != size:
-        ret = AVS_GetParameter(ret[0])
-    return ret[1]
+    # DeviceConfigType is declared with _pack_ = 1, so the library writes the
+    # configuration straight into the structure
+    AVS_GetParameter = _bind("AVS_GetParameter", ctypes.c_int, (ctypes.c_int, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32), ctypes.c_void_p))
+    reqsize = ctypes.c_uint32()
+    size = max(size, ctypes.sizeof(DeviceConfigType))
+    buffer = ctypes.create_string_buffer(size)
+    ret = AVS_GetParameter(handle, size, ctypes.byref(reqsize), buffer)
+    if ret != 0 and reqsize.value > size:
+        # the device has a larger structure than we declared; fetch all of it
+        # and keep the part we know
+        buffer = ctypes.create_string_buffer(reqsize.value)
+        ret = AVS_GetParameter(handle, reqsize.value, ctypes.byref(reqsize), buffer)
+    if ret != 0:
+        raise RuntimeError(f"AVS_GetParameter failed with error {ret}")
+    return DeviceConfigType.from_buffer_copy(buffer)
 
 def AVS_SetParameter(handle, deviceconfig):
-    datatype = ctypes.c_byte * 63484
-    data = datatype()
-    temp = datatype()
-    temp = struct.pack("HH64B" +
-                       "BH5f?8ddd2ff2ff30H" +      # Detector
-                       "HBf4096fBI" +              # Irradiance
-                       "HBf4096f" +                # Reflectance
-                       "4096f" +                   # SpectrumCorrect
-                       "?HHfIIBBHBBBBBHIIfHH12B" + # StandAlone 
-                       "5f5f5f" +                  # Temperature
-                       "?f2f" +                    # TecControl
-                       "2f2f10f10f " +             # ProcessControl
-                       "IIIBHB" +                  # EthernetSettings
-                       "9720B" +                   # Reserved
-                       "4096B",                    # OemData
-                       deviceconfig.m_Len,
-                       deviceconfig.m_ConfigVersion,
-                       deviceconfig.m_aUserFriendlyId,
-                       deviceconfig.m_Detector_m_SensorType,
-                       deviceconfig.m_Detector_m_NrPixels,
-                       deviceconfig.m_Detector_m_aFit,
-                       deviceconfig.m_Detector_m_NLEnable,
-                       deviceconfig.m_Detector_m_aNLCorrect,
-                       deviceconfig.m_Detector_m_aLowNLCounts,
-                       deviceconfig.m_Detector_m_aHighNLCounts,
-                       deviceconfig.m_Detector_m_Gain,
-                       deviceconfig.m_Detector_m_Reserved,
-                       deviceconfig.m_Detector_m_Offset,
-                       deviceconfig.m_Detector_m_ExtOffset,
-                       deviceconfig.m_Detector_m_DefectivePixels,
-                       deviceconfig.m_Irradiance_m_IntensityCalib_m_Smoothing_m_SmoothPix,
-                       deviceconfig.m_Irradiance_m_IntensityCalib_m_Smoothing_m_SmoothModel,
-                       deviceconfig.m_Irradiance_m_IntensityCalib_m_CalInttime,
-                       deviceconfig.m_Irradiance_m_IntensityCalib_m_aCalibConvers,
-                       deviceconfig.m_Irradiance_m_CalibrationType,
-                       deviceconfig.m_Irradiance_m_FiberDiameter,
-                       deviceconfig.m_Reflectance_m_Smoothing_m_SmoothPix,
-                       deviceconfig.m_Reflectance_m_Smoothing_m_SmoothModel,
-                       deviceconfig.m_Reflectance_m_CalInttime,
-                       deviceconfig.m_Reflectance_m_aCalibConvers,
-                       deviceconfig.m_SpectrumCorrect,
-                       deviceconfig.m_StandAlone_m_Enable,
-                       deviceconfig.m_StandAlone_m_Meas_m_StartPixel,
-                       deviceconfig.m_StandAlone_m_Meas_m_StopPixel,
-                       deviceconfig.m_StandAlone_m_Meas_m_IntegrationTime,
-                       deviceconfig.m_StandAlone_m_Meas_m_IntegrationDelay,
-                       deviceconfig.m_StandAlone_m_Meas_m_NrAverages,
-                       deviceconfig.m_StandAlone_m_Meas_m_CorDynDark_m_Enable, 
-                       deviceconfig.m_StandAlone_m_Meas_m_CorDynDark_m_ForgetPercentage,
-                       deviceconfig.m_StandAlone_m_Meas_m_Smoothing_m_SmoothPix,
-                       deviceconfig.m_StandAlone_m_Meas_m_Smoothing_m_SmoothModel,
-                       deviceconfig.m_StandAlone_m_Meas_m_SaturationDetection,
-                       deviceconfig.m_StandAlone_m_Meas_m_Trigger_m_Mode,
-                       deviceconfig.m_StandAlone_m_Meas_m_Trigger_m_Source,
-                       deviceconfig.m_StandAlone_m_Meas_m_Trigger_m_SourceType,
-                       deviceconfig.m_StandAlone_m_Meas_m_Control_m_StrobeControl,
-                       deviceconfig.m_StandAlone_m_Meas_m_Control_m_LaserDelay,
-                       deviceconfig.m_StandAlone_m_Meas_m_Control_m_LaserWidth,
-                       deviceconfig.m_StandAlone_m_Meas_m_Control_m_LaserWaveLength,
-                       deviceconfig.m_StandAlone_m_Meas_m_Control_m_StoreToRam,
-                       deviceconfig.m_StandAlone_m_Nmsr,
-                       deviceconfig.m_StandAlone_m_Reserved,
-                       deviceconfig.m_Temperature_1_m_aFit,
-                       deviceconfig.m_Temperature_2_m_aFit,
-                       deviceconfig.m_Temperature_3_m_aFit,
-                       deviceconfig.m_TecControl_m_Enable,
-                       deviceconfig.m_TecControl_m_Setpoint,
-                       deviceconfig.m_TecControl_m_aFit,
-                       deviceconfig.m_ProcessControl_m_AnalogLow,
-                       deviceconfig.m_ProcessControl_m_AnalogHigh,
-                       deviceconfig.m_ProcessControl_m_DigitalLow,
-                       deviceconfig.m_ProcessControl_m_DigitalHigh,
-                       deviceconfig.m_EthernetSettings_m_IpAddr,
-                       deviceconfig.m_EthernetSettings_m_NetMask,
-                       deviceconfig.m_EthernetSettings_m_Gateway,
-                       deviceconfig.m_EthernetSettings_m_DhcpEnabled,
-                       deviceconfig.m_EthernetSettings_m_TcpPort,
-                       deviceconfig.m_EthernetSettings_m_LinkStatus,
-                       deviceconfig.m_Reserved,
-                       deviceconfig.m_OemData)
-    x = 0
-    while (x < 63484): # 0 through 63483
-        data[x] = temp[x]
-        x += 1
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_byte * 63484)
-    paramflags = (1, "handle",), (1, "deviceconfig",),  
-    AVS_SetParameter = prototype(("AVS_SetParameter", lib), paramflags)
-    ret = AVS_SetParameter(handle, data)
+    """
+    Writes the device configuration to the spectrometer's EEPROM. Read it
+    with AVS_GetParameter and change only the fields you need.
+    
+    :param handle: the AvsHandle of the spectrometer
+    :param deviceconfig: DeviceConfigType with the full configuration
+    :return: SUCCESS or error code
+    """
+    # passed by reference, the packed structure is the 63484-byte layout
+    paramflags = (1, "handle",), (1, "deviceconfig",),
+    AVS_SetParameter = _bind("AVS_SetParameter", ctypes.c_int, (ctypes.c_int, ctypes.POINTER(DeviceConfigType)), paramflags)
+    ret = AVS_SetParameter(handle, deviceconfig)
     return ret
 
     
@@ -548,8 +590,7 @@ def AVS_SetSyncMode(handle, enable):
     :param handle: AvsHandle of the master device spectrometer.
     :param enable: Boolean, 0 disables sync mode, 1 enables sync mode 
     """
-    prototype = func(ctypes.c_int, ctypes.c_int, ctypes.c_bool)
     paramflags = (1, "handle",), (1, "enable",),
-    AVS_SetSyncMode = prototype(("AVS_SetSyncMode", lib), paramflags)
+    AVS_SetSyncMode = _bind("AVS_SetSyncMode", ctypes.c_int, (ctypes.c_int, ctypes.c_bool), paramflags)
     ret = AVS_SetSyncMode(handle, enable)
     return ret
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Per-call cost of the avaspec.py wrappers before and after prototype caching.
+
+The "uncached" variants rebuild the ctypes prototype and re-resolve the symbol
+on every call, exactly as the wrappers did originally. Both run against the
+stub library in stub_avs.c, so the numbers are pure Python/ctypes overhead.
+
+    python benchmarks/bench_avaspec_bindings.py
+"""
+import ctypes
+import timeit
+
+from stub_lib import use_stub
+
+use_stub()
+
+import avaspec
+from avaspec import *
+
+
+def uncached_PollScan(handle):
+    prototype = avaspec.func(ctypes.c_bool, ctypes.c_int)
+    paramflags = (1, "handle",),
+    AVS_PollScan = prototype(("AVS_PollScan", avaspec.load_library()), paramflags)
+    return AVS_PollScan(handle)
+
+
+def uncached_GetScopeData(handle):
+    prototype = avaspec.func(ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_double * 4096))
+    paramflags = (1, "handle",), (2, "timelabel",), (2, "spectrum",),
+    AVS_GetScopeData = prototype(("AVS_GetScopeData", avaspec.load_library()), paramflags)
+    return AVS_GetScopeData(handle)
+
+
+def uncached_Measure(handle, windowhandle, nummeas):
+    prototype = avaspec.func(ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_uint16)
+    paramflags = (1, "handle",), (1, "windowhandle",), (1, "nummeas"),
+    AVS_Measure = prototype(("AVS_Measure", avaspec.load_library()), paramflags)
+    return AVS_Measure(handle, windowhandle, nummeas)
+
+
+def per_call_ns(fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e9
+
+
+def main():
+    AVS_Init(0)
+    handle = AVS_Activate(AVS_GetList()[0])
+
+    cases = [
+        ("AVS_PollScan", lambda: uncached_PollScan(handle), lambda: AVS_PollScan(handle), 20000),
+        ("AVS_GetScopeData", lambda: uncached_GetScopeData(handle), lambda: AVS_GetScopeData(handle), 5000),
+        ("AVS_Measure", lambda: uncached_Measure(handle, 0, 1), lambda: AVS_Measure(handle, 0, 1), 20000),
+    ]
+    print(f"{'call':<18}{'uncached ns':>14}{'cached ns':>12}{'speedup':>10}")
+    for name, before, after, number in cases:
+        t_before = per_call_ns(before, number)
+        t_after = per_call_ns(after, number)
+        print(f"{name:<18}{t_before:>14.0f}{t_after:>12.0f}{t_before / t_after:>9.1f}x")
+    AVS_Done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Averaged spectra from the stub spectrometer (ACQ_SIMULATE=avaspec, see
+simulation.py), three ways:
+
+  loop    the old way: one measurement per scan, summed in Python
+  host    MeasurementProfile(on_device=False): the scans of all results in
+          one measurement, averaged by HostProcessing with NumPy
+  device  MeasurementProfile: m_NrAverages, averaged by the spectrometer
+
+Prints, per averaged spectrum, the wall time, the number of scans read out
+over USB (AVS_GetScopeData calls, from the timing stages) and the host CPU
+time. Checks that the device reads out one scan per result instead of
+n_averages, that its CPU time drops accordingly, and that host and device
+results agree within the noise, which both bring down by about the square
+root of n_averages. Smoothing is compared the same way. Needs a C compiler
+for the stub library.
+
+    python benchmarks/bench_averaging.py [n_averages] [n_results] [integration_ms]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "avaspec")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import simulation
+
+simulation.install()
+
+import numpy as np
+
+import timing
+from measurement_profile import MeasurementProfile
+from spectrometer import SpectrometerSession, allocate_scans
+
+
+def noise(spectra):
+    # pixel to pixel scatter on a flat stretch of the continuum, without the signal
+    return float(np.std(np.diff(spectra[:, 1500:1600], axis=1)) / np.sqrt(2))
+
+
+def measure_loop(session, n_averages, n_results):
+    out = np.empty((n_results, session.pixels))
+    for i in range(n_results):
+        total = np.zeros(session.pixels)
+        for _ in range(n_averages):
+            _, spectrum = session.measure_one()
+            total += spectrum
+        out[i] = total / n_averages
+    return out
+
+
+def measure_profile(session, profile, n_results, out):
+    profile.apply(session)
+    spectra, _ = session.measure(n_results, out=out)
+    return spectra.copy()
+
+
+def run(name, measure, n_results):
+    timing.timings.reset()
+    start, cpu = time.perf_counter(), time.process_time()
+    spectra = measure()
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+    transfers = timing.timings.stats()["get_scope_data"]["count"]
+    result = {"wall_ms": wall / n_results * 1e3, "transfers": transfers / n_results,
+              "cpu_ms": cpu / n_results * 1e3, "noise": noise(spectra), "spectra": spectra}
+    print(f"{name:<16}{result['wall_ms']:>10.2f}{result['transfers']:>11.1f}{result['cpu_ms']:>10.3f}"
+          f"{result['noise']:>9.2f}")
+    return result
+
+
+def main():
+    n_averages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_results = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    integration_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    timing.enable(True)
+    session = SpectrometerSession(integration_time=integration_ms).open()
+    out, _ = allocate_scans(n_results)
+    device = MeasurementProfile("device", averages=n_averages)
+    host = device.updated("host", on_device=False)
+    smoothed = device.updated("smoothed", smooth_pixels=3)
+
+    print(f"{n_averages} averages, {n_results} results, {integration_ms} ms integration, per result:")
+    print(f"{'':<16}{'wall ms':>10}{'transfers':>11}{'cpu ms':>10}{'noise':>9}")
+    single = run("single scan", lambda: measure_profile(session, MeasurementProfile("raw"), n_results, out),
+                 n_results)
+    loop = run("loop", lambda: measure_loop(session, n_averages, n_results), n_results)
+    on_host = run("host", lambda: measure_profile(session, host, n_results, out), n_results)
+    on_device = run("device", lambda: measure_profile(session, device, n_results, out), n_results)
+    smooth_host = run("smoothed, host", lambda: measure_profile(session, smoothed.updated(on_device=False),
+                                                                 n_results, out), n_results)
+    smooth_device = run("smoothed, dev.", lambda: measure_profile(session, smoothed, n_results, out), n_results)
+    session.close()
+
+    assert on_device["transfers"] == 1 and on_host["transfers"] == loop["transfers"] == n_averages
+    assert on_device["cpu_ms"] * n_averages / 4 < on_host["cpu_ms"]
+    assert on_host["cpu_ms"] < loop["cpu_ms"]
+    # the stub's noise is uniform, +-32 counts, so sqrt(n) less for both
+    expected = single["noise"] / np.sqrt(n_averages)
+    for result in (loop, on_host, on_device):
+        assert 0.7 * expected < result["noise"] < 1.4 * expected, (result["noise"], expected)
+    difference = on_host["spectra"].mean(axis=0) - on_device["spectra"].mean(axis=0)
+    assert np.abs(difference).max() < 10 * expected / np.sqrt(n_results)
+    difference = smooth_host["spectra"].mean(axis=0) - smooth_device["spectra"].mean(axis=0)
+    assert np.abs(difference).max() < 10 * expected / np.sqrt(n_results)
+    assert smooth_device["noise"] < on_device["noise"] / 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Calibrated spectra with SpectrumCalibration (calibration.py) against the
+stub spectrometer (ACQ_SIMULATE=avaspec, see simulation.py).
+
+Writes a nonlinearity polynomial, a spectrum correction and irradiance
+conversion factors into the stub's device configuration, then:
+
+  per scan  the straightforward way: one scan at a time, the coefficients
+            read out of DeviceConfigType and np.polyval for each
+  batch     SpectrumCalibration.process on (n_scans, pixels) at once, the
+            per-pixel arrays built once per session
+
+Prints the cost per spectrum of both and checks they give the same result.
+Then runs a SpectrumStream at 1 ms per scan for a few seconds, calibrating
+what arrived in the ring every 20 ms, and checks that every scan was
+calibrated and that doing so takes a small part of the scan period. Needs a
+C compiler for the stub library.
+
+    python benchmarks/bench_calibration.py [n_scans] [stream_seconds]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "avaspec")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import simulation
+
+simulation.install()
+
+import numpy as np
+
+from device_config import update_device_config
+from spectrometer import MAX_PIXELS, SpectrometerSession, SpectrumStream, close_library, open_library
+
+INTEGRATION_MS = 1.0
+CAL_INTEGRATION_MS = 10.0
+DARK_COUNTS = 1000.0  # the stub's dark level, STUB_DARK_COUNTS
+
+
+def write_calibration(session):
+    pixels = MAX_PIXELS
+    x = np.linspace(-1, 1, pixels)
+    nl = [1.0, -2.0e-6, 4.0e-11, 1.0e-16, -1.0e-21, 1.0e-27, -1.0e-32, 1.0e-38]
+    update_device_config(session.handle,
+                         m_Detector_m_NLEnable=True, m_Detector_m_aNLCorrect=nl,
+                         m_Detector_m_aLowNLCounts=100.0, m_Detector_m_aHighNLCounts=60000.0,
+                         m_SpectrumCorrect=1 + 0.05 * np.sin(20 * x),
+                         m_Irradiance_m_IntensityCalib_m_CalInttime=CAL_INTEGRATION_MS,
+                         m_Irradiance_m_IntensityCalib_m_aCalibConvers=1e-3 * (1.5 + x ** 2))
+
+
+def per_scan(config, pixels, spectra, dark, integration_time):
+    out = np.empty((len(spectra), pixels))
+    for i, spectrum in enumerate(spectra):
+        nl = np.array(config.m_Detector_m_aNLCorrect)
+        correct = np.array(config.m_SpectrumCorrect)[:pixels]
+        convers = np.array(config.m_Irradiance_m_IntensityCalib_m_aCalibConvers)[:pixels]
+        counts = spectrum[:pixels] - dark
+        clipped = np.clip(counts, config.m_Detector_m_aLowNLCounts, config.m_Detector_m_aHighNLCounts)
+        counts = counts / np.polyval(nl[::-1], clipped)
+        out[i] = counts * correct * convers * config.m_Irradiance_m_IntensityCalib_m_CalInttime / integration_time
+    return out
+
+
+def best_time(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def stream(session, seconds):
+    calibration = session.calibration
+    buffer_capacity = 1024
+    stream = SpectrumStream(session.handle, session.pixels, capacity=buffer_capacity,
+                            expected_period=INTEGRATION_MS / 1e3)
+    out = np.empty((buffer_capacity, session.pixels))
+    counts = {"calibrated": 0, "busy": 0.0, "next_seq": 0}
+
+    def calibrate_new():
+        # everything that arrived since the last call, as one or two batches
+        start = time.perf_counter()
+        stop = stream.buffer.next_seq
+        for spectra, _, _ in stream.buffer.segments(counts["next_seq"], stop):
+            calibration.process(spectra, INTEGRATION_MS, out=out[:len(spectra)])
+            counts["calibrated"] += len(spectra)
+        counts["next_seq"] = stop
+        counts["busy"] += time.perf_counter() - start
+
+    session.prepare()
+    stream.start()
+    deadline = time.perf_counter() + seconds
+    try:
+        # a 50 Hz display timer's worth of scans at a time
+        while time.perf_counter() < deadline:
+            time.sleep(0.02)
+            calibrate_new()
+    finally:
+        stream.stop()
+    calibrate_new()
+    return counts["calibrated"], stream.received, counts["busy"]
+
+
+def main():
+    n_scans = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    # held across the reopen below, so the stub keeps the configuration written
+    open_library()
+    session = SpectrometerSession(integration_time=INTEGRATION_MS).open()
+    write_calibration(session)
+    session.close()
+    session.open()
+    pixels = session.pixels
+
+    calibration = session.calibration
+    calibration.set_dark(np.full(pixels, DARK_COUNTS), INTEGRATION_MS)
+    raw, _ = session.measure(n_scans)
+    raw = raw.copy()
+    out = np.empty_like(raw)
+
+    reference = per_scan(session.device_config, pixels, raw, calibration.dark, INTEGRATION_MS)
+    result = calibration.process(raw, INTEGRATION_MS, out=out)
+    loop_time = best_time(lambda: per_scan(session.device_config, pixels, raw, calibration.dark, INTEGRATION_MS), 2)
+    batch_time = best_time(lambda: calibration.process(raw, INTEGRATION_MS, out=out))
+    single_time = best_time(lambda: [calibration.process(spectrum, INTEGRATION_MS) for spectrum in raw])
+
+    print(f"{n_scans} scans of {pixels} pixels, per spectrum:")
+    print(f"{'per scan, config read each time':<36}{loop_time / n_scans * 1e6:>10.1f} us")
+    print(f"{'process(), one scan at a time':<36}{single_time / n_scans * 1e6:>10.1f} us")
+    print(f"{'process(), whole batch':<36}{batch_time / n_scans * 1e6:>10.1f} us")
+    assert np.allclose(result, reference, rtol=1e-12, atol=0)
+    assert calibration.irradiance_calibrated and calibration.nl_coefficients is not None
+    assert batch_time * 3 < loop_time
+
+    calibrated, received, busy = stream(session, seconds)
+    print(f"\nstream at {INTEGRATION_MS} ms per scan for {seconds:g} s")
+    print(f"{'scans received / calibrated':<36}{received:>6} / {calibrated}")
+    print(f"{'calibration time per scan':<36}{busy / max(calibrated, 1) * 1e6:>10.1f} us")
+    assert calibrated == received > seconds * 500
+    assert busy / calibrated < INTEGRATION_MS / 1e3 / 10
+
+    session.close()
+    close_library()
+
+
+if __name__ == "__main__":
+    main()
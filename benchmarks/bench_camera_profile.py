@@ -0,0 +1,100 @@
+"""
+Per-snapshot cost of camera configuration: writing TriggerSource,
+TriggerSelector, TriggerMode and AcquisitionMode before every get_frame()
+(the old SnapshotHandler) against applying a CameraProfile once and taking
+software-triggered frames from a CameraStream.
+
+Runs against fake_vimba, where every feature read or write is one USB
+transaction of 1 ms and a frame takes 1 ms exposure plus 4 ms readout. The
+checks at the end (diffing, selector invalidation, save/load) also make it
+a quick self-test of camera_profile.py.
+
+    python benchmarks/bench_camera_profile.py [n_snapshots]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_vimba
+from camera_profile import (BUILTIN_PROFILES, CameraProfile, apply_features, forget_camera, list_profiles,
+                            load_profile)
+from camera_stream import CameraStream
+
+
+def per_snapshot_setup(cam, n_snapshots):
+    times = []
+    for _ in range(n_snapshots):
+        start = time.perf_counter()
+        cam.TriggerSource.set("Software")
+        cam.TriggerSelector.set("FrameStart")
+        cam.TriggerMode.set("Off")
+        cam.AcquisitionMode.set("SingleFrame")
+        cam.get_frame()
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1e3
+
+
+def streamed(cam, n_snapshots):
+    times = []
+    with CameraStream(cam, buffer_count=3, profile=load_profile("software_trigger"),
+                      vmb_module=fake_vimba) as stream:
+        for _ in range(n_snapshots):
+            start = time.perf_counter()
+            stream.next_frame(stream.trigger_software(), timeout=1.0)
+            times.append(time.perf_counter() - start)
+    return np.array(times) * 1e3
+
+
+def check_profiles():
+    cam = fake_vimba.Camera(camera_id="DEV_CHECK")
+    profile = BUILTIN_PROFILES["hardware_trigger"]
+
+    assert profile.apply(cam) == ["TriggerMode"]  # the rest already match
+    writes = fake_vimba.feature_writes
+    reads = fake_vimba.feature_reads
+    assert profile.apply(cam) == []
+    assert (fake_vimba.feature_writes, fake_vimba.feature_reads) == (writes, reads)
+
+    # only the difference is written
+    slower = profile.updated("slow", ExposureTime=20000.0)
+    assert slower.apply(cam) == ["ExposureTime"]
+    assert cam.ExposureTime._value == 20000.0
+    assert profile.apply(cam) == []
+
+    # a new selector makes the selected features stale, so they are checked again
+    assert apply_features(cam, [("TriggerSelector", "AcquisitionStart")]) == ["TriggerSelector"]
+    assert profile.apply(cam) == ["TriggerSelector"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        slower.save(tmp)
+        assert load_profile("slow", tmp) == slower
+        assert load_profile("hardware_trigger", tmp) == profile
+        assert "slow" in list_profiles(tmp) and "free_run" in list_profiles(tmp)
+        captured = CameraProfile.from_camera(cam, "captured", ["TriggerSource", "ExposureTime"])
+        captured.save(tmp)
+        assert load_profile("captured", tmp).features == [("TriggerSource", "Line1"), ("ExposureTime", 20000.0)]
+    forget_camera(cam)
+
+
+def main():
+    n_snapshots = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    check_profiles()
+
+    print(f"{n_snapshots} software-triggered snapshots, fake camera")
+    print(f"{'method':<28}{'p50 ms':>8}{'max ms':>8}{'writes':>8}")
+    for name, run in (("features + get_frame", per_snapshot_setup), ("profile once + stream", streamed)):
+        cam = fake_vimba.Camera(camera_id=f"DEV_{name}")
+        writes = fake_vimba.feature_writes
+        times = run(cam, n_snapshots)
+        print(f"{name:<28}{np.median(times):>8.1f}{times.max():>8.1f}{fake_vimba.feature_writes - writes:>8}")
+        forget_camera(cam)
+    print("profiles: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Hardware-triggered frame rate of the camera: a snapshot per trigger with
+feature setup and cam.get_frame() (the old SnapshotHandler path), streaming
+with the frames processed inside the Vimba handler (as 4_single_hard_cam.py
+did), and CameraStream, which copies each frame into a FramePool and hands
+the buffer straight back.
+
+Runs against fake_vimba, a 2048x1536 Mono8 camera that manages 200 frames/s
+(1 ms exposure, 4 ms readout), so it needs no camera. The checks at the end
+also make it a quick self-test of camera_stream.py.
+
+    python benchmarks/bench_camera_stream.py [n_triggers] [trigger_hz] [process_ms]
+"""
+import os
+import sys
+import threading
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_vimba
+from camera_stream import CameraStream
+
+
+def fire_triggers(cam, n_triggers, trigger_hz):
+    """Hardware trigger edges at a fixed rate on another thread, like the LabJack."""
+    def run():
+        start = time.perf_counter()
+        for i in range(n_triggers):
+            delay = start + i / trigger_hz - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            cam.fire()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def process(image, process_ms):
+    # stands in for display, histogram and saving
+    time.sleep(process_ms / 1e3)
+    return image.mean()
+
+
+def snapshot_per_trigger(n_triggers, process_ms):
+    cam = fake_vimba.Camera()
+    start = time.perf_counter()
+    for _ in range(n_triggers):
+        cam.TriggerSource.set("Line1")
+        cam.TriggerSelector.set("FrameStart")
+        cam.TriggerMode.set("Off")
+        cam.AcquisitionMode.set("SingleFrame")
+        frame = cam.get_frame()
+        process(frame.as_opencv_image(), process_ms)
+    return n_triggers / (time.perf_counter() - start), 0
+
+
+def inline_handler(n_triggers, trigger_hz, process_ms, buffer_count=3):
+    cam = fake_vimba.Camera()
+    ids = []
+
+    def handler(cam, stream, frame):
+        ids.append(frame.get_id())
+        process(frame.as_opencv_image(), process_ms)
+        cam.queue_frame(frame)
+
+    cam.TriggerMode.set("On")
+    cam.start_streaming(handler, buffer_count=buffer_count)
+    start = time.perf_counter()
+    fire_triggers(cam, n_triggers, trigger_hz).join()
+    time.sleep(0.1)
+    cam.stop_streaming()
+    elapsed = time.perf_counter() - start - 0.1
+    return len(ids) / elapsed, n_triggers - len(ids)
+
+
+def camera_stream(n_triggers, trigger_hz, process_ms, buffer_count=3):
+    cam = fake_vimba.Camera()
+    stream = CameraStream(cam, buffer_count=buffer_count, pool_size=64, vmb_module=fake_vimba)
+    processed = []
+
+    def consume():
+        # the GUI keeps up with what it can, from the newest frame
+        while stream.streaming:
+            latest = stream.latest()
+            if latest is not None and (not processed or latest[0] != processed[-1]):
+                processed.append(latest[0])
+                process(latest[3], process_ms)
+            else:
+                time.sleep(1e-3)
+
+    with stream:
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        start = time.perf_counter()
+        fire_triggers(cam, n_triggers, trigger_hz).join()
+        stream.next_frame(n_triggers - 1, timeout=1.0)
+        elapsed = time.perf_counter() - start
+        stats = stream.stats()
+        # the newest pool_size frames are still in order, each with its own image
+        frames = [stream.read(timeout=1.0) for _ in range(stream.pool.capacity)]
+    consumer.join()
+    assert stats["received"] == n_triggers and stats["dropped"] == 0, stats
+    assert stream.overruns == n_triggers - stream.pool.capacity
+    assert [frame_id for _, frame_id, _ in frames] == list(range(n_triggers - stream.pool.capacity, n_triggers))
+    assert all(image[0, 0] == frame_id & 0xFF for _, frame_id, image in frames)
+    assert stream.read() is None
+    return stats["received"] / elapsed, stats["dropped"], stats["frame_rate"], len(processed)
+
+
+def main():
+    n_triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    trigger_hz = float(sys.argv[2]) if len(sys.argv) > 2 else 150.0
+    process_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    print(f"{n_triggers} triggers at {trigger_hz:.0f} Hz, {process_ms} ms processing per shown frame, fake camera")
+    print(f"{'method':<26}{'frames/s':>10}{'lost':>8}")
+    rate, lost = snapshot_per_trigger(min(n_triggers, 30), process_ms)
+    print(f"{'get_frame per trigger':<26}{rate:>10.1f}{'-':>8}")
+    for buffers in (3, 10):
+        rate, lost = inline_handler(n_triggers, trigger_hz, process_ms, buffers)
+        print(f"{f'inline handler, {buffers} buf':<26}{rate:>10.1f}{lost:>8}")
+    rate, lost, stream_rate, shown = camera_stream(n_triggers, trigger_hz, process_ms)
+    print(f"{'CameraStream, 3 buf':<26}{rate:>10.1f}{lost:>8}   (stats {stream_rate:.1f} frames/s, "
+          f"{shown} shown)")
+
+
+if __name__ == "__main__":
+    main()
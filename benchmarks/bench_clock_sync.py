@@ -0,0 +1,167 @@
+"""
+Device-to-host clock mapping (clock_sync.py).
+
+Synthetic: a 10 us tick counter with an unknown origin, 30 ppm fast and
+wrapping during the run, anchored every 10 ms with 20 us of host-side noise
+and an occasional 5 ms hiccup. Prints the mapping error while anchors keep
+coming and 10 s after the last one, against an offset-only mapping at the
+nominal rate, plus the cost of an anchor and a conversion.
+
+Simulated hardware (ACQ_SIMULATE=all, see simulation.py): runs the trigger
+cycle of 5_integrate_timing.py for a few seconds. The stub spectrometer's
+counter runs 30 ppm fast and fake_vimba's -20 ppm; both are armed for the
+hardware trigger and anchored on the same edge estimates. Checks the drift
+between the two clocks, that each frame's start of exposure and each
+spectrum's start of integration fall within 200 us of their trigger edges
+(as recorded by fake_ljm), unlike the per-trigger edge estimate, and that
+the saved spectra carry host times of their scans instead of the write time.
+
+    python benchmarks/bench_clock_sync.py [seconds]
+"""
+import contextlib
+import io
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "all")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+from clock_sync import ClockSync
+
+TICK = 10e-6
+PPM = 30.0
+
+
+def synthetic():
+    rng = np.random.default_rng(0)
+    origin_ticks = 2 ** 32 - 300_000  # wraps after 3 s
+    host_start = 1000.0
+
+    def ticks_at(host):
+        return (origin_ticks + np.round((host - host_start) / TICK * (1 + PPM * 1e-6)).astype(np.int64)) % 2 ** 32
+
+    clock = ClockSync("synthetic", TICK)
+    first = None
+    errors = []
+    anchor_times = []
+    for i in range(1000):
+        host = host_start + i * 0.01
+        noise = rng.normal(0, 20e-6) + (5e-3 if i % 50 == 25 else 0.0)
+        start = time.perf_counter()
+        clock.add_anchor(int(ticks_at(host)), host + noise, 20e-6)
+        anchor_times.append(time.perf_counter() - start)
+        if first is None:
+            first = (int(ticks_at(host)), host + noise)
+        if i >= 100:
+            errors.append(clock.to_host(int(ticks_at(host))) - host)
+
+    later = host_start + 9.99 + 10.0
+    extrapolated = clock.to_host(int(ticks_at(later))) - later
+    # an offset-only mapping: first anchor and the nominal tick, unwrapped by hand
+    elapsed_ticks = (int(ticks_at(later)) - first[0]) % 2 ** 32
+    offset_only = first[1] + elapsed_ticks * TICK - later
+
+    start = time.perf_counter()
+    batch = ticks_at(host_start + np.arange(10_000) * 1e-3 + 5.0)
+    clock.to_host(batch)
+    batch_time = time.perf_counter() - start
+
+    errors = np.abs(errors) * 1e6
+    print(f"synthetic, {PPM:g} ppm clock with a wrap, 20 us anchor noise")
+    print(f"{'fitted drift':<36}{clock.drift_ppm:>10.2f} ppm")
+    print(f"{'error while anchored, p50 / max':<36}{np.median(errors):>6.1f} / {errors.max():.1f} us")
+    print(f"{'error 10 s after the last anchor':<36}{abs(extrapolated) * 1e6:>10.1f} us")
+    print(f"{'offset-only mapping, same instant':<36}{abs(offset_only) * 1e6:>10.1f} us")
+    print(f"{'add_anchor, median':<36}{np.median(anchor_times) * 1e6:>10.1f} us")
+    print(f"{'to_host, 10000 stamps':<36}{batch_time * 1e3:>10.2f} ms")
+    assert abs(clock.drift_ppm - PPM) < 6  # 256 anchors over 2.56 s: about 2 ppm standard error
+    assert errors.max() < 50
+    assert abs(extrapolated) < 100e-6 < abs(offset_only)
+
+
+def simulated(seconds):
+    workdir = tempfile.mkdtemp(prefix="bench_clock_sync_")
+    script = runpy.run_path(os.path.join(REPO_ROOT, "5_integrate_timing.py"), run_name="bench_clock_sync")
+    from spectrum_storage import load_spectra
+    os.chdir(workdir)
+
+    camera = script["CameraController"]()
+    spectrometer = script["SpectrometerController"](int_time=2.0)
+    writer = script["WriteBehindQueue"]()
+    data_saver = script["DataSaver"](columns=("trigger_time", "trigger_sequence", "frame_time"))
+    snapshots = script["SnapshotHandler"](camera, writer)
+    spectra = script["SpectralMeasurementHandler"](spectrometer)
+    trigger = script["Trigger"](snapshots, spectra, data_saver, writer)
+    camera.initialize_camera()
+    wavelengths = spectrometer.initialize()
+    trigger.sync.get()
+
+    log = io.StringIO()
+    cycles = 0
+    deadline = time.perf_counter() + seconds
+    with contextlib.redirect_stdout(log):
+        while time.perf_counter() < deadline:
+            trigger.run(wavelengths=wavelengths)
+            cycles += 1
+    writer.flush()
+    data_saver.close()
+
+    saved = load_spectra(data_saver.path)
+    trigger_time = saved["columns"]["trigger_time"]
+    spectrum_lag = (saved["host_time"] - trigger_time) * 1e3
+    # fake_ljm knows when each edge really happened; the camera starts its exposure on it
+    fake_ljm = sys.modules["labjack.ljm"]
+    to_wall = time.time() - time.perf_counter()
+    true_edges = np.array([t for _, level, t in fake_ljm.edges(trigger.handle, "FIO5") if level])[-cycles:] + to_wall
+    frame_error = np.abs(saved["columns"]["frame_time"] - true_edges) * 1e6
+    # the spectrometer integrates from its own edge; host_time is the end of the integration
+    spectrometer_edges = np.array([t for _, level, t in fake_ljm.edges(trigger.handle, "FIO4") if level])[-cycles:]
+    integration = spectrometer.session.measconfig.m_IntegrationTime / 1e3
+    scan_error = np.abs(saved["host_time"] - integration - spectrometer_edges - to_wall) * 1e6
+    edge_error = np.abs(trigger_time - true_edges) * 1e6
+    camera_clock = camera.stream.clock
+    spectrometer_clock = spectrometer.session.clock
+
+    print(f"\nsimulated devices, {cycles} trigger cycles in {seconds:g} s")
+    for clock in (spectrometer_clock, camera_clock):
+        stats = clock.stats()
+        print(f"{stats['name'] + ' drift / residual':<36}{stats['drift_ppm']:>7.1f} ppm / {stats['residual_us']:.1f} us")
+    print(f"{'edge estimate error, p50 / max':<36}{np.median(edge_error):>6.1f} / {edge_error.max():.1f} us")
+    print(f"{'frame host time error, p50 / max':<36}{np.median(frame_error[20:]):>6.1f} / {frame_error[20:].max():.1f} us")
+    print(f"{'scan host time error, p50 / max':<36}{np.median(scan_error[20:]):>6.1f} / {scan_error[20:].max():.1f} us")
+    print(f"{'spectrum time - trigger edge, p50':<36}{np.median(spectrum_lag):>10.2f} ms")
+
+    assert "Error" not in log.getvalue(), log.getvalue()
+    assert len(trigger_time) == cycles
+    # both clocks are anchored on the same edge estimates, whose scatter by the
+    # USB round trip moves both fitted drifts alike; their difference is exact
+    assert abs(spectrometer_clock.drift_ppm - camera_clock.drift_ppm - 50) < 3
+    # after the first anchors the fit averages out the round-trip jitter of the
+    # single-event estimates; what is left is their common bias
+    assert frame_error[20:].max() < 200 and scan_error[20:].max() < 200
+    # the scan starts on the edge, so it ends one integration time later; single
+    # edge estimates can be late by a slow round trip, so only the median is checked
+    assert abs(np.median(spectrum_lag) - integration * 1e3) < 0.2
+
+    with contextlib.redirect_stdout(log):
+        trigger.close()
+        camera.close()
+        spectrometer.close()
+    writer.close()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    synthetic()
+    simulated(seconds)
+
+
+if __name__ == "__main__":
+    main()
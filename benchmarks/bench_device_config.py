@@ -0,0 +1,106 @@
+"""
+Encoding cost of the 63484-byte DeviceConfigType, and a read/modify/write
+round trip of single sections through AVS_GetParameter/AVS_SetParameter.
+
+The legacy encoder is the original AVS_SetParameter approach (one struct.pack
+over every field, then a byte-by-byte copy into a c_byte array), with the
+array fields flattened; as written it could not run at all because the
+arrays were passed as single items. The current path passes the packed
+structure itself. Runs against the stub library, which keeps the last
+configuration written, so the round-trip checks double as a test of
+avaspec.py and device_config.py.
+
+    python benchmarks/bench_device_config.py
+"""
+import ctypes
+import struct
+import timeit
+
+import numpy as np
+
+from stub_lib import use_stub
+
+use_stub()
+
+from avaspec import *
+import device_config
+from device_config import CONFIG_SIZE, decode, encode, field_array, read_section, update_device_config, write_section
+
+LEGACY_FORMAT = ("=HH64B" + "BH5f?8ddd2ff2ff30H" + "HBf4096fBI" + "HBf4096f" + "4096f" +
+                 "?HHfIIBBHBBBBBHIIfHH12B" + "5f5f5f" + "?f2f" + "2f2f10f10f" + "IIIBHB" + "9720B" + "4096B")
+
+
+def legacy_encode(config):
+    values = []
+    for name, _ in DeviceConfigType._fields_:
+        value = getattr(config, name)
+        if isinstance(value, bytes):
+            values.extend(value.ljust(64, b"\0"))
+        elif isinstance(value, ctypes.Array):
+            values.extend(value)
+        else:
+            values.append(value)
+    temp = struct.pack(LEGACY_FORMAT, *values)
+    data = (ctypes.c_byte * 63484)()
+    x = 0
+    while (x < 63484):
+        data[x] = temp[x] - 256 if temp[x] > 127 else temp[x]
+        x += 1
+    return data
+
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    AVS_Init(0)
+    handle = AVS_Activate(AVS_GetList()[0])
+    config = AVS_GetParameter(handle)
+
+    assert struct.calcsize(LEGACY_FORMAT) == CONFIG_SIZE
+    assert bytes(legacy_encode(config)) == encode(config)
+
+    print(f"DeviceConfigType: {CONFIG_SIZE} bytes, sections: {', '.join(device_config.SECTIONS)}")
+    print(f"{'operation':<30}{'us':>12}")
+    print(f"{'legacy pack + byte loop':<30}{per_call_us(lambda: legacy_encode(config), 5):>12.0f}")
+    print(f"{'encode (bytes(struct))':<30}{per_call_us(lambda: encode(config), 2000):>12.1f}")
+    data = encode(config)
+    print(f"{'decode (from_buffer_copy)':<30}{per_call_us(lambda: decode(data), 2000):>12.1f}")
+    print(f"{'read_section Irradiance':<30}{per_call_us(lambda: read_section(config, 'Irradiance'), 2000):>12.1f}")
+
+    # round trip: irradiance calibration and spectrum correction
+    pixels = config.m_Detector_m_NrPixels
+    calib = np.linspace(1.0, 2.0, 4096, dtype=np.float32)
+    correct = np.linspace(0.5, 1.5, 4096, dtype=np.float32)
+    written, changed = update_device_config(
+        handle,
+        m_Irradiance_m_IntensityCalib_m_aCalibConvers=calib,
+        m_Irradiance_m_CalibrationType=1,
+        m_SpectrumCorrect=correct)
+    assert changed == ["m_Irradiance_m_IntensityCalib_m_aCalibConvers", "m_Irradiance_m_CalibrationType",
+                       "m_SpectrumCorrect"], changed
+    reread = AVS_GetParameter(handle)
+    assert encode(reread) == encode(written)
+    assert np.array_equal(field_array(reread, "m_Irradiance_m_IntensityCalib_m_aCalibConvers"), calib)
+    assert np.array_equal(field_array(reread, "m_SpectrumCorrect"), correct)
+    assert reread.m_Detector_m_NrPixels == pixels
+    for section in ("Detector", "Reflectance", "StandAlone", "OemData"):
+        assert read_section(reread, section) == read_section(config, section), section
+
+    # writing the same values again changes nothing and skips AVS_SetParameter
+    _, changed = update_device_config(handle, m_SpectrumCorrect=correct)
+    assert changed == []
+
+    # copying a section between configurations
+    blank = decode(bytes(CONFIG_SIZE))
+    write_section(blank, "Irradiance", read_section(reread, "Irradiance"))
+    assert np.array_equal(field_array(blank, "m_Irradiance_m_IntensityCalib_m_aCalibConvers"), calib)
+    assert AVS_SetParameter(handle, config) == 0
+    assert encode(AVS_GetParameter(handle)) == encode(config)
+    print("round trip: OK")
+    AVS_Done()
+
+
+if __name__ == "__main__":
+    main()
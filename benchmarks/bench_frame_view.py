@@ -0,0 +1,157 @@
+"""
+Showing 2048x1536 Mono8 camera frames in a 640x480 label: the original path
+(GRAY2RGB, an RGB888 QImage and a smooth QPixmap.scaled on the GUI thread)
+against frame_view.FrameView (a grayscale QImage of a frame scaled down with
+OpenCV on a worker thread).
+
+First the GUI-thread cost per frame, then frames pushed from another thread
+at the camera rate, as CameraStream's callback would: the original path gets
+one queued signal per frame, FrameView keeps only the newest. A 10 ms timer
+probes how late the event loop runs. Runs Qt offscreen, so it needs PyQt5
+and OpenCV but no display.
+
+    python benchmarks/bench_frame_view.py [seconds] [frames_per_s]
+"""
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QEventLoop, QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication, QLabel
+
+from frame_view import FrameView, fit_image, gray_qimage
+
+
+class LegacyView(QLabel):
+    def show_image(self, image):
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        h, w, ch = image_rgb.shape
+        bytes_per_line = 3 * w
+        q_img = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        pixmap = QPixmap.fromImage(q_img)
+        self.setPixmap(pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+
+class Relay(QObject):
+    # one queued signal per frame, as in the original scripts
+    frame = pyqtSignal(object)
+
+
+def gui_ms(fn, frames):
+    times = []
+    for frame in frames:
+        start = time.perf_counter()
+        fn(frame)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1e3
+
+
+def stream(app, show, frames, seconds, rate):
+    """Pushes frames from a thread at rate; returns (frames/s handled by the GUI, probe lateness ms)."""
+    late = []
+    state = {"probe": None}
+    stop = threading.Event()
+
+    def produce():
+        start = time.perf_counter()
+        i = 0
+        while not stop.is_set():
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            show(frames[i % len(frames)])
+            i += 1
+
+    def probe():
+        now = time.perf_counter()
+        if state["probe"] is not None:
+            late.append(max(0.0, now - state["probe"] - 0.010))
+        state["probe"] = now
+
+    prober = QTimer()
+    prober.setInterval(10)
+    prober.timeout.connect(probe)
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    producer = threading.Thread(target=produce)
+    prober.start()
+    producer.start()
+    loop.exec_()
+    stop.set()
+    producer.join()
+    prober.stop()
+    return np.median(late) * 1e3, np.max(late) * 1e3
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (1536, 2048), dtype=np.uint8)
+    frames = [np.roll(base, i, axis=1) for i in range(8)]
+
+    # the QImage shares the frame's memory, and scaling keeps the aspect ratio
+    qimage = gray_qimage(base)
+    assert qimage.format() == QImage.Format_Grayscale8 and int(qimage.constBits()) == base.ctypes.data
+    assert qimage.pixelColor(5, 3).red() == base[3, 5]
+    assert gray_qimage(base[:, :, None]).width() == 2048
+    bgr = np.dstack([base, base // 2, base // 4])
+    colour = gray_qimage(bgr)
+    assert colour.format() == QImage.Format_BGR888 and colour.pixelColor(5, 3).blue() == bgr[3, 5, 0]
+    for unpacked in (base[:, ::2], bgr[:, :, ::-1], bgr[:, ::2]):
+        try:
+            gray_qimage(unpacked)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted strides {unpacked.strides}")
+    assert fit_image(base, 640, 480).shape == (480, 640) and fit_image(base, 4096, 4096) is base
+
+    legacy = LegacyView("No Image")
+    view = FrameView()
+    for label in (legacy, view):
+        label.resize(640, 480)
+        label.show()
+    app.processEvents()
+
+    print(f"2048x1536 Mono8 frames into a 640x480 label")
+    print(f"{'GUI thread, per frame':<34}{'ms':>8}")
+    print(f"{'RGB888 + smooth scale':<34}{gui_ms(legacy.show_image, frames * 3):>8.2f}")
+    print(f"{'Grayscale8 QImage, full size':<34}"
+          f"{gui_ms(lambda f: QPixmap.fromImage(gray_qimage(f)), frames * 3):>8.2f}")
+    print(f"{'OpenCV scale + Grayscale8':<34}"
+          f"{gui_ms(lambda f: QPixmap.fromImage(gray_qimage(fit_image(f, 640, 480))), frames * 3):>8.2f}")
+
+    print(f"\nframes pushed at {rate:.0f}/s for {seconds:.0f} s")
+    print(f"{'method':<34}{'shown/s':>8}{'dropped':>9}{'probe late ms':>16}")
+    relay = Relay()
+    shown = []
+    relay.frame.connect(lambda image: (legacy.show_image(image), shown.append(1)))
+    start = time.perf_counter()
+    late_median, late_max = stream(app, relay.frame.emit, frames, seconds, rate)
+    # the signals still queued are what the original path falls behind by
+    backlog_start = len(shown)
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    print(f"{'RGB888 + smooth scale':<34}{backlog_start / seconds:>8.1f}{0:>9}"
+          f"{late_median:>9.1f} / {late_max:.0f}   ({len(shown) - backlog_start} frames backlog, "
+          f"{elapsed - seconds:.2f} s to catch up)")
+
+    late_median, late_max = stream(app, view.show_image, frames, seconds, rate)
+    app.processEvents()
+    print(f"{'FrameView':<34}{view.shown / seconds:>8.1f}{view.dropped:>9}{late_median:>9.1f} / {late_max:.0f}")
+    assert view.shown + view.dropped >= view.received - 1
+    assert view.pixmap().width() == 640 and view.pixmap().height() == 480
+    view.close_view()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Time per frame to histogram and draw a 2048x1536 Mono8 image: the original
+HistogramCanvas (GRAY2RGB, three calcHist calls, axes.clear, three plots and
+a full draw) against live_plots.HistogramCanvas (one histogram, set_ydata
+and blitting), with the histogram cost alone listed separately.
+
+Runs Qt offscreen, so it needs PyQt5 and Matplotlib but no display.
+
+    python benchmarks/bench_histogram.py [n_frames]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PyQt5.QtWidgets import QApplication
+
+from live_plots import HistogramCanvas, image_histogram
+
+
+class LegacyHistogramCanvas(FigureCanvas):
+    def __init__(self, parent=None, width=4, height=3, dpi=100):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = fig.add_subplot(111)
+        super().__init__(fig)
+        self.setParent(parent)
+
+    def plot_histogram(self, img):
+        self.axes.clear()
+        color_labels = ('b', 'g', 'r')
+        for i, color in enumerate(color_labels):
+            hist = cv2.calcHist([img], [i], None, [256], [0, 256])
+            self.axes.plot(hist, color=color)
+        self.axes.set_xlim([0, 256])
+        self.axes.set_title("RGB Histogram")
+        self.draw()
+
+
+def per_frame_ms(fn, frames):
+    times = []
+    for frame in frames:
+        start = time.perf_counter()
+        fn(frame)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1e3
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    rng = np.random.default_rng(0)
+    base = rng.normal(110, 30, (1536, 2048)).clip(0, 255).astype(np.uint8)
+    frames = [np.roll(base, i, axis=1) for i in range(n_frames)]
+
+    # the histogram is exact, for mono and for each colour channel
+    expected = np.bincount(base.ravel(), minlength=256)
+    assert np.array_equal(image_histogram(base)[0], expected)
+    bgr = np.dstack([base, 255 - base, base // 2])
+    hist = image_histogram(bgr)
+    assert hist.shape == (3, 256)
+    assert np.array_equal(hist[1], expected[::-1]) and hist[2].sum() == base.size
+
+    legacy = LegacyHistogramCanvas(width=4, height=2)
+    live = HistogramCanvas(width=4, height=2)
+    live_sub = HistogramCanvas(width=4, height=2, step=2)
+    for canvas in (legacy, live, live_sub):
+        canvas.resize(400, 200)
+        canvas.show()
+    app.processEvents()
+
+    print(f"{n_frames} frames, 2048x1536 Mono8")
+    print(f"{'method':<34}{'ms/frame':>10}")
+    print(f"{'RGB convert + 3 calcHist':<34}"
+          f"{per_frame_ms(lambda f: [cv2.calcHist([cv2.cvtColor(f, cv2.COLOR_GRAY2RGB)], [i], None, [256], [0, 256]) for i in range(3)], frames):>10.2f}")
+    print(f"{'image_histogram':<34}{per_frame_ms(image_histogram, frames):>10.2f}")
+    print(f"{'image_histogram, step 2':<34}{per_frame_ms(lambda f: image_histogram(f, 2), frames):>10.2f}")
+    print(f"{'legacy plot_histogram':<34}"
+          f"{per_frame_ms(lambda f: legacy.plot_histogram(cv2.cvtColor(f, cv2.COLOR_GRAY2RGB)), frames):>10.2f}")
+    print(f"{'HistogramCanvas (blit)':<34}{per_frame_ms(live.plot_histogram, frames):>10.2f}")
+    print(f"{'HistogramCanvas (blit), step 2':<34}{per_frame_ms(live_sub.plot_histogram, frames):>10.2f}")
+    assert len(live.lines) == 1 and np.array_equal(live.lines[0].get_ydata(), image_histogram(frames[-1])[0])
+
+
+if __name__ == "__main__":
+    main()
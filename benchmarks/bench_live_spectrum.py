@@ -0,0 +1,144 @@
+"""
+Live spectrum display of a 4096-pixel spectrometer streaming at 200 spectra/s:
+the original plot (axes.clear, plot, labels, grid, legend and a full draw per
+spectrum) against live_plots.SpectrumCanvas (copy per spectrum, decimated
+blit at most max_fps times a second), with and without the waterfall.
+
+Spectra arrive from a Qt timer, like the signals of an acquisition thread.
+A second timer probes the event loop every 10 ms; its lateness is what a
+button click or a camera frame would wait. Runs Qt offscreen, so it needs
+PyQt5 and Matplotlib but no display.
+
+    python benchmarks/bench_live_spectrum.py [seconds] [spectra_per_s]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from live_plots import SpectrumCanvas, minmax_decimate
+
+PIXELS = 4096
+
+
+class LegacySpectrumCanvas(FigureCanvas):
+    def __init__(self, parent=None, width=4, height=2, dpi=100):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.spectrum_axes = fig.add_subplot(111)
+        super().__init__(fig)
+        self.setParent(parent)
+        self.received = 0
+
+    def plot_spectrum(self, wavelengths, spectrum):
+        self.received += 1
+        self.spectrum_axes.clear()
+        self.spectrum_axes.plot(wavelengths, spectrum, label="Spectrum")
+        self.spectrum_axes.set_xlabel("Wavelength (nm)")
+        self.spectrum_axes.set_ylabel("Intensity")
+        self.spectrum_axes.set_title("Single Software Trigger Spectrum")
+        self.spectrum_axes.grid(True)
+        self.spectrum_axes.legend()
+        self.draw()
+
+
+def make_spectra(n):
+    rng = np.random.default_rng(0)
+    wavelengths = np.linspace(200.0, 1100.0, PIXELS)
+    line = 30000 * np.exp(-((wavelengths - 650.0) / 4.0) ** 2)
+    return wavelengths, [line * (1 + 0.01 * (i % 10)) + rng.normal(1000, 50, PIXELS) for i in range(n)]
+
+
+def run(app, canvas, wavelengths, spectra, seconds, rate):
+    """Feeds spectra at rate for seconds; returns (spectra/s shown, ms per call, probe lateness ms)."""
+    call_times = []
+    late = []
+    state = {"i": 0, "probe": None}
+
+    def feed():
+        spectrum = spectra[state["i"] % len(spectra)]
+        state["i"] += 1
+        start = time.perf_counter()
+        canvas.plot_spectrum(wavelengths, spectrum)
+        call_times.append(time.perf_counter() - start)
+
+    def probe():
+        now = time.perf_counter()
+        if state["probe"] is not None:
+            late.append(max(0.0, now - state["probe"] - 0.010))
+        state["probe"] = now
+
+    feeder, prober = QTimer(), QTimer()
+    feeder.setInterval(max(1, int(1000 / rate)))
+    prober.setInterval(10)
+    feeder.timeout.connect(feed)
+    prober.timeout.connect(probe)
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    feeder.start()
+    prober.start()
+    start = time.perf_counter()
+    loop.exec_()
+    elapsed = time.perf_counter() - start
+    feeder.stop()
+    prober.stop()
+    app.processEvents()
+    return (state["i"] / elapsed, np.median(call_times) * 1e3,
+            np.median(late) * 1e3, np.max(late) * 1e3 if late else 0.0)
+
+
+def check_decimation(spectrum):
+    # the envelope keeps the extremes of every bin, and short data is untouched
+    columns = 300
+    index, values = minmax_decimate(spectrum, columns)
+    assert len(index) == len(values) == 2 * columns
+    starts = index[0::2]
+    bounds = list(starts) + [len(spectrum)]
+    for c in (0, 1, columns // 2, columns - 1):
+        segment = spectrum[bounds[c]:bounds[c + 1]]
+        assert values[2 * c] == segment.min() and values[2 * c + 1] == segment.max()
+    assert values.max() == spectrum.max() and values.min() == spectrum.min()
+    index, values = minmax_decimate(spectrum[:500], columns)
+    assert len(values) == 500 and np.array_equal(index, np.arange(500))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    wavelengths, spectra = make_spectra(64)
+    check_decimation(spectra[0])
+
+    legacy = LegacySpectrumCanvas(width=4, height=2)
+    live = SpectrumCanvas(width=4, height=2, title="Single Software Trigger Spectrum")
+    waterfall = SpectrumCanvas(width=4, height=4, waterfall_rows=200)
+    for canvas in (legacy, live, waterfall):
+        canvas.resize(400, canvas.height())
+        canvas.show()
+    app.processEvents()
+
+    print(f"{PIXELS}-pixel spectra offered at {rate:.0f}/s for {seconds:.0f} s")
+    print(f"{'method':<28}{'spectra/s':>10}{'ms/call':>9}{'redraws':>9}{'probe late ms':>16}")
+    for name, canvas in (("clear + plot + draw", legacy), ("SpectrumCanvas", live),
+                         ("SpectrumCanvas, waterfall", waterfall)):
+        shown, call_ms, late_median, late_max = run(app, canvas, wavelengths, spectra, seconds, rate)
+        redraws = getattr(canvas, "drawn", canvas.received)
+        print(f"{name:<28}{shown:>10.1f}{call_ms:>9.3f}{redraws:>9}{late_median:>9.1f} / {late_max:.0f}")
+
+    # the newest spectrum is on screen, and the waterfall has a row per spectrum at pixel width
+    x, y = live.line.get_data()
+    assert len(y) == 2 * live._columns and y.max() == live._latest.max()
+    assert waterfall.waterfall.shape == (200, waterfall._columns)
+    assert np.array_equal(waterfall.waterfall[0], np.maximum.reduceat(waterfall._latest, waterfall._starts))
+
+
+if __name__ == "__main__":
+    main()
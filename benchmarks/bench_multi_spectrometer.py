@@ -0,0 +1,95 @@
+"""
+Aggregate scan rate with 1, 2 and 4 synchronised spectrometers: one thread
+polling every handle in turn against a StitchedStream, which drains each
+handle on its own thread and merges the scans into stitched spectra.
+
+Runs against the stub library with AVS_STUB_DEVICES attached devices, whose
+bands overlap by about 100 nm and whose sync slaves follow the master's
+period (see stub_avs.c). The checks on the stitched wavelengths, frame
+counts and device skew double as a self-test of multi_spectrometer.py.
+
+    python benchmarks/bench_multi_spectrometer.py [n_frames] [integration_ms]
+"""
+import ctypes
+import os
+import sys
+import time
+
+import numpy as np
+
+from stub_lib import use_stub
+
+use_stub()
+
+from avaspec import *
+from multi_spectrometer import SpectrometerArray, stitch_plan
+from spectrometer import allocate_scans, wait_for_scan
+
+
+def sequential(array, n_frames):
+    # one thread, waiting on each device in turn
+    for session in array.start_order():
+        session.prepare()
+        AVS_Measure(session.handle, 0, n_frames)
+    out, _ = allocate_scans(1)
+    timelabel = ctypes.c_uint32()
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        for session in array.sessions:
+            wait_for_scan(session.handle, timeout=1.0)
+            AVS_GetScopeDataBuffer(session.handle, timelabel, out.ctypes.data)
+    elapsed = time.perf_counter() - start
+    for session in reversed(array.start_order()):
+        AVS_StopMeasure(session.handle)
+    return elapsed
+
+
+def stitched(array, n_frames):
+    with array.stream(capacity=256, nummeas=n_frames) as stream:
+        start = time.perf_counter()
+        frames = [stream.read(timeout=1.0) for _ in range(n_frames)]
+        elapsed = time.perf_counter() - start
+        stats = stream.stats()
+    assert stats["frames"] == n_frames and stats["dropped"] == 0 and stats["missed"] == 0, stats
+    if array.sync:
+        assert stats["max_skew_ticks"] == 0, stats
+    timestamps, spectrum = frames[-1]
+    assert len(timestamps) == len(array.sessions)
+    assert spectrum.shape == array.wavelengths.shape
+    return elapsed
+
+
+def check_stitch_plan():
+    low = np.linspace(200.0, 1100.0, 1000)
+    high = np.linspace(1000.0, 1700.0, 500)
+    far = np.linspace(1800.0, 2500.0, 100)
+    pieces, wavelengths = stitch_plan([high, far, low])
+    assert [device for device, _, _ in pieces] == [2, 0, 1]
+    assert np.all(np.diff(wavelengths) > 0)
+    assert wavelengths[0] == 200.0 and wavelengths[-1] == 2500.0
+    # cut half way through the 1000-1100 nm overlap, nothing lost at the gap
+    assert abs(low[pieces[0][2] - 1] - 1050.0) < 1.0
+    assert pieces[2] == (1, 0, 100)
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    integration_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    check_stitch_plan()
+
+    print(f"{n_frames} synchronised frames, {integration_ms} ms integration, stub library")
+    print(f"{'devices':<9}{'method':<14}{'frames/s':>10}{'scans/s':>10}{'stitched px':>13}")
+    for n_devices in (1, 2, 4):
+        # read by the stub in AVS_Init
+        os.environ["AVS_STUB_DEVICES"] = str(n_devices)
+        with SpectrometerArray(integration_time=integration_ms) as array:
+            assert len(array.sessions) == n_devices
+            assert np.all(np.diff(array.wavelengths) > 0)
+            for name, run in (("sequential", sequential), ("stitched", stitched)):
+                elapsed = run(array, n_frames)
+                print(f"{n_devices:<9}{name:<14}{n_frames / elapsed:>10.0f}{n_frames * n_devices / elapsed:>10.0f}"
+                      f"{len(array.wavelengths):>13}")
+
+
+if __name__ == "__main__":
+    main()
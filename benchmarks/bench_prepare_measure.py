@@ -0,0 +1,82 @@
+"""
+Cost of AVS_PrepareMeasure before every scan: the original wrapper (struct.pack
+plus a byte-by-byte copy into a c_byte * 41, then the call) against the
+current one, which passes the packed MeasConfigType directly and skips the
+call when the config has not changed.
+
+Runs against the stub library, where AVS_PrepareMeasure takes one simulated
+USB round trip (see stub_avs.c).
+
+    python benchmarks/bench_prepare_measure.py [n_scans]
+"""
+import ctypes
+import struct
+import sys
+import time
+
+import numpy as np
+
+from stub_lib import use_stub
+
+use_stub()
+
+import avaspec
+from avaspec import *
+from spectrometer import make_measconfig
+
+
+def legacy_PrepareMeasure(handle, measconf):
+    datatype = ctypes.c_byte * 41
+    data = datatype()
+    temp = struct.pack("HHfIIBBHBBBBBHIIfH", measconf.m_StartPixel, measconf.m_StopPixel,
+                       measconf.m_IntegrationTime, measconf.m_IntegrationDelay, measconf.m_NrAverages,
+                       measconf.m_CorDynDark_m_Enable, measconf.m_CorDynDark_m_ForgetPercentage,
+                       measconf.m_Smoothing_m_SmoothPix, measconf.m_Smoothing_m_SmoothModel,
+                       measconf.m_SaturationDetection, measconf.m_Trigger_m_Mode, measconf.m_Trigger_m_Source,
+                       measconf.m_Trigger_m_SourceType, measconf.m_Control_m_StrobeControl,
+                       measconf.m_Control_m_LaserDelay, measconf.m_Control_m_LaserWidth,
+                       measconf.m_Control_m_LaserWaveLength, measconf.m_Control_m_StoreToRam)
+    x = 0
+    while (x < 41):
+        data[x] = temp[x]
+        x += 1
+    prototype = avaspec.func(ctypes.c_int, ctypes.c_int, ctypes.c_byte * 41)
+    function = prototype(("AVS_PrepareMeasure", avaspec.load_library()), ((1, "handle"), (1, "measconf")))
+    return function(handle, data)
+
+
+def per_call_us(prepare, handle, configs, n_scans):
+    times = []
+    for i in range(n_scans):
+        start = time.perf_counter()
+        prepare(handle, configs[i % len(configs)])
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1e6
+
+
+def main():
+    n_scans = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    AVS_Init(0)
+    handle = AVS_Activate(AVS_GetList()[0])
+    fixed = [make_measconfig(2048, 10.0)]
+    alternating = [make_measconfig(2048, 10.0), make_measconfig(2048, 20.0)]
+
+    # the old native-alignment format string puts a pad byte after
+    # m_Trigger_m_SourceType, shifting every later field; the packed struct
+    # has the SDK layout
+    strobe = make_measconfig(2048, 10.0)
+    strobe.m_Control_m_StrobeControl = 1
+    legacy_bytes = struct.pack("HHfIIBBHBBBBBHIIfH", *[getattr(strobe, f) for f, _ in MeasConfigType._fields_])
+    print(f"MeasConfigType {ctypes.sizeof(MeasConfigType)} bytes, legacy pack {len(legacy_bytes)} bytes, "
+          f"StrobeControl at offset 25: legacy {legacy_bytes[25]}, packed {bytes(strobe)[25]}")
+    print(f"{n_scans} scans")
+    print(f"{'config':<16}{'legacy us':>12}{'current us':>12}")
+    for name, configs in [("fixed", fixed), ("changing", alternating)]:
+        legacy = per_call_us(legacy_PrepareMeasure, handle, configs, n_scans)
+        current = per_call_us(AVS_PrepareMeasure, handle, configs, n_scans)
+        print(f"{name:<16}{legacy:>12.1f}{current:>12.1f}")
+    AVS_Done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Time from a scan becoming ready to its data being available in Python, for
+the old sleep-polling loop, the adaptive wait_for_scan poll and the
+AVS_MeasureCallback notification path.
+
+Each round is a single-scan measurement, as in the trigger scripts. The stub
+library makes the scan ready STUB_TRANSFER_MS after the integration time, so
+the reported latency is pure waiting overhead.
+
+    python benchmarks/bench_scan_latency.py
+"""
+import time
+
+import numpy as np
+from stub_lib import use_stub
+
+use_stub()
+
+from avaspec import *
+from spectrometer import ScanCompletion, allocate_scans, read_scans, wait_for_scan
+
+INTEGRATION_MS = 2.0
+STUB_TRANSFER_MS = 0.6  # keep in sync with stub_avs.c
+N_ROUNDS = 200
+
+
+def legacy_wait(handle):
+    # the loop avantes_readout used: sleep a whole integration time per poll
+    while not AVS_PollScan(handle):
+        time.sleep(INTEGRATION_MS / 1000)
+
+
+def latencies(handle, pixels, use_callback, wait=None):
+    out, timestamps = allocate_scans(1)
+    result = np.empty(N_ROUNDS)
+    for i in range(N_ROUNDS):
+        start = time.perf_counter()
+        if use_callback:
+            completion = ScanCompletion()
+            AVS_MeasureCallback(handle, completion.callback, 1)
+            wait = completion.wait
+        else:
+            AVS_Measure(handle, 0, 1)
+        read_scans(handle, 1, pixels, out=out, timestamps=timestamps, wait=wait)
+        ready = start + (INTEGRATION_MS + STUB_TRANSFER_MS) / 1000
+        result[i] = time.perf_counter() - ready
+    return result * 1e6
+
+
+def main():
+    AVS_Init(0)
+    handle = AVS_Activate(AVS_GetList()[0])
+    pixels = AVS_GetParameter(handle).m_Detector_m_NrPixels
+    measconfig = MeasConfigType()
+    measconfig.m_StopPixel = pixels - 1
+    measconfig.m_IntegrationTime = INTEGRATION_MS
+    measconfig.m_NrAverages = 1
+    AVS_PrepareMeasure(handle, measconfig)
+
+    print(f"{N_ROUNDS} single scans at {INTEGRATION_MS} ms integration")
+    print(f"{'wait strategy':<26}{'p50 us':>10}{'p99 us':>10}")
+    for name, kwargs in [
+        ("sleep(integration time)", dict(use_callback=False, wait=legacy_wait)),
+        ("wait_for_scan", dict(use_callback=False, wait=wait_for_scan)),
+        ("AVS_MeasureCallback", dict(use_callback=True)),
+    ]:
+        lat = latencies(handle, pixels, **kwargs)
+        print(f"{name:<26}{np.percentile(lat, 50):>10.0f}{np.percentile(lat, 99):>10.0f}")
+    AVS_Done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-shot latency of a single software-triggered spectrum: re-initialising the
+spectrometer for every shot (the old avantes_init path) against a persistent
+SpectrometerSession.
+
+Runs against the stub library, whose AVS_Init, AVS_Activate and
+AVS_GetParameter take rough USB-like times (see stub_avs.c).
+
+    python benchmarks/bench_session.py [n_shots] [integration_ms]
+"""
+import sys
+import time
+
+import numpy as np
+
+from stub_lib import use_stub
+
+use_stub()
+
+from avaspec import *
+from spectrometer import SpectrometerSession, make_measconfig, wait_for_scan
+
+
+def reinit_shot(integration_ms):
+    # what single_trigger_measurement did on every button press
+    AVS_Init(0)
+    handle = AVS_Activate(AVS_GetList()[0])
+    pixels = AVS_GetParameter(handle).m_Detector_m_NrPixels
+    AVS_GetLambda(handle)
+    AVS_PrepareMeasure(handle, make_measconfig(pixels, integration_ms))
+    AVS_Measure(handle, 0, 1)
+    wait_for_scan(handle)
+    return AVS_GetScopeData(handle)
+
+
+def time_shots(shot, n_shots):
+    times = []
+    for _ in range(n_shots):
+        start = time.perf_counter()
+        shot()
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1e3
+
+
+def main():
+    n_shots = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    integration_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    print(f"{n_shots} shots, {integration_ms} ms integration")
+    print(f"{'method':<22}{'p50 ms':>10}{'max ms':>10}")
+    reinit = time_shots(lambda: reinit_shot(integration_ms), n_shots)
+    AVS_Done()
+    print(f"{'re-initialise':<22}{np.median(reinit):>10.1f}{reinit.max():>10.1f}")
+
+    with SpectrometerSession(integration_time=integration_ms) as session:
+        cached = time_shots(session.measure_one, n_shots)
+    print(f"{'SpectrometerSession':<22}{np.median(cached):>10.1f}{cached.max():>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+End-to-end trigger cycle of 5_integrate_timing.py on the simulated backends
+(ACQ_SIMULATE=all, see simulation.py): Trigger.run pulses the spectrometer
+and camera lines on fake_ljm, the rising camera edge triggers fake_vimba
+through the line wiring, the frame comes out of the CameraStream pool and
+the rising spectrometer edge starts the armed stub spectrometer's scan of a
+synthetic spectrum; images and spectra go
+through the write-behind queue into a temporary directory.
+
+Prints the time per cycle and its parts, then checks that every trigger
+gave exactly one frame, that the spectrum has the Hg 546 nm line where
+expected and grows with the integration time, and that the edges were
+recorded on both lines. Needs a C compiler for the stub library and PyQt5
+for the script's imports, but no hardware.
+
+    python benchmarks/bench_simulation.py [n_cycles] [integration_ms]
+"""
+import contextlib
+import io
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "all")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+
+def main():
+    n_cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    integration_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    workdir = tempfile.mkdtemp(prefix="bench_simulation_")
+    script = runpy.run_path(os.path.join(REPO_ROOT, "5_integrate_timing.py"), run_name="bench_simulation")
+    fake_ljm = sys.modules["labjack.ljm"]
+    os.chdir(workdir)
+
+    camera = script["CameraController"]()
+    spectrometer = script["SpectrometerController"](int_time=integration_ms)
+    writer = script["WriteBehindQueue"]()
+    data_saver = script["DataSaver"](columns=("trigger_time", "trigger_sequence"))
+    snapshots = script["SnapshotHandler"](camera, writer)
+    spectra = script["SpectralMeasurementHandler"](spectrometer)
+    trigger = script["Trigger"](snapshots, spectra, data_saver, writer)
+
+    start = time.perf_counter()
+    camera.initialize_camera()
+    wavelengths = spectrometer.initialize()
+    trigger.sync.get()  # the LabJack opens on first use
+    setup_s = time.perf_counter() - start
+
+    cycle_times = []
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        for _ in range(n_cycles):
+            start = time.perf_counter()
+            trigger.run(wavelengths=wavelengths)
+            cycle_times.append(time.perf_counter() - start)
+
+    # the parts of a cycle on their own
+    frame_times, spectrum_times = [], []
+    with contextlib.redirect_stdout(log):
+        for _ in range(10):
+            seq = snapshots.next_seq()
+            start = time.perf_counter()
+            trigger.send_trigger()
+            camera.stream.next_frame(seq, timeout=1.0)
+            frame_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            _, spectrum = spectra.measure()
+            spectrum_times.append(time.perf_counter() - start)
+    writer.flush()
+
+    print(f"ACQ_SIMULATE={os.environ['ACQ_SIMULATE']}, {n_cycles} cycles, {integration_ms} ms integration")
+    print(f"{'setup (all devices)':<34}{setup_s * 1e3:>9.1f} ms")
+    print(f"{'Trigger.run, median':<34}{np.median(cycle_times) * 1e3:>9.1f} ms")
+    print(f"{'Trigger.run, max':<34}{np.max(cycle_times) * 1e3:>9.1f} ms")
+    print(f"{'trigger to frame, median':<34}{np.median(frame_times) * 1e3:>9.1f} ms")
+    print(f"{'spectrum measure, median':<34}{np.median(spectrum_times) * 1e3:>9.1f} ms")
+    print(f"{'cycles/s':<34}{n_cycles / sum(cycle_times):>9.1f}")
+
+    stats = camera.stream.stats()
+    assert "Error" not in log.getvalue(), log.getvalue()
+    assert stats["received"] == n_cycles + 10 and stats["dropped"] == 0, stats
+    rising = [edge for edge in fake_ljm.edges(trigger.handle) if edge[1] == 1]
+    assert len([e for e in rising if e[0] == "DIO4"]) == len([e for e in rising if e[0] == "DIO5"]) == n_cycles + 10
+    peak = np.argmax(np.where(np.abs(wavelengths - 546.1) < 5, spectrum, 0))
+    assert abs(wavelengths[peak] - 546.1) < 1.0 and spectrum[peak] > 1000 + 300 * integration_ms
+    assert len(os.listdir(workdir)) >= 2
+
+    spectrometer.session.configure(integration_time=2 * integration_ms)
+    spectrometer.initialize()
+    _, doubled = spectra.measure()
+    assert doubled[peak] - 1000 > 1.8 * (spectrum[peak] - 1000)
+
+    with contextlib.redirect_stdout(log):
+        trigger.close()
+        camera.close()
+        spectrometer.close()
+    writer.close()
+    data_saver.close()
+
+
+if __name__ == "__main__":
+    main()
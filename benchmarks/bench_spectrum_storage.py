@@ -0,0 +1,113 @@
+"""
+Write throughput and file size when saving spectra: one CSV per spectrum (the
+old DataSaver) against the binary writers in spectrum_storage.py.
+
+Also checks that an NPZ file whose chunk numbers pass 99999 reads back in
+order. Needs no hardware or stub library, only NumPy (and h5py for the HDF5 row).
+
+    python benchmarks/bench_spectrum_storage.py [n_spectra] [pixels]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spectrum_storage
+from spectrum_storage import DataSaver, load_spectra, open_spectrum_writer
+
+
+def csv_per_spectrum(directory, wavelengths, spectra):
+    # the original DataSaver.save_spectrum, one file per shot
+    for i, spectrum in enumerate(spectra):
+        filename = os.path.join(directory, f"spectrum_{i:05d}.csv")
+        with open(filename, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Wavelength (nm)", "Intensity"])
+            for wl, intensity in zip(wavelengths, spectrum):
+                writer.writerow([wl, intensity])
+
+
+def binary_streamed(path, wavelengths, spectra, timestamps):
+    with open_spectrum_writer(path, wavelengths) as writer:
+        for spectrum, timestamp in zip(spectra, timestamps):
+            writer.append(spectrum, timestamp)
+
+
+def binary_per_shot(path, wavelengths, spectra, timestamps):
+    # every spectrum written as soon as it arrives
+    with open_spectrum_writer(path, wavelengths) as writer:
+        for spectrum, timestamp in zip(spectra, timestamps):
+            writer.append(spectrum, timestamp)
+            writer.flush()
+
+
+def binary_saver(path, wavelengths, spectra, timestamps):
+    # what the GUI scripts do: DataSaver, written in chunks of 16
+    saver = DataSaver(path)
+    for spectrum, timestamp in zip(spectra, timestamps):
+        saver.save_spectrum(wavelengths, spectrum, timestamp)
+    saver.close()
+
+
+def check_chunk_order(directory, wavelengths):
+    # chunk 100000 sorts before 99998 by name
+    path = os.path.join(directory, "many_chunks.npz")
+    with open_spectrum_writer(path, wavelengths, chunk_size=1) as writer:
+        writer._chunks = 99_998
+        for timestamp in range(4):
+            writer.append(np.full(len(wavelengths), timestamp), timestamp)
+    assert list(load_spectra(path)["timestamps"]) == [0, 1, 2, 3]
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pixels = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+
+    rng = np.random.default_rng(0)
+    wavelengths = np.linspace(200.0, 1100.0, pixels)
+    spectra = rng.uniform(0, 60000, (n_spectra, pixels)).round()
+    timestamps = np.arange(n_spectra, dtype=np.uint32) * 10_000
+
+    cases = [("csv, file per spectrum", "csv", None)]
+    extensions = [".npz"] + ([".h5"] if spectrum_storage.h5py is not None else [])
+    for extension in extensions:
+        cases.append((f"{extension[1:]}, streamed", extension, binary_streamed))
+        cases.append((f"{extension[1:]}, flush per shot", extension, binary_per_shot))
+        cases.append((f"{extension[1:]}, DataSaver", extension, binary_saver))
+
+    print(f"{n_spectra} spectra x {pixels} pixels")
+    print(f"{'format':<26}{'spectra/s':>12}{'MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, extension, write) in enumerate(cases):
+            if write is None:
+                path = os.path.join(tmp, f"csv_{i}")
+                os.mkdir(path)
+                start = time.perf_counter()
+                csv_per_spectrum(path, wavelengths, spectra)
+            else:
+                path = os.path.join(tmp, f"run_{i}{extension}")
+                start = time.perf_counter()
+                write(path, wavelengths, spectra, timestamps)
+            elapsed = time.perf_counter() - start
+
+            if write is not None:
+                data = load_spectra(path)
+                assert np.array_equal(data["spectra"], spectra)
+                assert np.array_equal(data["timestamps"], timestamps)
+            print(f"{name:<26}{n_spectra / elapsed:>12.0f}{directory_size(path) / 1e6:>10.1f}")
+        check_chunk_order(tmp, wavelengths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup of 5_integrate_timing.py on the simulated backends (ACQ_SIMULATE=all,
+see simulation.py), each run in a fresh interpreter:
+
+  eager  the old order: every device is opened one after the other (LabJack,
+         Vimba system, AvaSpec library load and AVS_Init) before the window
+         is built
+  lazy   the script as it is: the window is shown first, then the devices
+         open in parallel on background threads (device_loader.start_all)
+
+Prints the time from the start of the script import until the window is
+shown and until every device is open, then checks that the lazy window
+appears without waiting for any device, that importing the script loads no
+SDK library, and that the parallel open takes about as long as the slowest
+device rather than the sum. fake_ljm and fake_vimba model 0.3 s and 0.5 s of
+USB enumeration. Needs a C compiler for the stub library and PyQt5.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "all")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def child(mode):
+    start = time.perf_counter()
+    script = runpy.run_path(os.path.join(REPO_ROOT, "5_integrate_timing.py"), run_name="bench_startup")
+    imported = time.perf_counter() - start
+    library_loaded = sys.modules["avaspec"].lib is not None
+
+    from PyQt5.QtWidgets import QApplication
+    from device_loader import open_times
+    app = QApplication([])
+    devices = [script["lj_device"], script["vimba_device"], script["avs_library"]]
+    if mode == "eager":
+        for device in devices:
+            device.get()
+    win = script["MainApp"]()
+    win.show()
+    app.processEvents()
+    shown = time.perf_counter() - start
+    if mode == "lazy":
+        script["start_all"](win.trigger.sync, *devices[1:])
+    win.trigger.sync.get()
+    for device in devices:
+        device.get()
+    ready = time.perf_counter() - start
+
+    win.close()
+    print(json.dumps({"imported": imported, "shown": shown, "ready": ready, "library_loaded": library_loaded,
+                      "open_times": open_times(*devices)}))
+
+
+def run(mode):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode],
+                            capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    run("lazy")  # builds the stub library and warms the disk cache
+    results = {mode: [run(mode) for _ in range(runs)] for mode in ("eager", "lazy")}
+
+    def median(mode, key):
+        values = sorted(r[key] for r in results[mode])
+        return values[len(values) // 2]
+
+    print(f"ACQ_SIMULATE={os.environ['ACQ_SIMULATE']}, median of {runs} runs")
+    print(f"{'':<8}{'import':>10}{'window':>10}{'devices':>10}")
+    for mode in ("eager", "lazy"):
+        print(f"{mode:<8}" + "".join(f"{median(mode, key) * 1e3:>8.0f}ms" for key in ("imported", "shown", "ready")))
+    print("open times (lazy):", {name: f"{t * 1e3:.0f} ms" for name, t in results["lazy"][-1]["open_times"].items()})
+
+    open_times = results["lazy"][-1]["open_times"]
+    assert not any(r["library_loaded"] for r in results["lazy"])
+    assert median("lazy", "shown") < median("eager", "shown") - 0.6
+    assert median("lazy", "ready") < median("eager", "ready") - 0.2
+    assert median("lazy", "ready") - median("lazy", "shown") < max(open_times.values()) + 0.2
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        main()
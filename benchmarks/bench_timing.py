@@ -0,0 +1,128 @@
+"""
+Cost of the timing instrumentation (timing.py) and the stage breakdown it
+gives for the trigger cycle of 5_integrate_timing.py on the simulated
+backends (ACQ_SIMULATE=all, see simulation.py).
+
+First times a bare span() with timing disabled and enabled, then runs
+Trigger.run with timing off and on and draws each spectrum on a
+SpectrumCanvas. Prints the per-stage p50/p99 table, checks that every stage
+of the cycle was recorded and that the JSON and Prometheus exports hold
+them, and that the instrumented cycle is not measurably slower. Needs a C
+compiler for the stub library and PyQt5, but no hardware.
+
+    python benchmarks/bench_timing.py [n_cycles] [integration_ms]
+"""
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ACQ_SIMULATE", "all")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+import timing
+
+STAGES = ("trigger", "frame_arrival", "prepare_measure", "measure", "poll_complete", "get_scope_data",
+          "disk_write", "trigger_to_saved", "plot_spectrum")
+
+
+def span_cost(n=200_000):
+    null = contextlib.nullcontext()
+    start = time.perf_counter()
+    for _ in range(n):
+        with null:
+            pass
+    baseline = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n):
+        with timing.span("bench"):
+            pass
+    return (time.perf_counter() - start - baseline) / n
+
+
+def main():
+    n_cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    integration_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    timing.enable(False)
+    disabled = span_cost()
+    timing.enable(True)
+    enabled = span_cost()
+    timing.timings.reset()
+    # on top of an empty with block
+    print(f"{'span(), timing disabled':<28}{disabled * 1e9:>8.0f} ns")
+    print(f"{'span(), timing enabled':<28}{enabled * 1e9:>8.0f} ns")
+
+    workdir = tempfile.mkdtemp(prefix="bench_timing_")
+    script = runpy.run_path(os.path.join(REPO_ROOT, "5_integrate_timing.py"), run_name="bench_timing")
+    os.chdir(workdir)
+    from PyQt5.QtWidgets import QApplication
+    from live_plots import SpectrumCanvas
+    app = QApplication([])
+    canvas = SpectrumCanvas(max_fps=1000)
+    canvas.show()
+
+    camera = script["CameraController"]()
+    spectrometer = script["SpectrometerController"](int_time=integration_ms)
+    writer = script["WriteBehindQueue"]()
+    data_saver = script["DataSaver"](columns=("trigger_time", "trigger_sequence"))
+    snapshots = script["SnapshotHandler"](camera, writer)
+    spectra = script["SpectralMeasurementHandler"](spectrometer)
+    trigger = script["Trigger"](snapshots, spectra, data_saver, writer)
+    camera.initialize_camera()
+    wavelengths = spectrometer.initialize()
+    trigger.sync.get()
+
+    log = io.StringIO()
+    cycle_times = {}
+    for on in (False, True, False, True):
+        timing.enable(on)
+        times = cycle_times.setdefault(on, [])
+        with contextlib.redirect_stdout(log):
+            for _ in range(n_cycles):
+                start = time.perf_counter()
+                trigger.run(wavelengths=wavelengths)
+                times.append(time.perf_counter() - start)
+                canvas.plot_spectrum(wavelengths, spectra.measure()[1])
+                app.processEvents()
+        writer.flush()
+    timing.enable(False)
+
+    print(f"\n{n_cycles * 2} cycles each, {integration_ms} ms integration")
+    print(f"{'Trigger.run, timing off':<28}{np.median(cycle_times[False]) * 1e3:>8.2f} ms")
+    print(f"{'Trigger.run, timing on':<28}{np.median(cycle_times[True]) * 1e3:>8.2f} ms")
+    print()
+    print(timing.timings.summary())
+
+    stats = timing.timings.stats()
+    exported = json.loads(timing.timings.to_json())["stages"]
+    prometheus = timing.timings.to_prometheus()
+    assert "Error" not in log.getvalue(), log.getvalue()
+    assert disabled < 0.5e-6, disabled
+    for stage in STAGES:
+        assert stats.get(stage, {}).get("count"), stage
+        assert exported[stage]["count"] == stats[stage]["count"]
+        assert f'acquisition_stage_seconds_count{{stage="{stage}"}} {stats[stage]["count"]}' in prometheus
+    assert stats["trigger_to_saved"]["count"] == n_cycles * 2
+    # the spectrum is measured after the frame, so the cycle covers both
+    assert stats["trigger_to_saved"]["p50_ms"] > stats["measure"]["p50_ms"] + stats["poll_complete"]["p50_ms"]
+    assert np.median(cycle_times[True]) < np.median(cycle_times[False]) * 1.1 + 0.5e-3
+
+    with contextlib.redirect_stdout(log):
+        trigger.close()
+        camera.close()
+        spectrometer.close()
+    writer.close()
+    data_saver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Pulse width accuracy of the LabJack trigger: the old eWriteName / sleep /
+eWriteName sequence against the device-timed modes of PulseTrigger, and the
+skew between the spectrometer and camera lines when pulsed one after the
+other against SyncTrigger.
+
+Runs against fake_ljm, which models the USB command round trip (0.5 ms
++- 0.2 ms by default) and records when each edge reaches the line, so it
+needs no LabJack. The checks at the end also make it a quick self-test of
+labjack_trigger.py.
+
+    python benchmarks/bench_trigger_pulse.py [n_pulses] [width_us]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_ljm
+from labjack_trigger import PulseTrigger, SyncTrigger
+
+
+def legacy_pulse(handle, line, width_us):
+    fake_ljm.eWriteName(handle, line, 1)
+    time.sleep(width_us / 1_000_000.0)
+    fake_ljm.eWriteName(handle, line, 0)
+
+
+def measure(name, fire, handle, line, width_us, n_pulses):
+    start = len(fake_ljm.pulse_widths(handle, line))
+    host = []
+    for _ in range(n_pulses):
+        t0 = time.perf_counter()
+        fire()
+        host.append(time.perf_counter() - t0)
+    widths = np.array(fake_ljm.pulse_widths(handle, line)[start:]) * 1e6
+    error = widths - width_us
+    print(f"{name:<16}{np.mean(widths):>12.1f}{np.std(widths):>10.1f}{np.abs(error).max():>12.1f}"
+          f"{np.median(host) * 1e3:>12.2f}")
+    return widths
+
+
+def main():
+    n_pulses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width_us = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+    line = "FIO4"
+    handle = fake_ljm.openS("ANY", "USB", "ANY")
+
+    print(f"{n_pulses} pulses of {width_us} us on {line}, fake LJM")
+    print(f"{'method':<16}{'mean us':>12}{'std us':>10}{'max err us':>12}{'host ms':>12}")
+    measure("sleep", lambda: legacy_pulse(handle, line, width_us), handle, line, width_us, n_pulses)
+
+    wait = PulseTrigger(handle, line, width_us=width_us, ljm_module=fake_ljm)
+    widths = measure("wait", wait.fire, handle, line, width_us, n_pulses)
+    assert np.allclose(widths, width_us, atol=1.0)
+    print(wait.timing_summary())
+
+    pulse_out = PulseTrigger(handle, line, width_us=width_us, mode="pulse_out", ljm_module=fake_ljm)
+    widths = measure("pulse_out", pulse_out.fire, handle, line, width_us, n_pulses)
+    assert np.allclose(widths, width_us, atol=0.1)
+    print(pulse_out.timing_summary())
+
+    # a train of 10 pulses, 1 ms apart, in one command
+    for trigger in (wait, pulse_out):
+        before = len(fake_ljm.edges(handle, line))
+        trigger.fire(count=10, period_us=1000)
+        rises = [t for _, level, t in fake_ljm.edges(handle, line)[before:] if level]
+        assert len(rises) == 10
+        assert np.allclose(np.diff(rises), 1e-3, atol=1e-6)
+    pulse_out.close()
+    wait.close()
+    print("pulse trains: OK")
+
+    # two lines, spectrometer and camera
+    cam_line = "FIO5"
+    print()
+    print(f"{n_pulses} triggers on {line}+{cam_line}")
+    print(f"{'method':<16}{'skew mean us':>14}{'skew max us':>14}{'edge est. err us':>18}")
+    skews = []
+    for _ in range(n_pulses):
+        before = len(fake_ljm.edges(handle))
+        legacy_pulse(handle, line, width_us)
+        legacy_pulse(handle, cam_line, width_us)
+        rises = {name: t for name, level, t in fake_ljm.edges(handle)[before:] if level}
+        skews.append(rises["DIO5"] - rises["DIO4"])
+    skews = np.array(skews) * 1e6
+    print(f"{'sequential':<16}{skews.mean():>14.1f}{skews.max():>14.1f}{'-':>18}")
+
+    for delay_us in (0, 50):
+        sync = SyncTrigger(handle, [line, cam_line], width_us=width_us, delays_us={cam_line: delay_us},
+                           ljm_module=fake_ljm)
+        skews, errors = [], []
+        for _ in range(n_pulses):
+            before = len(fake_ljm.edges(handle))
+            event = sync.fire()
+            rises = {name: t for name, level, t in fake_ljm.edges(handle)[before:] if level}
+            skews.append(rises["DIO5"] - rises["DIO4"])
+            errors.append(event.edges[line][0] - rises["DIO4"])
+        skews = np.array(skews) * 1e6
+        errors = np.abs(errors) * 1e6
+        assert np.allclose(skews, delay_us, atol=0.5)
+        assert np.isclose(fake_ljm.pulse_widths(handle, cam_line)[-1], width_us / 1e6)
+        print(f"{f'sync, {delay_us} us':<16}{skews.mean():>14.1f}{skews.max():>14.1f}{errors.mean():>18.1f}")
+    print(sync.timing_summary())
+    sync.close()
+    fake_ljm.close(handle)
+
+
+if __name__ == "__main__":
+    main()
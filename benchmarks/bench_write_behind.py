@@ -0,0 +1,73 @@
+"""
+Trigger-to-trigger cadence when each shot (one camera frame and one
+spectrum) is saved inline, as the GUI scripts used to, against handing the
+data to a WriteBehindQueue. Acquisition is simulated by sleeping for
+acquire_ms per shot; the time the acquisition thread spends saving is
+reported separately.
+
+Needs no hardware or stub library, only NumPy and OpenCV.
+
+    python benchmarks/bench_write_behind.py [n_shots] [image_side] [acquire_ms]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spectrum_storage import DataSaver, load_spectra
+from write_behind import WriteBehindQueue
+
+
+def run(directory, images, spectra, wavelengths, acquire_s, writer=None):
+    saver = DataSaver(os.path.join(directory, "spectra.npz"))
+    per_shot = []
+    start = time.perf_counter()
+    triggers = []
+    for i, (image, spectrum) in enumerate(zip(images, spectra)):
+        triggers.append(time.perf_counter())
+        time.sleep(acquire_s)
+        t0 = time.perf_counter()
+        path = os.path.join(directory, f"frame_{i:04d}.png")
+        if writer is None:
+            cv2.imwrite(path, image)
+            saver.save_spectrum(wavelengths, spectrum, i)
+        else:
+            writer.save_image(path, image)
+            writer.save_spectrum(saver, wavelengths, spectrum, i)
+        per_shot.append(time.perf_counter() - t0)
+    if writer is not None:
+        writer.close()
+    saver.close()
+    total = time.perf_counter() - start
+    assert len(load_spectra(saver.path)["spectra"]) == len(spectra)
+    return np.array(per_shot) * 1e3, np.diff(triggers) * 1e3, total
+
+
+def main():
+    n_shots = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    acquire_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50.0
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (side, side), dtype=np.uint8) for _ in range(4)] * (n_shots // 4 + 1)
+    images = images[:n_shots]
+    wavelengths = np.linspace(200.0, 1100.0, 2048)
+    spectra = rng.uniform(0, 60000, (n_shots, 2048))
+
+    print(f"{n_shots} shots, {side}x{side} Mono8 PNG + 2048 pixel spectrum, {acquire_ms} ms acquisition")
+    print(f"{'mode':<22}{'save p50 ms':>13}{'save max ms':>13}{'period p50 ms':>15}{'total s':>10}")
+    for name, writer in [("inline", None), ("write-behind", WriteBehindQueue(max_pending=16)),
+                         ("write-behind, 4 thr", WriteBehindQueue(max_pending=16, workers=4))]:
+        with tempfile.TemporaryDirectory() as tmp:
+            per_shot, periods, total = run(tmp, images, spectra, wavelengths, acquire_ms / 1e3, writer)
+        print(f"{name:<22}{np.median(per_shot):>13.2f}{per_shot.max():>13.2f}"
+              f"{np.median(periods):>15.2f}{total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
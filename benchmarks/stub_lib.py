@@ -0,0 +1,24 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from simulation import build_avs_stub
+
+
+def build_stub(output_dir=None):
+    """
+    Compiles stub_avs.c into a shared library and returns its path.
+    Needs a C compiler on PATH (cc, or CC from the environment).
+    """
+    return build_avs_stub(output_dir)
+
+
+def use_stub():
+    """
+    Builds the stub library and points avaspec at it. Must run before the
+    first AvaSpec call.
+    """
+    os.environ["AVASPEC_LIB"] = build_stub()
@@ -0,0 +1,154 @@
+import numpy as np
+
+from device_config import field_array
+from measurement_profile import BoxcarSmoother
+
+'''
+Calibrated spectra from raw counts: dark subtraction, detector nonlinearity
+correction, spectrum correction and irradiance conversion with the
+coefficients stored in the spectrometer's DeviceConfigType. The per-pixel
+arrays are built once per session and whole (n_scans, pixels) batches are
+processed at once, so a stream can be calibrated as fast as it arrives.
+'''
+
+# rows processed together; the nonlinearity polynomial takes several passes
+# over them, which stay in the CPU cache for a block of this many
+BLOCK_ROWS = 32
+
+
+class SpectrumCalibration:
+    """
+    The calibration of one spectrometer, as per-pixel arrays.
+
+    process() applies, in this order:
+      dark          counts minus the dark spectrum given to set_dark()
+      nonlinearity  counts / (a0 + a1 c + ... + a7 c^7), with c the dark
+                    corrected counts clipped to the calibrated range
+                    (m_Detector_m_aNLCorrect, m_aLowNLCounts, m_aHighNLCounts)
+      irradiance    smoothing as at calibration, then counts times
+                    m_SpectrumCorrect and m_aCalibConvers, scaled from the
+                    calibration integration time to the measurement's
+
+    Each step is skipped when the device holds no data for it (all zero
+    coefficients, NLEnable off). Spectrum correction and the conversion
+    factors are folded into one gain per pixel.
+    """
+
+    def __init__(self, device_config, pixels=None, nonlinearity=None):
+        """
+        :param device_config: DeviceConfigType from AVS_GetParameter
+        :param pixels: detector pixels, m_Detector_m_NrPixels by default
+        :param nonlinearity: force the nonlinearity correction on or off,
+        None follows m_Detector_m_NLEnable
+        """
+        pixels = pixels or device_config.m_Detector_m_NrPixels
+        self.pixels = pixels
+        self.dark = None
+        self.dark_integration_time = None
+
+        coefficients = field_array(device_config, "m_Detector_m_aNLCorrect").astype(np.float64)
+        if nonlinearity is None:
+            nonlinearity = bool(device_config.m_Detector_m_NLEnable)
+        # highest power first, for Horner's rule, without unused high powers
+        nonzero = np.flatnonzero(coefficients)
+        self.nl_coefficients = None
+        if nonlinearity and len(nonzero):
+            self.nl_coefficients = coefficients[nonzero[-1]::-1].copy()
+        self.nl_range = (device_config.m_Detector_m_aLowNLCounts, device_config.m_Detector_m_aHighNLCounts)
+        if self.nl_range[0] >= self.nl_range[1]:
+            self.nl_range = None
+
+        correct = field_array(device_config, "m_SpectrumCorrect")[:pixels].astype(np.float64)
+        self.spectrum_correct = correct if correct.any() else None
+        convers = field_array(device_config, "m_Irradiance_m_IntensityCalib_m_aCalibConvers")[:pixels].astype(np.float64)
+        self.cal_integration_time = device_config.m_Irradiance_m_IntensityCalib_m_CalInttime
+        self.irradiance_calibrated = bool(convers.any()) and self.cal_integration_time > 0
+        # counts at the calibration integration time -> irradiance, spectrum correction included
+        gain = np.ones(pixels) if self.spectrum_correct is None else self.spectrum_correct.copy()
+        if self.irradiance_calibrated:
+            gain *= convers * self.cal_integration_time
+        self.gain = gain
+        smooth_pixels = device_config.m_Irradiance_m_IntensityCalib_m_Smoothing_m_SmoothPix
+        self._smooth = BoxcarSmoother(smooth_pixels, pixels) if smooth_pixels else None
+        self._scratch = None
+
+    @classmethod
+    def from_session(cls, session, nonlinearity=None):
+        return cls(session.device_config, session.pixels, nonlinearity)
+
+    def set_dark(self, dark_spectra, integration_time):
+        """
+        :param dark_spectra: (pixels,) dark spectrum or (n_scans, pixels)
+        dark scans, which are averaged
+        :param integration_time: milliseconds; the dark level depends on it,
+        so it is only subtracted from spectra taken with the same
+        """
+        dark = np.asarray(dark_spectra, dtype=np.float64)
+        self.dark = (dark.mean(axis=0) if dark.ndim == 2 else dark)[:self.pixels].copy()
+        self.dark_integration_time = integration_time
+
+    def _scratch_for(self, shape):
+        # two work arrays of up to BLOCK_ROWS rows, kept between calls
+        rows = shape[0] if len(shape) == 2 else 1
+        if self._scratch is None or len(self._scratch[0]) < rows:
+            self._scratch = (np.empty((rows, self.pixels)), np.empty((rows, self.pixels)))
+        return tuple(scratch[:rows].reshape(shape) for scratch in self._scratch)
+
+    def process(self, spectra, integration_time, out=None, irradiance=None):
+        """
+        Calibrates a batch of spectra taken with one integration time.
+
+        :param spectra: (n_scans, >= pixels) or (pixels,) raw counts
+        :param integration_time: milliseconds
+        :param out: optional float64 array of the batch's shape, may be
+        spectra itself when that is float64
+        :param irradiance: convert to irradiance; None does whenever the
+        device is irradiance calibrated, otherwise spectrum-corrected counts
+        are returned
+        :return: the calibrated (n_scans, pixels) or (pixels,) array
+        :raises ValueError: if the dark was taken with another integration
+        time, or irradiance is asked of an uncalibrated device
+        """
+        spectra = np.asarray(spectra)[..., :self.pixels]
+        if out is None:
+            out = np.empty(spectra.shape)
+        else:
+            out = out[..., :self.pixels]
+        if irradiance is None:
+            irradiance = self.irradiance_calibrated
+        elif irradiance and not self.irradiance_calibrated:
+            raise ValueError("The spectrometer holds no irradiance calibration")
+        if self.dark is not None and self.dark_integration_time != integration_time:
+            raise ValueError(f"Dark taken at {self.dark_integration_time} ms, spectra at {integration_time} ms")
+
+        gain = self.gain / integration_time if irradiance else self.spectrum_correct
+        if spectra.ndim == 1:
+            self._process_block(spectra, out, gain, irradiance)
+        else:
+            for start in range(0, len(spectra), BLOCK_ROWS):
+                block = slice(start, start + BLOCK_ROWS)
+                self._process_block(spectra[block], out[block], gain, irradiance)
+        return out
+
+    def _process_block(self, spectra, out, gain, irradiance):
+        if self.dark is not None:
+            np.subtract(spectra, self.dark, out=out)
+        else:
+            np.copyto(out, spectra)
+
+        if self.nl_coefficients is not None:
+            counts, factor = self._scratch_for(out.shape)
+            if self.nl_range is None:
+                counts[...] = out
+            else:
+                np.clip(out, *self.nl_range, out=counts)
+            factor.fill(self.nl_coefficients[0])
+            for coefficient in self.nl_coefficients[1:]:
+                factor *= counts
+                factor += coefficient
+            out /= factor
+
+        if irradiance and self._smooth is not None:
+            self._smooth(out, out=out)
+        if gain is not None:
+            out *= gain
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+
+'''
+Camera configuration profiles: named, ordered sets of GenICam feature values
+that are written to the camera only where they differ from what it already
+holds, so reapplying an unchanged profile costs no USB transactions
+'''
+
+PROFILE_DIR = "camera_profiles"
+
+# features whose meaning depends on a selector; changing the selector makes
+# their cached values stale
+SELECTED_FEATURES = {
+    "TriggerSelector": ("TriggerSource", "TriggerMode", "TriggerActivation", "TriggerDelay"),
+    "LineSelector": ("LineMode", "LineSource", "LineInverter"),
+}
+
+# camera id -> {feature name: value last written or read}
+_camera_state = {}
+_state_lock = threading.Lock()
+
+
+def _camera_key(cam):
+    return cam.get_id()
+
+
+def _same(current, wanted):
+    # enum features read back as entries whose str() is the name
+    if isinstance(wanted, str):
+        return str(current) == wanted
+    return current == wanted
+
+
+def apply_features(cam, features):
+    """
+    Writes the features that differ from the camera's cached state, in the
+    given order. Features not in the cache are read from the camera once.
+
+    :param cam: opened vmbpy Camera
+    :param features: mapping or sequence of (name, value) pairs
+    :return: names of the features written
+    """
+    items = features.items() if isinstance(features, dict) else features
+    written = []
+    with _state_lock:
+        state = _camera_state.setdefault(_camera_key(cam), {})
+        for name, value in items:
+            if name not in state:
+                state[name] = getattr(cam, name).get()
+            if _same(state[name], value):
+                continue
+            try:
+                getattr(cam, name).set(value)
+            except Exception as e:
+                state.pop(name, None)
+                raise RuntimeError(f"Could not set camera feature {name} to {value!r}: {e}") from e
+            state[name] = value
+            written.append(name)
+            for dependent in SELECTED_FEATURES.get(name, ()):
+                state.pop(dependent, None)
+    return written
+
+
+def forget_camera(cam):
+    """Drops the cached state of a camera, e.g. when it is closed or was changed by another program."""
+    with _state_lock:
+        _camera_state.pop(_camera_key(cam), None)
+
+
+class CameraProfile:
+    """
+    A named, ordered set of feature values. Order matters: selectors come
+    before the features they select, and pixel format and ROI before
+    anything that depends on the frame size. Features such as PixelFormat,
+    Width and AcquisitionMode can only be written while the camera is not
+    streaming, so apply profiles before CameraStream.start().
+    """
+
+    def __init__(self, name, features=()):
+        """
+        :param name: profile name, also the file name when saved
+        :param features: mapping or sequence of (feature name, value) pairs
+        """
+        self.name = name
+        items = features.items() if isinstance(features, dict) else features
+        self.features = [(feature, value) for feature, value in items]
+
+    def __repr__(self):
+        return f"CameraProfile({self.name!r}, {self.features!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, CameraProfile) and (self.name, self.features) == (other.name, other.features)
+
+    def get(self, feature, default=None):
+        for name, value in self.features:
+            if name == feature:
+                return value
+        return default
+
+    def updated(self, name=None, **features):
+        """
+        Copy with some features changed or appended, e.g.
+        profile.updated(ExposureTime=5000.0).
+        """
+        items = [(feature, features.pop(feature, value)) for feature, value in self.features]
+        items.extend(features.items())
+        return CameraProfile(name or self.name, items)
+
+    def apply(self, cam):
+        """Writes the features that differ from the camera's state; returns their names."""
+        return apply_features(cam, self.features)
+
+    # === Files ===
+
+    def to_dict(self):
+        return {"name": self.name, "features": [[feature, value] for feature, value in self.features]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], [tuple(item) for item in data["features"]])
+
+    def save(self, directory=PROFILE_DIR):
+        """Writes the profile to <directory>/<name>.json and returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    @classmethod
+    def from_camera(cls, cam, name, feature_names):
+        """Profile holding the camera's current values of feature_names, e.g. to save a setup made in Vimba Viewer."""
+        return cls(name, [(feature, _plain(getattr(cam, feature).get())) for feature in feature_names])
+
+
+def _plain(value):
+    # enum entries are saved by name
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def trigger_profile(trigger_source="Line1", trigger_mode="On", name=None):
+    """Mono8 frames, continuous acquisition, frame start from trigger_source."""
+    return CameraProfile(name or f"trigger_{trigger_source.lower()}", [
+        ("PixelFormat", "Mono8"),
+        ("TriggerSelector", "FrameStart"),
+        ("TriggerSource", trigger_source),
+        ("TriggerMode", trigger_mode),
+        ("AcquisitionMode", "Continuous"),
+    ])
+
+
+BUILTIN_PROFILES = {
+    "hardware_trigger": trigger_profile("Line1", name="hardware_trigger"),
+    "software_trigger": trigger_profile("Software", name="software_trigger"),
+    "free_run": trigger_profile("Software", "Off", name="free_run"),
+}
+
+
+def load_profile(name, directory=PROFILE_DIR):
+    """Loads <directory>/<name>.json, falling back to the built-in profile of that name."""
+    path = os.path.join(directory, f"{name}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return CameraProfile.from_dict(json.load(f))
+    if name in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[name]
+    raise FileNotFoundError(f"No camera profile '{name}' in {directory} and no built-in one")
+
+
+def list_profiles(directory=PROFILE_DIR):
+    """Names of the saved and built-in profiles."""
+    saved = []
+    if os.path.isdir(directory):
+        saved = [f[:-len(".json")] for f in os.listdir(directory) if f.endswith(".json")]
+    return sorted(set(saved) | set(BUILTIN_PROFILES))
@@ -0,0 +1,361 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from camera_profile import apply_features, trigger_profile
+from clock_sync import VIMBA_BITS, VIMBA_TICK, ClockSync
+
+try:
+    import vmbpy
+except ImportError:  # fake_vimba can be passed in instead
+    vmbpy = None
+
+'''
+Continuous camera streaming into a preallocated frame pool
+
+The camera streams from start() to stop() with its trigger features set
+once. Vimba hands each frame to a callback on its own thread, which copies
+it into the next slot of a FramePool and queues the buffer straight back,
+so the camera never waits on the GUI, saving or analysis.
+'''
+
+
+class FramePool:
+    """
+    Preallocated ring of frames with timestamp, frame id and sequence
+    columns; the image counterpart of SpectrumRingBuffer.
+
+    Every write gets the next sequence number; slot = sequence % capacity.
+    Readers take views without copying. A view stays valid until capacity
+    newer frames have been written; check with valid(seq) after using it if
+    the producer may have lapped the reader.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        """
+        :param capacity: number of frames held
+        :param shape: (height, width) of a frame
+        :param dtype: pixel type, uint8 for Mono8
+        """
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.frames = np.zeros((capacity,) + self.shape, dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.uint64)
+        self.frame_ids = np.zeros(capacity, dtype=np.int64)
+        self.arrival_times = np.zeros(capacity, dtype=np.float64)
+        self.sequence = np.full(capacity, -1, dtype=np.int64)
+        self.next_seq = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return min(self.next_seq, self.capacity)
+
+    @property
+    def oldest_seq(self):
+        return max(0, self.next_seq - self.capacity)
+
+    # === Producer ===
+
+    def reserve(self):
+        """
+        Claims the next slot for writing and returns (seq, frame view). The
+        slot is marked invalid until commit(seq, timestamp, frame_id).
+        """
+        with self._cond:
+            seq = self.next_seq
+            slot = seq % self.capacity
+            self.sequence[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq, timestamp, frame_id, arrival_time=0.0):
+        """:param arrival_time: time.perf_counter() when the frame reached the host"""
+        slot = seq % self.capacity
+        with self._cond:
+            self.timestamps[slot] = timestamp
+            self.arrival_times[slot] = arrival_time
+            self.frame_ids[slot] = frame_id
+            self.sequence[slot] = seq
+            self.next_seq = seq + 1
+            self._cond.notify_all()
+
+    # === Readers ===
+
+    def valid(self, seq):
+        """True while the frame with this sequence number is still in the pool."""
+        return self.sequence[seq % self.capacity] == seq
+
+    def get(self, seq):
+        """
+        Returns (timestamp, frame_id, frame view) for a sequence number, or
+        None if it has been overwritten or not written yet.
+        """
+        slot = seq % self.capacity
+        if self.sequence[slot] != seq:
+            return None
+        return int(self.timestamps[slot]), int(self.frame_ids[slot]), self.frames[slot]
+
+    def arrival_time(self, seq):
+        """time.perf_counter() at which frame seq arrived, or None once it has been overwritten."""
+        slot = seq % self.capacity
+        if self.sequence[slot] != seq:
+            return None
+        return float(self.arrival_times[slot])
+
+    def latest(self):
+        """Returns (seq, timestamp, frame_id, frame view) of the newest frame, or None."""
+        with self._cond:
+            seq = self.next_seq - 1
+        if seq < 0:
+            return None
+        frame = self.get(seq)
+        if frame is None:
+            return None
+        return (seq,) + frame
+
+    def wait_for(self, seq, timeout=None, abort=None):
+        """
+        Blocks until frame seq has been written or abort() returns true.
+        Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.next_seq > seq or (abort is not None and abort()), timeout)
+
+    def notify_all(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class CameraStream:
+    """
+    Streams an open Vimba camera into a FramePool.
+
+    start() applies the camera profile (trigger features and pixel format;
+    only the features the camera does not already hold are written) and starts
+    streaming with buffer_count driver buffers. Every complete frame is
+    copied into the pool and its buffer requeued at once. Frames the camera
+    could not deliver (no free buffer, or incomplete transfer) are counted,
+    so the achieved rate and losses can be checked with stats().
+
+    Iterate over the stream, or use read(), to get every frame in order;
+    latest() and next_frame() serve displays and snapshots.
+
+    clock maps the camera's frame timestamps to host time once it has an
+    anchor, e.g. add_anchor(timestamp, edge_time) for a hardware triggered
+    frame; host_time() then gives the exposure time of any frame.
+    """
+
+    def __init__(self, cam, buffer_count=10, pool_size=32, trigger_source="Line1", trigger_mode="On",
+                 on_frame=None, vmb_module=None, rate_window=100, profile=None):
+        """
+        :param cam: opened vmbpy Camera (inside its context manager)
+        :param buffer_count: frame buffers announced to the driver
+        :param pool_size: frames kept in the FramePool
+        :param trigger_source: "Line1" for hardware triggers, "Software" for
+        trigger_software(), or any other TriggerSource value
+        :param trigger_mode: "On", or "Off" to free-run at the sensor rate
+        :param on_frame: optional callable(seq), called on the Vimba thread
+        after each frame is in the pool; must return quickly
+        :param vmb_module: vmbpy or a stand-in such as fake_vimba
+        :param rate_window: frames used for the frame rate in stats()
+        :param profile: CameraProfile to apply on start; by default
+        trigger_profile(trigger_source, trigger_mode). Its TriggerSource
+        replaces trigger_source.
+        """
+        self.vmb = vmb_module or vmbpy
+        if self.vmb is None:
+            raise RuntimeError("vmbpy is not installed; pass vmb_module")
+        self.cam = cam
+        self.buffer_count = buffer_count
+        self.pool_size = pool_size
+        self.profile = profile or trigger_profile(trigger_source, trigger_mode)
+        self.trigger_source = self.profile.get("TriggerSource", trigger_source)
+        self.on_frame = on_frame
+        self.pool = None
+        self._streaming = False
+        self._read_seq = 0
+        self._last_frame_id = None
+        self._arrivals = collections.deque(maxlen=rate_window)
+        self.clock = ClockSync("camera", VIMBA_TICK, VIMBA_BITS)
+        self._trigger_lock = threading.Lock()
+
+        self.received = 0
+        self.incomplete = 0
+        self.dropped = 0
+        self.overruns = 0
+
+    @property
+    def streaming(self):
+        return self._streaming
+
+    @property
+    def next_seq(self):
+        """Sequence number the next frame will get; take it before triggering and pass it to next_frame()."""
+        return self.pool.next_seq
+
+    def start(self):
+        if self._streaming:
+            return self
+        cam = self.cam
+        self.profile.apply(cam)
+
+        shape = (cam.Height.get(), cam.Width.get())
+        if self.pool is None or self.pool.shape != shape:
+            self.pool = FramePool(self.pool_size, shape)
+            self._read_seq = 0
+        else:
+            self._read_seq = self.pool.next_seq
+        self._last_frame_id = None
+        self._streaming = True
+        cam.start_streaming(self._on_frame, buffer_count=self.buffer_count)
+        return self
+
+    def stop(self):
+        if not self._streaming:
+            return
+        self._streaming = False
+        try:
+            self.cam.stop_streaming()
+        finally:
+            self.pool.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def trigger_software(self):
+        """
+        Triggers one frame from the host. With a hardware trigger source the
+        source is switched to Software for the trigger and back afterwards.
+        Returns the sequence number the frame will get, for next_frame().
+        """
+        cam = self.cam
+        with self._trigger_lock:
+            seq = self.next_seq
+            if self.trigger_source == "Software":
+                cam.TriggerSoftware.run()
+            else:
+                apply_features(cam, [("TriggerSource", "Software")])
+                try:
+                    cam.TriggerSoftware.run()
+                finally:
+                    apply_features(cam, [("TriggerSource", self.trigger_source)])
+        return seq
+
+    def _on_frame(self, cam, stream, frame):
+        # runs on the Vimba thread: copy into the pool and hand the buffer back
+        try:
+            if frame.get_status() != self.vmb.FrameStatus.Complete:
+                self.incomplete += 1
+                return
+            frame_id = frame.get_id()
+            if self._last_frame_id is not None:
+                self.dropped += max(0, frame_id - self._last_frame_id - 1)
+            self._last_frame_id = frame_id
+
+            image = frame
+            if frame.get_pixel_format() != self.vmb.PixelFormat.Mono8:
+                image = frame.convert_pixel_format(self.vmb.PixelFormat.Mono8)
+            data = image.as_numpy_ndarray()
+            arrival = time.perf_counter()
+            seq, slot = self.pool.reserve()
+            np.copyto(slot, data.reshape(slot.shape))
+            self.pool.commit(seq, frame.get_timestamp(), frame_id, arrival)
+            self.received += 1
+            self._arrivals.append(arrival)
+        finally:
+            cam.queue_frame(frame)
+        if self.on_frame is not None:
+            self.on_frame(seq)
+
+    def add_anchor(self, timestamp, host_time, uncertainty=1e-6):
+        """Anchors clock on a frame timestamp whose exposure started at host_time (time.perf_counter())."""
+        self.clock.add_anchor(timestamp, host_time, uncertainty)
+
+    def host_time(self, seq):
+        """
+        time.perf_counter() at the start of the exposure of frame seq, from
+        its camera timestamp, or None if the frame has been overwritten.
+
+        :raises RuntimeError: before the first anchor
+        """
+        frame = self.pool.get(seq)
+        if frame is None:
+            return None
+        return self.clock.to_host(frame[0])
+
+    def stats(self):
+        """
+        Frame counts and the rate of the last rate_window frames, by host
+        arrival time. dropped counts gaps in the camera's frame ids, i.e.
+        frames lost for want of a free buffer; overruns counts frames that
+        fell out of the pool before read() got to them.
+        """
+        arrivals = list(self._arrivals)
+        rate = 0.0
+        if len(arrivals) > 1 and arrivals[-1] > arrivals[0]:
+            rate = (len(arrivals) - 1) / (arrivals[-1] - arrivals[0])
+        backlog = 0 if self.pool is None else min(self.pool.next_seq - self._read_seq, self.pool.capacity)
+        return {"received": self.received, "dropped": self.dropped, "incomplete": self.incomplete,
+                "overruns": self.overruns, "backlog": backlog, "frame_rate": rate}
+
+    def latest(self):
+        """(seq, timestamp, frame_id, frame view) of the newest frame, or None."""
+        return self.pool.latest()
+
+    def next_frame(self, seq, timeout=None):
+        """
+        Waits for the frame with sequence number seq, e.g. next_seq (or the
+        value of trigger_software()) taken before triggering.
+
+        :return: (timestamp, frame_id, frame view)
+        """
+        if not self.pool.wait_for(seq, timeout, abort=lambda: not self._streaming):
+            raise TimeoutError(f"No frame from the camera within {timeout} s")
+        frame = self.pool.get(seq)
+        if frame is None:
+            if seq < self.pool.oldest_seq:
+                raise RuntimeError(f"Frame {seq} was overwritten before it was read")
+            raise RuntimeError("Camera stream stopped")
+        return frame
+
+    def read(self, timeout=None, copy=False):
+        """
+        Returns the oldest unread (timestamp, frame_id, frame), or None once
+        the stream has stopped and everything has been read. The frame is a
+        view into the pool unless copy is set.
+        """
+        while True:
+            if not self.pool.wait_for(self._read_seq, timeout, abort=lambda: not self._streaming):
+                raise TimeoutError(f"No frame from the camera within {timeout} s")
+            if self._read_seq >= self.pool.next_seq:
+                return None
+            oldest = self.pool.oldest_seq
+            if self._read_seq < oldest:
+                self.overruns += oldest - self._read_seq
+                self._read_seq = oldest
+            seq = self._read_seq
+            self._read_seq += 1
+            frame = self.pool.get(seq)
+            if frame is None:
+                self.overruns += 1
+                continue
+            if copy:
+                timestamp, frame_id, image = frame
+                image = image.copy()
+                if not self.pool.valid(seq):
+                    self.overruns += 1
+                    continue
+                return timestamp, frame_id, image
+            return frame
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+
+'''
+Device clock to host clock mapping
+
+The spectrometer stamps every scan with a 32-bit counter of 10 us ticks and
+the camera every frame with a nanosecond counter. Both run free on the
+device's own crystal: their origin is unknown, their rate is off by tens of
+ppm and the spectrometer's counter wraps every 11.9 hours. ClockSync fits
+host time against device ticks from anchors (events whose time is known on
+both clocks, ideally a hardware trigger edge) and turns any tick value into a
+host time.perf_counter() value.
+'''
+
+# AvaSpec timestamps: 10 us ticks in a uint32
+AVASPEC_TICK = 10e-6
+AVASPEC_BITS = 32
+# Vimba frame timestamps: nanoseconds in a uint64
+VIMBA_TICK = 1e-9
+VIMBA_BITS = 64
+
+
+def wall_time(host_time):
+    """time.time() seconds of a time.perf_counter() value (or array of them)."""
+    return host_time + (time.time() - time.perf_counter())
+
+
+class ClockSync:
+    """
+    Least-squares line through the most recent anchors,
+    host = offset + ticks * tick * (1 + drift), refitted on every anchor.
+
+    Anchors are weighted by the inverse square of their uncertainty, and
+    once there are enough of them the ones far off the line (a host thread
+    that was descheduled while timing its event) are left out of the fit.
+    With a single anchor the nominal tick length is used. Tick values are
+    unwrapped against the latest one seen, so conversions work for stamps
+    up to half a counter period either side of it.
+
+    Safe to use from several threads.
+    """
+
+    def __init__(self, name, tick=AVASPEC_TICK, bits=AVASPEC_BITS, window=256):
+        """
+        :param name: shown in errors and stats
+        :param tick: nominal seconds per device tick
+        :param bits: width of the device counter
+        :param window: number of recent anchors fitted; the fit follows slow
+        rate changes (crystal temperature) over that many anchors
+        """
+        self.name = name
+        self.tick = tick
+        self.bits = bits
+        self.window = window
+        self.anchors = 0
+        self.residual = None
+        self.used = 0
+        self._period = 1 << bits
+        self._last_raw = None
+        self._last = 0
+        self._x0 = self._y0 = 0.0
+        self._slope = tick
+        self._intercept = 0.0
+        # anchors in a ring: unwrapped ticks, host time, weight
+        self._x = np.zeros(window, dtype=np.int64)
+        self._y = np.zeros(window, dtype=np.float64)
+        self._w = np.zeros(window, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def _unwrap(self, ticks):
+        # device ticks as an unwrapped int64 count, relative to the latest value seen
+        if self.bits >= 63:
+            return np.asarray(ticks, dtype=np.int64)
+        raw = np.asarray(ticks, dtype=np.int64) & (self._period - 1)
+        if self._last_raw is None:
+            return raw
+        half = self._period >> 1
+        return self._last + ((raw - self._last_raw + half) & (self._period - 1)) - half
+
+    def add_anchor(self, ticks, host_time, uncertainty=1e-6):
+        """
+        :param ticks: device time of the event
+        :param host_time: time.perf_counter() of the same event
+        :param uncertainty: standard error of host_time in seconds, e.g.
+        half the LabJack round trip for a trigger edge
+        """
+        with self._lock:
+            x = int(self._unwrap(ticks))
+            if self._last_raw is None or x > self._last:
+                self._last_raw, self._last = x & (self._period - 1), x
+            slot = self.anchors % self.window
+            self._x[slot], self._y[slot] = x, host_time
+            self._w[slot] = max(uncertainty, 1e-9) ** -2
+            self.anchors += 1
+            self._x0, self._y0 = x, host_time
+            self._fit()
+
+    def _fit(self):
+        n = min(self.anchors, self.window)
+        dx = (self._x[:n] - self._x0).astype(np.float64)
+        dy = self._y[:n] - self._y0
+        w = self._w[:n]
+        if n < 2 or dx.min() == dx.max():
+            self._slope, self._intercept = self.tick, float(np.dot(w, dy - dx * self.tick) / w.sum())
+            self.residual, self.used = None, n
+            return
+        # weighted least squares in closed form, then once more without the outliers
+        keep = w
+        for _ in range(2):
+            total = keep.sum()
+            mx, my = np.dot(keep, dx) / total, np.dot(keep, dy) / total
+            cx = dx - mx
+            slope = np.dot(keep, cx * (dy - my)) / np.dot(keep, cx * cx)
+            intercept = my - slope * mx
+            residuals = dy - intercept - slope * dx
+            if n < 8:
+                break
+            limit = np.maximum(5 * 1.4826 * np.median(np.abs(residuals)), 3 / np.sqrt(w))
+            inliers = np.abs(residuals) <= limit
+            if inliers.sum() < 2 or inliers.all():
+                break
+            keep = np.where(inliers, w, 0.0)
+        self._slope, self._intercept = float(slope), float(intercept)
+        used = keep > 0
+        self.residual = float(np.sqrt(np.mean(residuals[used] ** 2)))
+        self.used = int(used.sum())
+
+    @property
+    def synced(self):
+        return self.anchors > 0
+
+    @property
+    def drift_ppm(self):
+        """How much faster the device clock runs than its nominal rate."""
+        return (self.tick / self._slope - 1) * 1e6
+
+    def to_host(self, ticks):
+        """
+        time.perf_counter() of a device tick value, or an array of them.
+
+        :raises RuntimeError: before the first anchor
+        """
+        with self._lock:
+            if not self.anchors:
+                raise RuntimeError(f"{self.name} clock has no anchors yet")
+            dx = (self._unwrap(ticks) - self._x0).astype(np.float64)
+            host = self._y0 + self._intercept + self._slope * dx
+        return float(host) if np.ndim(host) == 0 else host
+
+    def to_host_ns(self, ticks):
+        """Like to_host, in time.perf_counter_ns() units."""
+        return np.round(np.asarray(self.to_host(ticks)) * 1e9).astype(np.int64)
+
+    def stats(self):
+        return {"name": self.name, "anchors": min(self.anchors, self.window), "used": self.used,
+                "drift_ppm": self.drift_ppm if self.residual is not None else None,
+                "residual_us": None if self.residual is None else self.residual * 1e6}
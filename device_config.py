@@ -0,0 +1,142 @@
+import ctypes
+
+import numpy as np
+
+from avaspec import DeviceConfigType, AVS_GetParameter, AVS_SetParameter
+
+'''
+DeviceConfigType codec: the packed structure is the 63484-byte EEPROM image,
+so encoding and decoding are plain memory copies and sections can be read
+and written in place
+'''
+
+CONFIG_SIZE = ctypes.sizeof(DeviceConfigType)
+
+
+def encode(config):
+    """The configuration as the bytes the library sends to the device."""
+    return bytes(config)
+
+
+def decode(data):
+    """DeviceConfigType from bytes, bytearray or any buffer of at least CONFIG_SIZE bytes."""
+    if len(data) < CONFIG_SIZE:
+        raise ValueError(f"Device configuration needs {CONFIG_SIZE} bytes, got {len(data)}")
+    return DeviceConfigType.from_buffer_copy(data)
+
+
+def _section_of(field_name):
+    # m_Irradiance_m_IntensityCalib_m_aCalibConvers -> Irradiance,
+    # m_Temperature_1_m_aFit -> Temperature, m_SpectrumCorrect -> SpectrumCorrect
+    return field_name[2:].split("_")[0]
+
+
+def _group_sections():
+    sections = {}
+    for name, _ in DeviceConfigType._fields_:
+        sections.setdefault(_section_of(name), []).append(name)
+    return {section: tuple(names) for section, names in sections.items()}
+
+
+# section name -> field names, in structure order
+SECTIONS = _group_sections()
+
+
+def section_span(section):
+    """(offset, size) in bytes of a section, e.g. "Irradiance" or "SpectrumCorrect"."""
+    names = _section_fields(section)
+    first = getattr(DeviceConfigType, names[0])
+    last = getattr(DeviceConfigType, names[-1])
+    return first.offset, last.offset + last.size - first.offset
+
+
+def _section_fields(section):
+    try:
+        return SECTIONS[section]
+    except KeyError:
+        raise KeyError(f"Unknown device config section '{section}', one of {sorted(SECTIONS)}") from None
+
+
+def read_section(config, section):
+    """The raw bytes of one section."""
+    offset, size = section_span(section)
+    return ctypes.string_at(ctypes.addressof(config) + offset, size)
+
+
+def write_section(config, section, data):
+    """Overwrites one section with raw bytes, e.g. from read_section of another config."""
+    offset, size = section_span(section)
+    if len(data) != size:
+        raise ValueError(f"Section {section} is {size} bytes, got {len(data)}")
+    ctypes.memmove(ctypes.addressof(config) + offset, bytes(data), size)
+
+
+def field_array(config, name):
+    """
+    NumPy view of an array field, e.g. m_SpectrumCorrect or
+    m_Irradiance_m_IntensityCalib_m_aCalibConvers. Writing to the view
+    changes the configuration.
+    """
+    value = getattr(config, name)
+    if not isinstance(value, ctypes.Array):
+        raise TypeError(f"{name} is not an array field")
+    return np.ctypeslib.as_array(value)
+
+
+def get_section(config, section):
+    """
+    The fields of a section as a dict. Array fields are returned as NumPy
+    copies, byte strings as bytes.
+    """
+    values = {}
+    for name in _section_fields(section):
+        value = getattr(config, name)
+        if isinstance(value, ctypes.Array):
+            value = field_array(config, name).copy()
+        values[name] = value
+    return values
+
+
+def set_fields(config, **fields):
+    """Sets fields by name; arrays may be given as any sequence of the right length."""
+    for name, value in fields.items():
+        current = getattr(config, name)
+        if isinstance(current, ctypes.Array):
+            target = field_array(config, name)
+            if len(value) != len(target):
+                raise ValueError(f"{name} holds {len(target)} values, got {len(value)}")
+            target[:] = value
+        else:
+            setattr(config, name, value)
+
+
+def changed_fields(before, after):
+    """Names of the fields that differ between two configurations."""
+    changed = []
+    for name, _ in DeviceConfigType._fields_:
+        field = getattr(DeviceConfigType, name)
+        if read_field_bytes(before, field) != read_field_bytes(after, field):
+            changed.append(name)
+    return changed
+
+
+def read_field_bytes(config, field):
+    return ctypes.string_at(ctypes.addressof(config) + field.offset, field.size)
+
+
+def update_device_config(handle, **fields):
+    """
+    Read-modify-write of the device configuration: reads it, sets the given
+    fields and writes it back if anything changed.
+
+    :return: (config as written, names of the changed fields)
+    """
+    before = AVS_GetParameter(handle)
+    after = decode(encode(before))
+    set_fields(after, **fields)
+    changed = changed_fields(before, after)
+    if changed:
+        ret = AVS_SetParameter(handle, after)
+        if ret != 0:
+            raise RuntimeError(f"AVS_SetParameter failed with error {ret}")
+    return after, changed
@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import Future
+
+'''
+Lazy device access: SDK libraries are loaded and devices opened on first
+use, or on background threads started while the GUI comes up, so the
+window never waits for USB enumeration
+'''
+
+
+class LazyDevice:
+    """
+    A device (or SDK system) opened by opener() once, on first use.
+
+    start() opens it on a background thread right away; get() returns the
+    opened value, waiting for the background open if one is running, or
+    opening it on the calling thread if none was started. An exception from
+    opener() is raised again by every get(). Several LazyDevices started
+    together open in parallel.
+    """
+
+    def __init__(self, name, opener, closer=None):
+        """
+        :param name: shown in errors and open_times()
+        :param opener: callable returning the opened device, e.g. a handle
+        :param closer: optional callable(device) used by close()
+        """
+        self.name = name
+        self.opener = opener
+        self.closer = closer
+        self.open_time = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def _claim(self):
+        # True for the one caller that has to run the opener
+        with self._lock:
+            if self._future is not None:
+                return False
+            self._future = Future()
+            return True
+
+    def _open(self):
+        start = time.perf_counter()
+        try:
+            value = self.opener()
+        except Exception as e:
+            self._future.set_exception(e)
+        else:
+            self._future.set_result(value)
+        finally:
+            self.open_time = time.perf_counter() - start
+
+    def start(self):
+        """Starts opening on a background thread, unless already opening or open."""
+        if self._claim():
+            threading.Thread(target=self._open, name=f"open-{self.name}", daemon=True).start()
+        return self
+
+    def get(self, timeout=None):
+        """
+        The opened device.
+
+        :raises TimeoutError: if a background open takes longer than timeout
+        """
+        if self._claim():
+            self._open()
+        try:
+            return self._future.result(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"{self.name} did not open within {timeout} s") from None
+
+    @property
+    def started(self):
+        return self._future is not None
+
+    @property
+    def ready(self):
+        """True once the open has finished, successfully or not."""
+        return self._future is not None and self._future.done()
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(error) when the open finishes, error being None on
+        success; on the opening thread, so use a Qt signal to reach the GUI.
+        Starts the background open if nothing has.
+        """
+        self.start()
+        self._future.add_done_callback(lambda future: callback(future.exception()))
+
+    def close(self):
+        """Closes the device if it was opened; waits for a running open first."""
+        with self._lock:
+            future, self._future = self._future, None
+        if future is None or self.closer is None:
+            return
+        try:
+            value = future.result()
+        except Exception:
+            return
+        self.closer(value)
+
+
+def start_all(*devices):
+    """Starts opening every device in parallel and returns them."""
+    for device in devices:
+        device.start()
+    return devices
+
+
+def open_times(*devices):
+    """{name: seconds the open took} for the devices that have finished opening."""
+    return {device.name: device.open_time for device in devices if device.open_time is not None}
+
+
+'''
+The acquisition devices; the SDK modules are imported by the opener, so
+importing this module loads none of them
+'''
+
+def lazy_labjack(idle_low=(), device_type="ANY", connection_type="USB", identifier="ANY"):
+    """
+    LazyDevice opening a LabJack with ljm.openS; get() returns the handle.
+
+    :param idle_low: lines driven to 0 right after opening, e.g. trigger lines
+    """
+    def opener():
+        from labjack import ljm
+        handle = ljm.openS(device_type, connection_type, identifier)
+        for line in idle_low:
+            ljm.eWriteName(handle, line, 0)
+        return handle
+
+    def closer(handle):
+        from labjack import ljm
+        ljm.close(handle)
+
+    return LazyDevice("LabJack", opener, closer)
+
+
+def lazy_vimba():
+    """
+    LazyDevice entering the Vimba X system (the slow part, which starts the
+    transport layers and finds the cameras); get() returns the VmbSystem.
+    Cameras are entered from it as usual, and closing it exits the system.
+    """
+    def opener():
+        from vmbpy import VmbSystem
+        system = VmbSystem.get_instance()
+        system.__enter__()
+        return system
+
+    return LazyDevice("Vimba", opener, lambda system: system.__exit__(None, None, None))
+
+
+def lazy_spectrometer_library(port=0):
+    """
+    LazyDevice loading and initialising the AvaSpec library, see
+    spectrometer.open_library; get() returns the attached devices.
+    SpectrometerSessions opened afterwards only activate their device.
+    """
+    def opener():
+        import spectrometer
+        return spectrometer.open_library(port)
+
+    def closer(devices):
+        import spectrometer
+        spectrometer.close_library()
+
+    return LazyDevice("AvaSpec", opener, closer)
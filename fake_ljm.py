@@ -0,0 +1,185 @@
+import itertools
+import random
+import threading
+import time
+
+'''
+Stand-in for labjack.ljm: keeps register values per handle, models the USB
+command round trip and records every edge on the digital lines with its
+device-side time, so trigger code can be checked without a LabJack
+'''
+
+# simulated USB command-response time and its random spread, in seconds
+command_latency = 0.5e-3
+command_jitter = 0.2e-3
+# simulated USB enumeration and connection in openS
+open_latency = 0.3
+
+CORE_CLOCK_HZ = 80_000_000
+
+_handles = itertools.count(1)
+_devices = {}
+_lock = threading.Lock()
+# line (DIO#) -> callables(level, time) told about every edge, on any handle
+_listeners = {}
+
+
+class LJMError(Exception):
+    pass
+
+
+class _Device:
+    def __init__(self):
+        self.registers = {}
+        self.edges = []          # (line, level, device time in s)
+        self.levels = {}
+        self.packets = 0
+
+
+def openS(deviceType="ANY", connectionType="ANY", identifier="ANY"):
+    time.sleep(open_latency)
+    handle = next(_handles)
+    with _lock:
+        _devices[handle] = _Device()
+    return handle
+
+
+def close(handle):
+    with _lock:
+        if _devices.pop(handle, None) is None:
+            raise LJMError(f"Invalid handle {handle}")
+
+
+def reset():
+    """Forgets every open handle."""
+    with _lock:
+        _devices.clear()
+
+
+def add_edge_listener(line, callback):
+    """
+    Calls callback(level, time) for every edge on line, on any handle, e.g.
+    to wire a trigger line to a simulated camera. Runs on the writing thread
+    with the module lock held, so it must return quickly.
+    """
+    with _lock:
+        _listeners.setdefault(_dio_name(line), []).append(callback)
+
+
+def edges(handle, line=None):
+    """
+    Edges recorded on a handle, optionally for one line, as (line, level,
+    time). Lines are reported as DIO#, whichever name was written.
+    """
+    device = _device(handle)
+    line = None if line is None else _dio_name(line)
+    return [edge for edge in device.edges if line is None or edge[0] == line]
+
+
+def pulse_widths(handle, line):
+    """Widths in seconds of the high pulses recorded on line."""
+    widths = []
+    rise = None
+    for _, level, t in edges(handle, line):
+        if level and rise is None:
+            rise = t
+        elif not level and rise is not None:
+            widths.append(t - rise)
+            rise = None
+    return widths
+
+
+def eReadName(handle, name):
+    _round_trip()
+    return _device(handle).registers.get(name, 0)
+
+
+def eWriteName(handle, name, value):
+    eWriteNames(handle, 1, [name], [value])
+
+
+def eWriteNames(handle, numFrames, aNames, aValues):
+    device = _device(handle)
+    if len(aNames) != numFrames or len(aValues) != numFrames:
+        raise LJMError("numFrames does not match the name and value lists")
+    # the packet reaches the device half way through the round trip and its
+    # frames run back to back, WAIT_US_BLOCKING holding up the following ones
+    delay = _latency()
+    start = time.perf_counter() + delay / 2
+    clock = start
+    with _lock:
+        device.packets += 1
+        for name, value in zip(aNames, aValues):
+            if name == "WAIT_US_BLOCKING":
+                clock += value / 1e6
+                continue
+            device.registers[name] = value
+            if name.startswith(("FIO", "EIO", "CIO", "DIO")) and "_" not in name:
+                _set_level(device, _dio_name(name), int(value), clock)
+            elif name == "DIO_STATE":
+                # one frame sets every line not masked by DIO_INHIBIT at once
+                inhibit = int(device.registers.get("DIO_INHIBIT", 0))
+                for bit in range(23):
+                    if not (inhibit >> bit) & 1:
+                        _set_level(device, f"DIO{bit}", (int(value) >> bit) & 1, clock)
+            elif name.endswith("_EF_ENABLE") and value:
+                _run_pulse_out(device, name[:-len("_EF_ENABLE")], clock)
+    # the caller waits for the response, which includes the blocking waits
+    _sleep_until(clock + delay / 2)
+
+
+def _set_level(device, line, level, t):
+    # only changes of level are edges
+    if device.levels.get(line, 0) != level:
+        device.levels[line] = level
+        _record(device, line, level, t)
+
+
+def _record(device, line, level, t):
+    device.edges.append((line, level, t))
+    for callback in _listeners.get(line, ()):
+        callback(level, t)
+
+
+def _run_pulse_out(device, dio, start):
+    registers = device.registers
+    if registers.get(dio + "_EF_INDEX") != 2:
+        return
+    divisor = registers.get("DIO_EF_CLOCK0_DIVISOR", 1) or 1
+    tick = divisor / CORE_CLOCK_HZ
+    roll = registers.get("DIO_EF_CLOCK0_ROLL_VALUE", 0) or 2 ** 32
+    fall = registers.get(dio + "_EF_CONFIG_A", 0)
+    rise = registers.get(dio + "_EF_CONFIG_B", 0)
+    line = dio
+    for n in range(int(registers.get(dio + "_EF_CONFIG_C", 1))):
+        period_start = start + n * roll * tick
+        _record(device, line, 1, period_start + rise * tick)
+        _record(device, line, 0, period_start + fall * tick)
+
+
+def _dio_name(line):
+    for prefix, offset in (("FIO", 0), ("EIO", 8), ("CIO", 16), ("MIO", 20), ("DIO", 0)):
+        if line.startswith(prefix):
+            return f"DIO{int(line[len(prefix):]) + offset}"
+    raise LJMError(f"Unknown line {line}")
+
+
+def _device(handle):
+    device = _devices.get(handle)
+    if device is None:
+        raise LJMError(f"Invalid handle {handle}")
+    return device
+
+
+def _latency():
+    return max(0.0, random.gauss(command_latency, command_jitter))
+
+
+def _round_trip():
+    time.sleep(_latency())
+
+
+def _sleep_until(t):
+    remaining = t - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
@@ -0,0 +1,263 @@
+import enum
+import itertools
+import queue
+import threading
+import time
+
+import numpy as np
+
+'''
+Stand-in for the parts of vmbpy the acquisition code uses: VmbSystem with
+one Mono8 camera with trigger features, get_frame and
+start_streaming/queue_frame. Exposure, readout and the per-call setup of
+get_frame take configurable times, and a trigger that finds no queued buffer
+loses its frame, as on the real driver
+'''
+
+# simulated time to announce buffers, start and stop acquisition in get_frame
+get_frame_setup = 20e-3
+# simulated transport layer startup and camera discovery when the VmbSystem is entered
+system_startup = 0.5
+# rate error of the camera's timestamp clock against the host clock; the
+# clock counts nanoseconds from when fake_vimba was imported
+clock_ppm = -20.0
+_clock_origin = time.perf_counter()
+# simulated time of one feature write over USB
+feature_latency = 1e-3
+# feature writes and reads so far, over every camera
+feature_writes = 0
+feature_reads = 0
+
+
+class PixelFormat(enum.Enum):
+    Mono8 = "Mono8"
+    Bgr8 = "Bgr8"
+
+
+class FrameStatus(enum.Enum):
+    Complete = 0
+    Incomplete = -1
+
+
+class Feature:
+    def __init__(self, value=None, on_run=None):
+        self._value = value
+        self._on_run = on_run
+
+    def get(self):
+        global feature_reads
+        feature_reads += 1
+        time.sleep(feature_latency)
+        return self._value
+
+    def set(self, value):
+        global feature_writes
+        feature_writes += 1
+        time.sleep(feature_latency)
+        self._value = value
+
+    def run(self):
+        time.sleep(feature_latency)
+        if self._on_run is not None:
+            self._on_run()
+
+
+class Frame:
+    def __init__(self, height, width):
+        # a horizontal gradient; pixel (0, 0) holds the low byte of the frame id
+        self._data = np.empty((height, width, 1), dtype=np.uint8)
+        self._data[:, :, 0] = (np.arange(width) * 255 // max(1, width - 1)).astype(np.uint8)
+        self._id = 0
+        self._timestamp = 0
+        self._status = FrameStatus.Complete
+
+    def get_status(self):
+        return self._status
+
+    def get_id(self):
+        return self._id
+
+    def get_timestamp(self):
+        return self._timestamp
+
+    def get_pixel_format(self):
+        return PixelFormat.Mono8
+
+    def convert_pixel_format(self, target):
+        return self
+
+    def as_numpy_ndarray(self):
+        return self._data
+
+    def as_opencv_image(self):
+        return self._data
+
+
+class Camera:
+    """
+    Mono8 camera. Triggers come from TriggerSoftware.run() with the
+    Software source or from fire() with any other source, the stand-in for
+    an edge on Line1. Frames are ready exposure + readout after the trigger,
+    and a new exposure starts no sooner than readout after the last one.
+    """
+
+    def __init__(self, width=2048, height=1536, exposure=1e-3, readout=4e-3, camera_id="DEV_FAKE0001"):
+        self.camera_id = camera_id
+        self.width = width
+        self.height = height
+        self.exposure = exposure
+        self.readout = readout
+        self.Width = Feature(width)
+        self.Height = Feature(height)
+        self.TriggerSelector = Feature("FrameStart")
+        self.TriggerSource = Feature("Line1")
+        self.TriggerMode = Feature("Off")
+        self.AcquisitionMode = Feature("Continuous")
+        self.PixelFormat = Feature("Mono8")
+        self.ExposureTime = Feature(exposure * 1e6)
+        self.TriggerSoftware = Feature(on_run=self._software_trigger)
+        self._pixel_format = PixelFormat.Mono8
+        self._ids = itertools.count(0)
+        self._triggers = queue.Queue()
+        self._queued = queue.Queue()
+        self._handler = None
+        self._threads = []
+        self._filled = queue.Queue()
+        self._streaming = False
+        self._sensor_free = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._streaming:
+            self.stop_streaming()
+
+    def get_id(self):
+        return self.camera_id
+
+    def get_pixel_formats(self):
+        return (PixelFormat.Mono8,)
+
+    def set_pixel_format(self, pixel_format):
+        self._pixel_format = pixel_format
+
+    def is_streaming(self):
+        return self._streaming
+
+    def fire(self, t=None):
+        """Hardware trigger edge, at perf_counter time t (now by default)."""
+        if self.TriggerSource._value != "Software":
+            self._triggers.put(time.perf_counter() if t is None else t)
+
+    def _software_trigger(self):
+        if self.TriggerSource._value == "Software":
+            self._triggers.put(time.perf_counter())
+
+    def get_frame(self, timeout_ms=2000):
+        """One frame with its own buffer and acquisition start/stop, like vmbpy's."""
+        time.sleep(get_frame_setup)
+        frame = Frame(self.height, self.width)
+        time.sleep(self.exposure + self.readout)
+        self._fill(frame, time.perf_counter())
+        return frame
+
+    def start_streaming(self, handler, buffer_count=5, allocation_mode=None):
+        self._handler = handler
+        self._queued = queue.Queue()
+        for _ in range(buffer_count):
+            self._queued.put(Frame(self.height, self.width))
+        self._filled = queue.Queue()
+        self._streaming = True
+        # the driver fills buffers while the handler runs on another thread
+        self._threads = [threading.Thread(target=self._stream, name="fake-vimba-stream", daemon=True),
+                         threading.Thread(target=self._deliver, name="fake-vimba-handler", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop_streaming(self):
+        self._streaming = False
+        self._triggers.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+
+    def queue_frame(self, frame):
+        self._queued.put(frame)
+
+    def _fill(self, frame, timestamp):
+        frame._id = next(self._ids)
+        frame._timestamp = int((timestamp - _clock_origin) * 1e9 * (1 + clock_ppm * 1e-6))
+        frame._data[0, 0, 0] = frame._id & 0xFF
+
+    def _stream(self):
+        while self._streaming:
+            trigger = self._triggers.get()
+            if trigger is None:
+                break
+            # exposures cannot overlap the previous readout
+            start = max(trigger, self._sensor_free)
+            ready = start + self.exposure + self.readout
+            self._sensor_free = ready
+            remaining = ready - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            try:
+                frame = self._queued.get_nowait()
+            except queue.Empty:
+                # no buffer for the image: the frame is lost, its id used up
+                next(self._ids)
+                continue
+            self._fill(frame, start)
+            self._filled.put(frame)
+        self._filled.put(None)
+
+    def _deliver(self):
+        while True:
+            frame = self._filled.get()
+            if frame is None:
+                return
+            self._handler(self, None, frame)
+
+
+class VmbSystem:
+    """The Vimba system singleton, with the fake cameras it finds."""
+    _instance = None
+
+    def __init__(self):
+        self.cameras = (Camera(),)
+        self._entered = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = VmbSystem()
+        return cls._instance
+
+    def __enter__(self):
+        with self._lock:
+            if self._entered == 0:
+                time.sleep(system_startup)
+            self._entered += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._lock:
+            self._entered -= 1
+
+    def get_all_cameras(self):
+        return self.cameras
+
+    def get_camera_by_id(self, camera_id):
+        for cam in self.cameras:
+            if cam.get_id() == camera_id:
+                return cam
+        raise RuntimeError(f"No camera with id {camera_id}")
+
+
+def trigger_line(t=None):
+    """Edge on the trigger input of every camera of the VmbSystem."""
+    for cam in VmbSystem.get_instance().cameras:
+        cam.fire(t)
@@ -0,0 +1,366 @@
+import collections
+import time
+
+import numpy as np
+
+import timing
+
+try:
+    from labjack import ljm
+except ImportError:  # fake_ljm can be passed in instead
+    ljm = None
+
+'''
+Device-timed trigger pulses from the LabJack
+
+The pulse edges are timed by the LabJack, not by time.sleep between two USB
+commands, so the width no longer depends on USB round trips or OS scheduling.
+'''
+
+# T-series core clock that drives the DIO extended features
+CORE_CLOCK_HZ = 80_000_000
+# longest single WAIT_US_BLOCKING the device accepts
+MAX_WAIT_US = 100_000
+# DIO extended feature index of Pulse Out
+EF_PULSE_OUT = 2
+
+
+def dio_number(line):
+    """DIO number of a line name: FIO0-7 are DIO0-7, EIO0-7 DIO8-15, CIO0-3 DIO16-19."""
+    for prefix, offset in (("FIO", 0), ("EIO", 8), ("CIO", 16), ("MIO", 20), ("DIO", 0)):
+        if line.startswith(prefix):
+            return int(line[len(prefix):]) + offset
+    raise ValueError(f"Unknown LabJack line '{line}'")
+
+
+class TriggerEvent:
+    """
+    Host-side timing of one fire(): host_time is when the command was
+    issued (time.perf_counter), latency the command round trip. The first
+    edge happened on the device somewhere inside that window.
+    """
+    __slots__ = ("host_time", "latency", "count", "width_us", "period_us")
+
+    def __init__(self, host_time, latency, count, width_us, period_us):
+        self.host_time = host_time
+        self.latency = latency
+        self.count = count
+        self.width_us = width_us
+        self.period_us = period_us
+
+    def __repr__(self):
+        return (f"TriggerEvent(count={self.count}, width_us={self.width_us}, "
+                f"period_us={self.period_us}, latency={self.latency * 1e3:.3f} ms)")
+
+
+class _TimedTrigger:
+    """Keeps the TriggerEvents of the last fire() calls and summarises their timing."""
+
+    def __init__(self, name, history):
+        self.name = name
+        self.history = collections.deque(maxlen=history)
+
+    def timing_stats(self):
+        """
+        Host-side timing of the recorded fire() calls, in microseconds:
+        command latency (median, 95th percentile, max) and its standard
+        deviation, which is the jitter of the trigger instant as seen from
+        the host.
+        """
+        if not self.history:
+            return {"count": 0}
+        latency = np.array([event.latency for event in self.history]) * 1e6
+        return {
+            "count": len(latency),
+            "latency_p50_us": float(np.median(latency)),
+            "latency_p95_us": float(np.percentile(latency, 95)),
+            "latency_max_us": float(latency.max()),
+            "jitter_us": float(latency.std()),
+        }
+
+    def timing_summary(self):
+        stats = self.timing_stats()
+        if not stats["count"]:
+            return f"{self.name}: no triggers sent"
+        return (f"{self.name}: {stats['count']} triggers, command latency "
+                f"p50 {stats['latency_p50_us']:.0f} us, p95 {stats['latency_p95_us']:.0f} us, "
+                f"max {stats['latency_max_us']:.0f} us, jitter {stats['jitter_us']:.0f} us")
+
+
+class PulseTrigger(_TimedTrigger):
+    """
+    Sends trigger pulses and pulse trains on one LabJack line.
+
+    Two ways of timing the edges on the device:
+
+    - "wait": a single eWriteNames packet that sets the line high, holds it
+      with WAIT_US_BLOCKING and sets it low again. Works on any digital line,
+      widths are exact to about a microsecond. Long trains are split over
+      several packets by LJM, with a USB round trip between them.
+    - "pulse_out": the DIO extended feature Pulse Out, clocked from
+      DIO_EF_CLOCK0. Widths and periods are exact to the clock tick and
+      trains of any length run without the host. Only on lines that support
+      extended features (e.g. FIO0-FIO5 on the T7, FIO4-FIO7 on the T4), and
+      the clock is shared with every other extended feature in use.
+
+    The host cannot time the edges, but it does see when each command was
+    sent and how long the round trip took. Those are kept in history and
+    summarised by timing_stats(), which gives the host-side jitter of the
+    trigger instants.
+    """
+
+    def __init__(self, handle, line="FIO4", width_us=100, mode="wait", idle_level=0, ljm_module=None,
+                 history=1000):
+        """
+        :param handle: LJM device handle from ljm.openS
+        :param line: line name, e.g. "FIO4"
+        :param width_us: default pulse width in microseconds
+        :param mode: "wait" or "pulse_out"
+        :param idle_level: level between pulses; pulses go to the other level
+        :param ljm_module: labjack.ljm or a stand-in such as fake_ljm
+        :param history: number of TriggerEvents kept for timing_stats
+        """
+        if mode not in ("wait", "pulse_out"):
+            raise ValueError(f"Unknown trigger mode '{mode}', use 'wait' or 'pulse_out'")
+        super().__init__(f"{line} ({mode})", history)
+        self.ljm = ljm_module or ljm
+        if self.ljm is None:
+            raise RuntimeError("labjack-ljm is not installed")
+        self.handle = handle
+        self.line = line
+        self.dio = dio_number(line)
+        self.width_us = width_us
+        self.mode = mode
+        self.idle_level = idle_level
+        self._pulse_out_config = None
+
+        self.ljm.eWriteName(self.handle, self.line, idle_level)
+
+    def fire(self, width_us=None, count=1, period_us=None):
+        """
+        Sends count pulses of width_us, period_us apart (start to start).
+
+        :param period_us: defaults to twice the width
+        :return: TriggerEvent with the host-side timing
+        """
+        width_us = self.width_us if width_us is None else width_us
+        period_us = 2 * width_us if period_us is None else period_us
+        if width_us <= 0 or (count > 1 and period_us <= width_us):
+            raise ValueError(f"Pulse width {width_us} us must be positive and shorter than the period {period_us} us")
+
+        if self.mode == "pulse_out":
+            names, values = self._pulse_out_frames(width_us, count, period_us)
+        else:
+            names, values = self._wait_frames(width_us, count, period_us)
+
+        start = time.perf_counter()
+        self.ljm.eWriteNames(self.handle, len(names), names, values)
+        latency = time.perf_counter() - start
+
+        timing.add("trigger", latency)
+        event = TriggerEvent(start, latency, count, width_us, period_us)
+        self.history.append(event)
+        return event
+
+    def _wait_frames(self, width_us, count, period_us):
+        active = 1 - self.idle_level
+        names, values = [], []
+        for n in range(count):
+            names += [self.line]
+            values += [active]
+            _append_wait(names, values, width_us)
+            names += [self.line]
+            values += [self.idle_level]
+            if n < count - 1:
+                _append_wait(names, values, period_us - width_us)
+        return names, values
+
+    def _pulse_out_frames(self, width_us, count, period_us):
+        dio = f"DIO{self.dio}"
+        names = [dio + "_EF_ENABLE"]
+        values = [0]
+        config = (width_us, period_us)
+        if config != self._pulse_out_config:
+            divisor, roll, width_ticks = _clock_settings(width_us, period_us)
+            # the clock can only be reconfigured while disabled
+            names += ["DIO_EF_CLOCK0_ENABLE", "DIO_EF_CLOCK0_DIVISOR", "DIO_EF_CLOCK0_ROLL_VALUE",
+                      "DIO_EF_CLOCK0_ENABLE", dio + "_EF_INDEX", dio + "_EF_OPTIONS",
+                      dio + "_EF_CONFIG_B", dio + "_EF_CONFIG_A"]
+            values += [0, divisor, roll, 1, EF_PULSE_OUT, 0, 0, width_ticks]
+            self._pulse_out_config = config
+        names += [dio + "_EF_CONFIG_C", dio + "_EF_ENABLE"]
+        values += [count, 1]
+        return names, values
+
+    def close(self):
+        """Stops any pulse output and returns the line to its idle level."""
+        names = [self.line]
+        values = [self.idle_level]
+        if self._pulse_out_config is not None:
+            names.insert(0, f"DIO{self.dio}_EF_ENABLE")
+            values.insert(0, 0)
+            self._pulse_out_config = None
+        self.ljm.eWriteNames(self.handle, len(names), names, values)
+
+
+class SyncEvent(TriggerEvent):
+    """
+    TriggerEvent of a SyncTrigger. sequence numbers the events of one
+    trigger, wall_time is time.time() when the command was sent, and edges
+    maps each line to the estimated host times (time.perf_counter) of its
+    rising and falling edge. The estimates assume the packet reached the
+    device half way through the USB round trip, so they are good to about
+    +- uncertainty seconds; the spacing between edges is exact.
+    """
+    __slots__ = ("sequence", "wall_time", "edges", "uncertainty")
+
+    def __init__(self, sequence, host_time, wall_time, latency, width_us, edges, uncertainty):
+        super().__init__(host_time, latency, 1, width_us, None)
+        self.sequence = sequence
+        self.wall_time = wall_time
+        self.edges = edges
+        self.uncertainty = uncertainty
+
+    def edge_wall_time(self, line, edge=0):
+        """Rising (edge=0) or falling (edge=1) edge of line as time.time() seconds."""
+        return self.wall_time + self.edges[line][edge] - self.host_time
+
+    def __repr__(self):
+        return f"SyncEvent(sequence={self.sequence}, lines={list(self.edges)}, latency={self.latency * 1e3:.3f} ms)"
+
+
+class SyncTrigger(_TimedTrigger):
+    """
+    Fires pulses on several lines from one eWriteNames packet, e.g. the
+    camera and spectrometer trigger inputs, so both see the same event.
+
+    All lines are switched together through DIO_STATE, with DIO_INHIBIT
+    masking the lines that are not ours, so lines with the same delay change
+    on the same device instruction. Per-line delays and widths are inserted
+    as WAIT_US_BLOCKING frames and are exact to about a microsecond.
+
+    Each fire() returns a SyncEvent with a sequence number and the host
+    time of every edge, to correlate camera frames and spectra with the
+    event that triggered them.
+    """
+
+    def __init__(self, handle, lines, width_us=100, delays_us=None, idle_level=0, ljm_module=None,
+                 history=1000):
+        """
+        :param handle: LJM device handle from ljm.openS
+        :param lines: line names, e.g. ("FIO4", "FIO5")
+        :param width_us: pulse width in microseconds, one value for every
+        line or a dict of line: width
+        :param delays_us: optional dict of line: delay in microseconds after
+        the first edge, 0 for lines not listed
+        :param idle_level: level between pulses; pulses go to the other level
+        :param ljm_module: labjack.ljm or a stand-in such as fake_ljm
+        """
+        super().__init__("+".join(lines), history)
+        self.ljm = ljm_module or ljm
+        if self.ljm is None:
+            raise RuntimeError("labjack-ljm is not installed")
+        self.handle = handle
+        self.lines = tuple(lines)
+        self.width_us = width_us
+        self.delays_us = dict(delays_us or {})
+        self.idle_level = idle_level
+        self.sequence = 0
+
+        self._bits = {line: 1 << dio_number(line) for line in self.lines}
+        self._mask = sum(self._bits.values())
+        idle = self._mask if idle_level else 0
+        self.ljm.eWriteNames(self.handle, 3, ["DIO_INHIBIT", "DIO_DIRECTION", "DIO_STATE"],
+                             [~self._mask & 0x7FFFFF, self._mask, idle])
+
+    def _width(self, line, width_us):
+        width_us = self.width_us if width_us is None else width_us
+        return width_us[line] if isinstance(width_us, dict) else width_us
+
+    def schedule(self, width_us=None, delays_us=None):
+        """
+        Edge times of one fire() as a sorted list of (offset_us, state), where
+        state is the DIO_STATE value from that offset on.
+        """
+        delays_us = self.delays_us if delays_us is None else delays_us
+        changes = {}
+        for line in self.lines:
+            delay = delays_us.get(line, 0)
+            width = self._width(line, width_us)
+            if delay < 0 or width <= 0:
+                raise ValueError(f"Delay and width for {line} must be positive, got {delay} and {width} us")
+            changes.setdefault(delay, []).append((line, 1 - self.idle_level))
+            changes.setdefault(delay + width, []).append((line, self.idle_level))
+
+        state = self._mask if self.idle_level else 0
+        edges = []
+        for offset in sorted(changes):
+            for line, level in changes[offset]:
+                state = state | self._bits[line] if level else state & ~self._bits[line]
+            edges.append((offset, state))
+        return edges
+
+    def fire(self, width_us=None, delays_us=None):
+        """
+        Sends one pulse on every line.
+
+        :param width_us: overrides the widths given at construction
+        :param delays_us: overrides the per-line delays given at construction
+        :return: SyncEvent
+        """
+        schedule = self.schedule(width_us, delays_us)
+        names = ["DIO_INHIBIT"]
+        values = [~self._mask & 0x7FFFFF]
+        now = 0
+        for offset, state in schedule:
+            _append_wait(names, values, offset - now)
+            now = offset
+            names.append("DIO_STATE")
+            values.append(state)
+
+        wall_time = time.time()
+        start = time.perf_counter()
+        self.ljm.eWriteNames(self.handle, len(names), names, values)
+        latency = time.perf_counter() - start
+        timing.add("trigger", latency)
+
+        # the response comes back after the blocking waits; what is left is
+        # the USB round trip, and the packet arrived about half way through it
+        round_trip = max(0.0, latency - now / 1e6)
+        arrival = start + round_trip / 2
+        delays_us = self.delays_us if delays_us is None else delays_us
+        edges = {}
+        for line in self.lines:
+            rise = delays_us.get(line, 0)
+            edges[line] = (arrival + rise / 1e6, arrival + (rise + self._width(line, width_us)) / 1e6)
+
+        event = SyncEvent(self.sequence, start, wall_time, latency, width_us or self.width_us, edges,
+                          round_trip / 2)
+        self.sequence += 1
+        self.history.append(event)
+        return event
+
+    def close(self):
+        """Returns the lines to their idle level and clears DIO_INHIBIT."""
+        idle = self._mask if self.idle_level else 0
+        self.ljm.eWriteNames(self.handle, 3, ["DIO_INHIBIT", "DIO_STATE", "DIO_INHIBIT"],
+                             [~self._mask & 0x7FFFFF, idle, 0])
+
+
+def _append_wait(names, values, us):
+    us = int(round(us))
+    while us > 0:
+        step = min(us, MAX_WAIT_US)
+        names.append("WAIT_US_BLOCKING")
+        values.append(step)
+        us -= step
+
+
+def _clock_settings(width_us, period_us):
+    """Smallest clock divisor whose 32-bit roll value covers the period."""
+    for divisor in (1, 2, 4, 8, 16, 32, 64, 256):
+        ticks_per_us = CORE_CLOCK_HZ / divisor / 1e6
+        roll = int(round(period_us * ticks_per_us))
+        if roll < 2 ** 32:
+            return divisor, roll, int(round(width_us * ticks_per_us))
+    raise ValueError(f"Pulse period {period_us} us is too long for the DIO_EF clock")
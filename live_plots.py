@@ -0,0 +1,287 @@
+import cv2
+import numpy as np
+from PyQt5.QtCore import QTimer
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+import timing
+
+'''
+Plots that keep up with streaming data: artists are created once and
+updated in place, and frames are redrawn by blitting onto a cached
+background instead of rebuilding the axes
+'''
+
+# line colours by channel count: Mono8, and OpenCV's BGR order
+CHANNEL_COLORS = {1: ("k",), 3: ("b", "g", "r")}
+
+
+def image_histogram(image, step=1):
+    """
+    256-bin histogram of a uint8 image.
+
+    Mono images (2-D, or a single channel) get one histogram; for colour
+    images every channel is counted from the interleaved data without
+    splitting or converting it.
+
+    :param image: (h, w) or (h, w, channels) uint8 array
+    :param step: count every step-th row and column only, e.g. 2 for a
+    quarter of the pixels in a live view
+    :return: (channels, 256) float32 counts
+    """
+    if step > 1:
+        image = image[::step, ::step]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    return np.stack([cv2.calcHist([image], [c], None, [256], [0, 256]).ravel() for c in range(channels)])
+
+
+class HistogramCanvas(FigureCanvas):
+    """
+    Live image histogram. The axes and one line per channel are created
+    once; plot_histogram() only replaces the line data and blits it over the
+    cached background. The full figure is redrawn only when the y range has
+    to change (the peak leaves it, or falls below a quarter of it) or the
+    canvas was resized.
+    """
+
+    def __init__(self, parent=None, width=4, height=3, dpi=100, step=1):
+        """
+        :param step: pixel subsampling passed to image_histogram
+        """
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = fig.add_subplot(111)
+        super().__init__(fig)
+        self.setParent(parent)
+        self.step = step
+        self.lines = []
+        self._background = None
+        self._bins = np.arange(256)
+
+        self.axes.set_xlim([0, 256])
+        self.axes.set_ylim([0, 1])
+        self.axes.set_title("Histogram")
+        self.mpl_connect("draw_event", self._on_draw)
+
+    def _ensure_lines(self, channels):
+        if len(self.lines) == channels:
+            return
+        for line in self.lines:
+            line.remove()
+        colors = CHANNEL_COLORS.get(channels, ("k",) * channels)
+        self.lines = [self.axes.plot(self._bins, np.zeros(256), color=color, animated=True)[0]
+                      for color in colors]
+        self.axes.set_title("Intensity Histogram" if channels == 1 else "BGR Histogram")
+        self._background = None
+
+    def _on_draw(self, event):
+        # a full draw leaves out the animated lines: keep the empty axes as
+        # the background, then put the lines on top
+        self._background = self.copy_from_bbox(self.figure.bbox)
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+    def plot_histogram(self, img):
+        """
+        :param img: uint8 frame, mono (h, w) or colour (h, w, 3) in BGR order
+        """
+        with timing.span("plot_histogram"):
+            self._draw_histogram(img)
+
+    def _draw_histogram(self, img):
+        hist = image_histogram(img, self.step)
+        self._ensure_lines(len(hist))
+        for line, counts in zip(self.lines, hist):
+            line.set_ydata(counts)
+
+        peak = float(hist.max()) or 1.0
+        top = self.axes.get_ylim()[1]
+        if peak > top or peak < top / 4:
+            self.axes.set_ylim(0, peak * 1.2)
+            self._background = None
+        if self._background is None:
+            self.draw()
+            return
+        self.restore_region(self._background)
+        for line in self.lines:
+            self.axes.draw_artist(line)
+        self.blit(self.figure.bbox)
+
+    def resizeEvent(self, event):
+        self._background = None
+        super().resizeEvent(event)
+
+
+def minmax_decimate(y, columns):
+    """
+    Reduces y to the minimum and maximum of each of columns equal bins, so a
+    line through the result draws the same envelope as the full data at
+    that pixel width.
+
+    :return: (index, values) of length 2 * columns: the first sample index
+    of each bin twice, and its min and max interleaved. With no more than
+    2 * columns samples y is returned as it is.
+    """
+    n = len(y)
+    if n <= 2 * columns:
+        return np.arange(n), y
+    starts = np.linspace(0, n, columns, endpoint=False).astype(np.intp)
+    values = np.empty(2 * columns, dtype=y.dtype)
+    values[0::2] = np.minimum.reduceat(y, starts)
+    values[1::2] = np.maximum.reduceat(y, starts)
+    return np.repeat(starts, 2), values
+
+
+class SpectrumCanvas(FigureCanvas):
+    """
+    Live spectrum plot for streaming data.
+
+    plot_spectrum() only copies the spectrum and, at most every
+    1 / max_fps seconds, a timer draws the newest one: it is reduced with
+    min/max decimation to the axes' pixel width and blitted over a cached
+    background. Labels, grid and title are drawn once; the full figure is
+    redrawn only when the wavelengths, the y range or the canvas size change.
+
+    With waterfall_rows > 0 a second axes shows the last waterfall_rows
+    spectra as an image, one decimated row per spectrum received.
+    """
+
+    def __init__(self, parent=None, width=4, height=2, dpi=100, title="Spectrum", max_fps=30,
+                 waterfall_rows=0, color="tab:blue"):
+        """
+        :param max_fps: most redraws per second
+        :param waterfall_rows: spectra kept in the waterfall view, 0 for none
+        """
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        if waterfall_rows:
+            self.axes, self.waterfall_axes = fig.subplots(2, 1, sharex=True)
+        else:
+            self.axes, self.waterfall_axes = fig.add_subplot(111), None
+        super().__init__(fig)
+        self.setParent(parent)
+
+        self.axes.set_title(title)
+        self.axes.set_xlabel("Wavelength (nm)")
+        self.axes.set_ylabel("Intensity")
+        self.axes.grid(True)
+        self.line = self.axes.plot([], [], color=color, animated=True)[0]
+        self.waterfall_rows = waterfall_rows
+        self.waterfall = None
+        self.image = None
+        if waterfall_rows:
+            self.waterfall_axes.set_ylabel("Spectra ago")
+
+        self.wavelengths = None
+        self._latest = None
+        self._pending = False
+        self._columns = None
+        self._starts = None
+        self._x = None
+        self._background = None
+        self._clim = None
+        self.received = 0
+        self.drawn = 0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(max(1, int(1000 / max_fps)))
+        self._timer.timeout.connect(self._render)
+        self.mpl_connect("draw_event", self._on_draw)
+
+    def _animated(self):
+        return [self.line] + ([self.image] if self.image is not None else [])
+
+    def _on_draw(self, event):
+        self._background = self.copy_from_bbox(self.figure.bbox)
+        for artist in self._animated():
+            artist.axes.draw_artist(artist)
+
+    def _pixel_columns(self):
+        return max(16, int(self.axes.bbox.width))
+
+    def set_wavelengths(self, wavelengths):
+        self.wavelengths = np.array(wavelengths, dtype=np.float64)
+        self._latest = np.zeros(len(self.wavelengths))
+        self._columns = None
+        self.axes.set_xlim(self.wavelengths[0], self.wavelengths[-1])
+        self._background = None
+
+    def _set_columns(self):
+        # decimation plan for the current width; the waterfall restarts with it
+        self._columns = self._pixel_columns()
+        index, _ = minmax_decimate(self._latest, self._columns)
+        self._x = self.wavelengths[index]
+        self._starts = index[0::2] if len(index) < len(self._latest) else None
+        if self.waterfall_rows:
+            self.waterfall = np.zeros((self.waterfall_rows, len(self._waterfall_row())))
+            if self.image is not None:
+                self.image.remove()
+            self.image = self.waterfall_axes.imshow(
+                self.waterfall, aspect="auto", origin="lower", animated=True, interpolation="nearest",
+                extent=(self.wavelengths[0], self.wavelengths[-1], self.waterfall_rows, 0))
+            self._clim = None
+        self._background = None
+
+    def _waterfall_row(self):
+        # the waterfall keeps the maximum of each pixel column
+        if self._starts is None:
+            return self._latest
+        return np.maximum.reduceat(self._latest, self._starts)
+
+    def plot_spectrum(self, wavelengths, spectrum):
+        """
+        Shows spectrum at the next refresh. Cheap enough to call for every
+        scan of a fast stream; only the newest spectrum is drawn.
+        """
+        if self.wavelengths is None or len(wavelengths) != len(self.wavelengths) \
+                or wavelengths[0] != self.wavelengths[0] or wavelengths[-1] != self.wavelengths[-1]:
+            self.set_wavelengths(wavelengths)
+        np.copyto(self._latest, spectrum[:len(self._latest)])
+        self.received += 1
+        if self.waterfall is not None:
+            self.waterfall[1:] = self.waterfall[:-1]
+            self.waterfall[0] = self._waterfall_row()
+        if not self._pending:
+            self._pending = True
+            self._timer.start()
+
+    def _render(self):
+        self._pending = False
+        with timing.span("plot_spectrum"):
+            self._draw_spectrum()
+
+    def _draw_spectrum(self):
+        if self._columns != self._pixel_columns():
+            self._set_columns()
+            if self.waterfall is not None:
+                self.waterfall[0] = self._waterfall_row()
+        _, values = minmax_decimate(self._latest, self._columns)
+        self.line.set_data(self._x, values)
+
+        low, high = float(values.min()), float(values.max())
+        bottom, top = self.axes.get_ylim()
+        span = max(high - low, 1.0)
+        if low < bottom or high > top or span < (top - bottom) / 4:
+            self.axes.set_ylim(low - 0.05 * span, high + 0.05 * span)
+            self._background = None
+        if self.image is not None:
+            self._update_waterfall_scale()
+
+        self.drawn += 1
+        if self._background is None:
+            self.draw()
+            return
+        self.restore_region(self._background)
+        for artist in self._animated():
+            artist.axes.draw_artist(artist)
+        self.blit(self.figure.bbox)
+
+    def _update_waterfall_scale(self):
+        self.image.set_data(self.waterfall)
+        low, high = float(self.waterfall.min()), float(self.waterfall.max())
+        if self._clim is None or low < self._clim[0] or high > self._clim[1]:
+            self._clim = (low, high if high > low else low + 1.0)
+            self.image.set_clim(*self._clim)
+
+    def resizeEvent(self, event):
+        self._background = None
+        super().resizeEvent(event)
@@ -0,0 +1,334 @@
+import json
+import os
+
+import numpy as np
+
+from avaspec import AVS_PrepareMeasure
+
+'''
+Spectrometer measurement profiles: averaging, smoothing and dynamic dark
+correction done by the spectrometer where it supports them, so an N times
+averaged spectrum is one USB transfer instead of N, and by NumPy on the host
+where it does not
+'''
+
+PROFILE_DIR = "measurement_profiles"
+
+# AVS_PrepareMeasure errors for a setting the device cannot do, and the
+# setting they name; None for the ones that don't say which
+ERR_OPERATION_NOT_SUPPORTED = -2
+ERR_INVALID_MEASPARAM_AVG_SAT2 = -110
+ERR_INVALID_MEASPARAM_AVG_RAM = -111
+ERR_INVALID_MEASPARAM_DYNDARK = -116
+ERR_NOT_SUPPORTED_BY_SENSOR_TYPE = -140
+ERR_NOT_SUPPORTED_BY_FW_VER = -141
+ERR_NOT_SUPPORTED_BY_FPGA_VER = -142
+UNSUPPORTED_ERRORS = {
+    ERR_OPERATION_NOT_SUPPORTED: None,
+    ERR_INVALID_MEASPARAM_AVG_SAT2: "averages",
+    ERR_INVALID_MEASPARAM_AVG_RAM: "averages",
+    ERR_INVALID_MEASPARAM_DYNDARK: "dynamic_dark",
+    ERR_NOT_SUPPORTED_BY_SENSOR_TYPE: None,
+    ERR_NOT_SUPPORTED_BY_FW_VER: None,
+    ERR_NOT_SUPPORTED_BY_FPGA_VER: None,
+}
+
+# the order settings are moved to the host in when an error doesn't name one:
+# the newest firmware features first, averaging, which every AvaSpec has, last
+FALLBACK_ORDER = ("dynamic_dark", "smooth_pixels", "averages")
+
+
+# === Host-side processing ===
+
+class BoxcarSmoother:
+    """
+    Moving average over half_width pixels either side, fewer at the detector
+    ends, as the AvaSpec library smooths. One cumulative sum per call, so
+    the cost does not grow with the width.
+    """
+
+    def __init__(self, half_width, pixels):
+        self.half_width = half_width
+        index = np.arange(pixels)
+        self._lo = np.maximum(index - half_width, 0)
+        self._hi = np.minimum(index + half_width + 1, pixels)
+        self._width = (self._hi - self._lo).astype(np.float64)
+
+    def __call__(self, spectra, out=None):
+        """
+        :param spectra: (..., pixels) array
+        :param out: result array, may be spectra itself
+        """
+        sums = np.zeros(spectra.shape[:-1] + (spectra.shape[-1] + 1,))
+        np.cumsum(spectra, axis=-1, out=sums[..., 1:])
+        return np.divide(sums[..., self._hi] - sums[..., self._lo], self._width, out=out)
+
+
+class DarkTracker:
+    """
+    Dynamic dark correction on the host: the mean of the detector's dark
+    (optically masked) pixels is tracked from scan to scan and subtracted
+    from every pixel. Each new value is weighted by forget_percentage,
+    like m_CorDynDark_m_ForgetPercentage; 100 uses each scan's own.
+    """
+
+    def __init__(self, dark_pixels, forget_percentage=100):
+        """
+        :param dark_pixels: (start, stop) pixel range of the dark pixels
+        :param forget_percentage: weight of the newest dark value, 1 to 100
+        """
+        self.dark_pixels = slice(*dark_pixels)
+        self.weight = forget_percentage / 100
+        self.level = None
+
+    def __call__(self, spectra):
+        """Corrects a (n_scans, pixels) array in place, oldest scan first."""
+        levels = spectra[:, self.dark_pixels].mean(axis=1)
+        if self.weight < 1:
+            # the recursion runs over one value per scan, not per pixel
+            level = levels[0] if self.level is None else self.level
+            for i, new in enumerate(levels):
+                level = levels[i] = self.weight * new + (1 - self.weight) * level
+        self.level = levels[-1]
+        spectra -= levels[:, None]
+        return spectra
+
+
+class HostProcessing:
+    """
+    The part of a profile the device could not do. process() turns the
+    device's scans into results as the device would have: each group of
+    averages scans is averaged and stamped with the timestamp of its last
+    scan, then dark corrected and smoothed.
+    """
+
+    def __init__(self, pixels, averages=1, smooth_pixels=0, dark=None):
+        """
+        :param pixels: detector pixels
+        :param averages: device scans averaged into each result
+        :param smooth_pixels: neighbours either side averaged into each pixel
+        :param dark: DarkTracker, or None
+        """
+        self.pixels = pixels
+        self.averages = averages
+        self.smooth_pixels = smooth_pixels
+        self.dark = dark
+        self._smooth = BoxcarSmoother(smooth_pixels, pixels) if smooth_pixels else None
+
+    def __repr__(self):
+        return (f"HostProcessing(averages={self.averages}, smooth_pixels={self.smooth_pixels}, "
+                f"dynamic_dark={self.dark is not None})")
+
+    @property
+    def idle(self):
+        return self.averages == 1 and not self.smooth_pixels and self.dark is None
+
+    def process(self, raw, raw_timestamps, out=None, timestamps=None):
+        """
+        :param raw: (n_results * averages, pixels) device scans
+        :param raw_timestamps: their (n_results * averages,) timestamps
+        :param out: optional (>= n_results, >= pixels) float64 buffer
+        :param timestamps: optional (>= n_results,) uint32 buffer
+        :return: (spectra, timestamps) of shapes (n_results, pixels) and (n_results,)
+        """
+        n = len(raw) // self.averages
+        spectra = np.empty((n, self.pixels)) if out is None else out[:n, :self.pixels]
+        if timestamps is None:
+            timestamps = np.empty(n, dtype=np.uint32)
+        timestamps = timestamps[:n]
+        if self.averages > 1:
+            # a view of the scans by group, however wide the buffer rows are
+            raw[:n * self.averages].reshape(n, self.averages, -1).mean(axis=1, out=spectra)
+            timestamps[:] = raw_timestamps[self.averages - 1::self.averages][:n]
+        else:
+            spectra[:] = raw[:n]
+            timestamps[:] = raw_timestamps[:n]
+        if self.dark is not None:
+            self.dark(spectra)
+        if self._smooth is not None:
+            self._smooth(spectra, out=spectra)
+        return spectra, timestamps
+
+
+class RunningAverage:
+    """
+    Mean of the last n spectra of a stream, updated with each new one at the
+    cost of one add and one subtract per pixel, whatever n is. For live
+    display of a SpectrumStream at the full scan rate, where averaging on
+    the device (or in HostProcessing) would divide the rate by n.
+    """
+
+    def __init__(self, n, pixels):
+        self.n = n
+        self.count = 0
+        self._ring = np.zeros((n, pixels))
+        self._sum = np.zeros(pixels)
+
+    def add(self, spectrum):
+        """Adds a (pixels,) spectrum and returns the current mean."""
+        slot = self.count % self.n
+        row = self._ring[slot]
+        self._sum -= row
+        row[:] = spectrum
+        self._sum += row
+        self.count += 1
+        return self.mean()
+
+    def extend(self, spectra):
+        """Adds a (n_scans, pixels) batch and returns the mean after the last of them."""
+        # older ones would drop out of the window again
+        for spectrum in spectra[-self.n:]:
+            self.add(spectrum)
+        return self.mean()
+
+    def mean(self, out=None):
+        return np.divide(self._sum, max(1, min(self.count, self.n)), out=out)
+
+    def reset(self):
+        self.count = 0
+        self._ring[:] = 0
+        self._sum[:] = 0
+
+
+# === Profiles ===
+
+class MeasurementProfile:
+    """
+    Named averaging, smoothing and dynamic dark settings for a
+    SpectrometerSession. apply() gives the device everything it accepts and
+    leaves the rest to the host.
+    """
+
+    def __init__(self, name, averages=1, smooth_pixels=0, dynamic_dark=False, dark_forget=100, dark_pixels=None,
+                 integration_time=None, on_device=True):
+        """
+        :param name: profile name, also the file name when saved
+        :param averages: scans averaged into each result
+        :param smooth_pixels: neighbours either side averaged into each pixel
+        :param dynamic_dark: correct each scan by the detector's dark pixels
+        :param dark_forget: percentage of the new dark value used
+        :param dark_pixels: (start, stop) range of the dark pixels, needed
+        only when the device cannot do the dark correction itself
+        :param integration_time: milliseconds, None leaves the session's
+        :param on_device: False does everything on the host, e.g. to compare
+        """
+        self.name = name
+        self.averages = averages
+        self.smooth_pixels = smooth_pixels
+        self.dynamic_dark = dynamic_dark
+        self.dark_forget = dark_forget
+        self.dark_pixels = None if dark_pixels is None else tuple(dark_pixels)
+        self.integration_time = integration_time
+        self.on_device = on_device
+
+    def __repr__(self):
+        return f"MeasurementProfile({self.to_dict()!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, MeasurementProfile) and self.to_dict() == other.to_dict()
+
+    def updated(self, name=None, **settings):
+        """Copy with some settings changed, e.g. profile.updated(averages=50)."""
+        data = self.to_dict()
+        data.update(settings, name=name or self.name)
+        return MeasurementProfile.from_dict(data)
+
+    def _device_settings(self):
+        # the settings that are not already the device's default
+        if not self.on_device:
+            return {}
+        device = {}
+        if self.averages > 1:
+            device["averages"] = self.averages
+        if self.smooth_pixels:
+            device["smooth_pixels"] = self.smooth_pixels
+        if self.dynamic_dark:
+            device["dynamic_dark"] = True
+        return device
+
+    def apply(self, session):
+        """
+        Configures an open SpectrometerSession for this profile and sets
+        session.host to what is left for the host (None when the device does
+        everything). Support is found out by preparing the measurement: a
+        setting the device rejects is moved to the host and the rest tried
+        again.
+
+        :return: the HostProcessing, or None
+        :raises ValueError: if the dark correction is left to the host but
+        the profile has no dark_pixels
+        """
+        if not session.is_open:
+            raise RuntimeError("Spectrometer session is not open")
+        if self.integration_time is not None:
+            session.configure(integration_time=self.integration_time)
+        device = self._device_settings()
+        while True:
+            session.configure(averages=device.get("averages", 1), smooth_pixels=device.get("smooth_pixels", 0),
+                              dynamic_dark=device.get("dynamic_dark", False), dark_forget=self.dark_forget)
+            ret = AVS_PrepareMeasure(session.handle, session.measconfig)
+            if ret >= 0:
+                break
+            if ret not in UNSUPPORTED_ERRORS or not device:
+                raise RuntimeError(f"AVS_PrepareMeasure failed with error {ret}")
+            setting = UNSUPPORTED_ERRORS[ret]
+            if setting not in device:
+                setting = next(s for s in FALLBACK_ORDER if s in device)
+            del device[setting]
+
+        dark = None
+        if self.dynamic_dark and "dynamic_dark" not in device:
+            if self.dark_pixels is None:
+                raise ValueError(f"Spectrometer {session.device_index} cannot do dynamic dark correction and "
+                                 f"profile '{self.name}' gives no dark_pixels to do it on the host")
+            dark = DarkTracker(self.dark_pixels, self.dark_forget)
+        host = HostProcessing(session.pixels, 1 if "averages" in device else self.averages,
+                              0 if "smooth_pixels" in device else self.smooth_pixels, dark)
+        session.host = None if host.idle else host
+        return session.host
+
+    # === Files ===
+
+    def to_dict(self):
+        return {"name": self.name, "averages": self.averages, "smooth_pixels": self.smooth_pixels,
+                "dynamic_dark": self.dynamic_dark, "dark_forget": self.dark_forget,
+                "dark_pixels": None if self.dark_pixels is None else list(self.dark_pixels),
+                "integration_time": self.integration_time, "on_device": self.on_device}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def save(self, directory=PROFILE_DIR):
+        """Writes the profile to <directory>/<name>.json and returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+BUILTIN_PROFILES = {
+    "raw": MeasurementProfile("raw"),
+    "averaged": MeasurementProfile("averaged", averages=10),
+    "smoothed": MeasurementProfile("smoothed", averages=10, smooth_pixels=2),
+}
+
+
+def load_profile(name, directory=PROFILE_DIR):
+    """Loads <directory>/<name>.json, falling back to the built-in profile of that name."""
+    path = os.path.join(directory, f"{name}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return MeasurementProfile.from_dict(json.load(f))
+    if name in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[name]
+    raise FileNotFoundError(f"No measurement profile '{name}' in {directory} and no built-in one")
+
+
+def list_profiles(directory=PROFILE_DIR):
+    """Names of the saved and built-in profiles."""
+    saved = []
+    if os.path.isdir(directory):
+        saved = [f[:-len(".json")] for f in os.listdir(directory) if f.endswith(".json")]
+    return sorted(set(saved) | set(BUILTIN_PROFILES))
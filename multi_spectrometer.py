@@ -0,0 +1,272 @@
+import numpy as np
+
+from avaspec import *
+from spectrometer import SpectrometerSession, SpectrumStream, _acquire_library, _release_library
+
+'''
+Several spectrometers acquired together: one master drives the others
+through its sync output (AVS_SetSyncMode), every device is drained by its
+own SpectrumStream thread, and scans with the same index are merged into one
+spectrum covering all bands
+'''
+
+# m_Trigger_m_Source of a device triggered from the synchronisation input
+SYNC_INPUT = 1
+
+
+def stitch_plan(wavelength_arrays):
+    """
+    Works out which pixels of each device make up a stitched spectrum.
+
+    Devices are ordered by their first wavelength. Where two neighbouring
+    bands overlap the cut is placed half way through the overlap, so every
+    stitched pixel is a raw detector pixel and wavelengths stay increasing.
+    Gaps between bands are left as they are.
+
+    :param wavelength_arrays: increasing wavelength calibration per device
+    :return: (pieces, wavelengths), pieces a list of (device, first pixel,
+    stop pixel) in stitched order
+    """
+    order = sorted(range(len(wavelength_arrays)), key=lambda i: wavelength_arrays[i][0])
+    cuts = [-np.inf]
+    for lower, upper in zip(order, order[1:]):
+        low_end = wavelength_arrays[lower][-1]
+        high_start = wavelength_arrays[upper][0]
+        cuts.append((low_end + high_start) / 2 if low_end >= high_start else high_start)
+    cuts.append(np.inf)
+
+    pieces = []
+    for n, device in enumerate(order):
+        wavelengths = wavelength_arrays[device]
+        start = int(np.searchsorted(wavelengths, cuts[n], side="left"))
+        stop = int(np.searchsorted(wavelengths, cuts[n + 1], side="left"))
+        if stop > start:
+            pieces.append((device, start, stop))
+    stitched = np.concatenate([wavelength_arrays[device][start:stop] for device, start, stop in pieces])
+    return pieces, stitched
+
+
+class SpectrometerArray:
+    """
+    All attached spectrometers (or a chosen subset), opened together.
+
+    With sync enabled the device at master is put in sync mode and the
+    others are prepared for hardware triggering from the sync input, so each
+    master scan starts one scan on every device. Without sync every device
+    free-runs on its own clock.
+
+    All calls on an array must come from one thread.
+    """
+
+    def __init__(self, device_indices=None, master=0, sync=True, port=0, integration_time=10.0,
+                 integration_delay=0, averages=1):
+        """
+        :param device_indices: positions in AVS_GetList, None for every attached device
+        :param master: index into device_indices of the sync master
+        :param sync: use the master's sync output to trigger the others
+        :param port: passed to AVS_Init, 0 for USB
+        :param integration_time: milliseconds, for every device
+        :param integration_delay: FPGA clock cycles
+        :param averages: scans averaged on the device per result
+        """
+        self.device_indices = device_indices
+        self.master = master
+        self.sync = sync
+        self.port = port
+        self._settings = dict(integration_time=integration_time, integration_delay=integration_delay,
+                              averages=averages)
+        self.sessions = []
+        self.pieces = None
+        self.wavelengths = None
+        self._sync_enabled = False
+
+    @property
+    def is_open(self):
+        return bool(self.sessions)
+
+    @property
+    def master_session(self):
+        return self.sessions[self.master]
+
+    def open(self):
+        if self.is_open:
+            return self
+        # holds the library while devices are counted, so AVS_Init runs once
+        _acquire_library(self.port)
+        try:
+            indices = self.device_indices
+            if indices is None:
+                indices = range(AVS_UpdateUSBDevices())
+            for index in indices:
+                self.sessions.append(SpectrometerSession(index, self.port, **self._settings).open())
+            if not self.sessions:
+                raise RuntimeError("No spectrometers attached")
+            if not 0 <= self.master < len(self.sessions):
+                raise ValueError(f"Master {self.master} is not one of the {len(self.sessions)} devices")
+            self._configure_sync()
+            self.pieces, self.wavelengths = stitch_plan([session.wavelengths for session in self.sessions])
+        except Exception:
+            self.close()
+            raise
+        finally:
+            _release_library()
+        return self
+
+    def _configure_sync(self):
+        use_sync = self.sync and len(self.sessions) > 1
+        for n, session in enumerate(self.sessions):
+            slave = use_sync and n != self.master
+            session.configure(trigger_mode=1 if slave else 0, trigger_source=SYNC_INPUT if slave else 0)
+        if use_sync != self._sync_enabled:
+            ret = AVS_SetSyncMode(self.master_session.handle, use_sync)
+            if ret < 0:
+                raise RuntimeError(f"AVS_SetSyncMode failed with error {ret}")
+            self._sync_enabled = use_sync
+
+    def configure(self, **settings):
+        """Changes integration_time, integration_delay or averages on every device."""
+        unknown = set(settings) - set(self._settings)
+        if unknown:
+            raise TypeError(f"Unknown spectrometer settings: {sorted(unknown)}")
+        self._settings.update(settings)
+        for session in self.sessions:
+            session.configure(**settings)
+
+    def start_order(self):
+        """Sessions in the order their measurements must start: slaves armed first, master last."""
+        return [s for n, s in enumerate(self.sessions) if n != self.master] + [self.master_session]
+
+    def stream(self, capacity=256, nummeas=-1):
+        """
+        A StitchedStream over every device; use it as a context manager or
+        call start() and stop().
+        """
+        if not self.is_open:
+            raise RuntimeError("Spectrometer array is not open")
+        return StitchedStream(self, capacity, nummeas)
+
+    def close(self):
+        try:
+            if self._sync_enabled:
+                self._sync_enabled = False
+                AVS_SetSyncMode(self.master_session.handle, 0)
+        finally:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StitchedStream:
+    """
+    Continuous acquisition on a SpectrometerArray. Each device is drained by
+    its own SpectrumStream (one thread per handle, each into its own ring
+    buffer), so readout of one device never waits on another.
+
+    Scans are matched by index: in sync mode scan n of every device was
+    started by the same master pulse. read() returns the device timestamps
+    and the stitched spectrum of the next complete set. Sets that a slow
+    reader lets fall out of any ring are counted in dropped; max_skew_ticks
+    tracks how far a device's scan drifted from the master's, measured from
+    each device's first scan since the device clocks are independent.
+    """
+
+    def __init__(self, array, capacity=256, nummeas=-1):
+        self.array = array
+        self.pieces = array.pieces
+        self.wavelengths = array.wavelengths
+        period = array.master_session.measconfig.m_IntegrationTime / 1e3
+        self.streams = [SpectrumStream(session.handle, session.pixels, capacity, nummeas, expected_period=period)
+                        for session in array.sessions]
+        # stitched pixel ranges, matching pieces
+        bounds = np.cumsum([0] + [stop - start for _, start, stop in self.pieces])
+        self._targets = list(zip(bounds[:-1], bounds[1:]))
+        self._seq = 0
+        self._first_timestamps = None
+        self.frames = 0
+        self.dropped = 0
+        self.max_skew_ticks = 0
+
+    def start(self):
+        by_handle = {stream.handle: stream for stream in self.streams}
+        for session in self.array.start_order():
+            session.prepare()
+        for session in self.array.start_order():
+            by_handle[session.handle].start()
+        return self
+
+    def stop(self):
+        # master first, so no slave is left armed for a pulse that never comes
+        by_handle = {stream.handle: stream for stream in self.streams}
+        for session in reversed(self.array.start_order()):
+            by_handle[session.handle].stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stats(self):
+        per_device = [stream.stats() for stream in self.streams]
+        return {"frames": self.frames, "dropped": self.dropped, "max_skew_ticks": self.max_skew_ticks,
+                "received": sum(s["received"] for s in per_device),
+                "missed": sum(s["missed"] for s in per_device), "devices": per_device}
+
+    def read(self, timeout=None, out=None):
+        """
+        Returns (timestamps, spectrum) for the next set of scans, or None
+        once a device has stopped and its scans are used up. timestamps holds
+        one 10 us tick count per device in array order; spectrum is written
+        into out if given, else a new array matching self.wavelengths.
+        """
+        if out is None:
+            out = np.empty(len(self.wavelengths), dtype=np.float64)
+        while True:
+            seq = self._seq
+            for stream in self.streams:
+                if not stream.buffer.wait_for(seq, timeout, abort=lambda s=stream: not s.running):
+                    raise TimeoutError(f"No scan from spectrometer {stream.handle} within {timeout} s")
+                if stream.error is not None:
+                    raise stream.error
+            if any(stream.buffer.next_seq <= seq for stream in self.streams):
+                return None
+
+            oldest = max(stream.buffer.oldest_seq for stream in self.streams)
+            if seq < oldest:
+                self.dropped += oldest - seq
+                self._seq = oldest
+                continue
+            self._seq += 1
+
+            slot = seq % self.streams[0].buffer.capacity
+            for (device, start, stop), (first, last) in zip(self.pieces, self._targets):
+                out[first:last] = self.streams[device].buffer.spectra[slot, start:stop]
+            timestamps = np.array([stream.buffer.timestamps[slot] for stream in self.streams], dtype=np.uint32)
+            if not all(stream.buffer.valid(seq) for stream in self.streams):
+                # overwritten while copying
+                self.dropped += 1
+                continue
+
+            self._track_skew(timestamps)
+            self.frames += 1
+            return timestamps, out
+
+    def _track_skew(self, timestamps):
+        if self._first_timestamps is None:
+            self._first_timestamps = timestamps.astype(np.int64)
+        elapsed = (timestamps.astype(np.int64) - self._first_timestamps) & 0xFFFFFFFF
+        skew = int(elapsed.max() - elapsed.min())
+        self.max_skew_ticks = max(self.max_skew_ticks, skew)
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
@@ -0,0 +1,124 @@
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+import types
+
+'''
+Simulated hardware backends
+
+ACQ_SIMULATE selects the devices that are replaced by stand-ins, so the
+scripts and benchmarks run on any Linux box: "all", or a comma-separated
+list of
+  avaspec  the stub library built from stub_avs.c (needs a C compiler)
+  vimba    fake_vimba, a Mono8 camera
+  ljm      fake_ljm, a LabJack that records every edge
+With both vimba and ljm simulated, rising edges on the camera trigger line
+(ACQ_SIM_CAMERA_LINE, FIO5 by default) trigger the fake camera. With both
+avaspec and ljm simulated, rising edges on the spectrometer trigger line
+(ACQ_SIM_SPECTROMETER_LINE, FIO4 by default) reach the external trigger
+input of the stub spectrometers.
+
+install() has to run before the first AvaSpec call and before vmbpy or
+labjack are imported.
+'''
+
+SIMULATE_ENV = "ACQ_SIMULATE"
+CAMERA_LINE_ENV = "ACQ_SIM_CAMERA_LINE"
+SPECTROMETER_LINE_ENV = "ACQ_SIM_SPECTROMETER_LINE"
+DEVICES = ("avaspec", "vimba", "ljm")
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_avs.c")
+
+
+def simulated_devices(value=None):
+    """
+    Devices named in ACQ_SIMULATE (or in value), as a set.
+
+    :raises ValueError: for an unknown device name
+    """
+    value = os.environ.get(SIMULATE_ENV, "") if value is None else value
+    names = {name.strip().lower() for name in value.split(",") if name.strip()}
+    if names & {"all", "1", "yes", "true"}:
+        return set(DEVICES)
+    unknown = names - set(DEVICES)
+    if unknown:
+        raise ValueError(f"Unknown device in {SIMULATE_ENV}: {', '.join(sorted(unknown))}; "
+                         f"use 'all' or some of {', '.join(DEVICES)}")
+    return names
+
+
+def build_avs_stub(output_dir=None):
+    """
+    Compiles stub_avs.c into a shared library and returns its path.
+    Needs a C compiler on PATH (cc, or CC from the environment). Without
+    output_dir the library goes to a new temporary directory.
+    """
+    output_dir = output_dir or tempfile.mkdtemp(prefix="avs_stub_")
+    suffix = ".dll" if sys.platform == "win32" else ".so"
+    path = os.path.join(output_dir, "libavs_stub" + suffix)
+    compiler = os.environ.get("CC", "cc")
+    subprocess.run([compiler, "-O2", "-shared", "-fPIC", "-pthread", "-o", path, STUB_SOURCE, "-lm"],
+                   check=True)
+    return path
+
+
+def avs_stub_library():
+    """
+    Path of the stub library, built once per version of stub_avs.c and
+    kept in the temporary directory.
+    """
+    output_dir = os.path.join(tempfile.gettempdir(), f"avs_stub_{int(os.path.getmtime(STUB_SOURCE))}")
+    suffix = ".dll" if sys.platform == "win32" else ".so"
+    path = os.path.join(output_dir, "libavs_stub" + suffix)
+    if not os.path.exists(path):
+        os.makedirs(output_dir, exist_ok=True)
+        build_avs_stub(output_dir)
+    return path
+
+
+def trigger_stub_spectrometers(t):
+    """
+    Edge on the external trigger input of the stub spectrometers at
+    time.perf_counter() value t. Does nothing before the library is loaded,
+    when no measurement can be armed.
+    """
+    avaspec = sys.modules.get("avaspec")
+    if avaspec is not None and avaspec.lib is not None:
+        avaspec.lib.AVS_STUB_ExternalTrigger(ctypes.c_double(t * 1e3))
+
+
+def install(devices=None):
+    """
+    Puts the stand-ins in place of the devices in ACQ_SIMULATE (or devices):
+    AVASPEC_LIB points at the stub library, and fake_vimba and fake_ljm are
+    registered as vmbpy and labjack.ljm, so the usual imports pick them up.
+    Does nothing when no device is simulated.
+
+    :return: the set of simulated devices
+    """
+    devices = simulated_devices() if devices is None else set(devices)
+    if "avaspec" in devices:
+        avaspec = sys.modules.get("avaspec")
+        if avaspec is not None and avaspec.lib is not None:
+            raise RuntimeError("simulation.install() must run before the AvaSpec library is loaded")
+        os.environ["AVASPEC_LIB"] = avs_stub_library()
+    if "vimba" in devices:
+        import fake_vimba
+        sys.modules["vmbpy"] = fake_vimba
+    if "ljm" in devices:
+        import fake_ljm
+        labjack = types.ModuleType("labjack")
+        labjack.ljm = fake_ljm
+        sys.modules["labjack"] = labjack
+        sys.modules["labjack.ljm"] = fake_ljm
+    if {"vimba", "ljm"} <= devices:
+        import fake_ljm
+        import fake_vimba
+        line = os.environ.get(CAMERA_LINE_ENV, "FIO5")
+        fake_ljm.add_edge_listener(line, lambda level, t: level and fake_vimba.trigger_line(t))
+    if {"avaspec", "ljm"} <= devices:
+        import fake_ljm
+        line = os.environ.get(SPECTROMETER_LINE_ENV, "FIO4")
+        fake_ljm.add_edge_listener(line, lambda level, t: level and trigger_stub_spectrometers(t))
+    return devices
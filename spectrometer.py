@@ -0,0 +1,659 @@
+import ctypes
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+import timing
+from avaspec import *
+from calibration import SpectrumCalibration
+from clock_sync import ClockSync
+from spectrum_buffer import SpectrumRingBuffer
+
+'''
+Avantes spectrometer helpers shared by the acquisition scripts
+'''
+
+# AVS_GetScopeData and AVS_GetLambda always use 4096 element arrays, whatever
+# the detector size
+MAX_PIXELS = 4096
+
+
+def wavelength_array(wavelength_calibration, pixels):
+    """
+    Returns the wavelength calibration from AVS_GetLambda as a float64 array
+    trimmed to the detector size. The array is a view on the ctypes data.
+    """
+    return np.ctypeslib.as_array(wavelength_calibration)[:pixels]
+
+
+def allocate_scans(n_scans):
+    """
+    Allocates a readout buffer for n_scans spectra. Rows are MAX_PIXELS wide so
+    the library can write straight into them.
+
+    :return: (spectra, timestamps) with shapes (n_scans, MAX_PIXELS) float64
+    and (n_scans,) uint32
+    """
+    return np.empty((n_scans, MAX_PIXELS), dtype=np.float64), np.empty(n_scans, dtype=np.uint32)
+
+
+def wait_for_scan(handle, timeout=None, min_interval=10e-6, max_interval=250e-6):
+    """
+    Blocks until AVS_PollScan reports a finished scan.
+
+    The poll interval starts at min_interval and doubles up to max_interval,
+    so a scan that is already done or finishes soon is seen within
+    microseconds, while long integrations cost at most one poll per
+    max_interval.
+
+    :param handle: AvsHandle of a spectrometer after AVS_Measure
+    :param timeout: seconds to wait before raising TimeoutError, None waits
+    forever
+    :param min_interval: first sleep between polls, in seconds
+    :param max_interval: longest sleep between polls, in seconds
+    """
+    if AVS_PollScan(handle):
+        return
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    interval = min_interval
+    while True:
+        time.sleep(interval)
+        if AVS_PollScan(handle):
+            return
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError(f"No scan from spectrometer {handle} within {timeout} s")
+        interval = min(interval * 2, max_interval)
+
+
+class ScanCompletion:
+    """
+    Counts scans reported by AVS_MeasureCallback so another thread can block
+    on them without polling. Pass the callback method to AVS_MeasureCallback.
+    """
+
+    def __init__(self):
+        self._ready = threading.Semaphore(0)
+        self.error = None
+
+    def callback(self, handle, result):
+        # runs on the library thread
+        if result < 0:
+            self.error = result
+        self._ready.release()
+
+    def wait(self, handle, timeout=None):
+        if not self._ready.acquire(timeout=timeout):
+            raise TimeoutError(f"No scan from spectrometer {handle} within {timeout} s")
+        if self.error is not None:
+            raise RuntimeError(f"Spectrometer {handle} reported error {self.error}")
+
+
+def read_scans(handle, n_scans, pixels, out=None, timestamps=None, wait=wait_for_scan):
+    """
+    Waits for and reads n_scans spectra from a running measurement.
+
+    Each scan is written by the library directly into a row of out, so no
+    Python objects are created per pixel. out must be C-contiguous float64
+    with rows of at least MAX_PIXELS elements (see allocate_scans); if it is
+    not given a new buffer is allocated.
+
+    :param handle: AvsHandle of a spectrometer after AVS_Measure
+    :param n_scans: number of scans to read
+    :param pixels: number of detector pixels, m_Detector_m_NrPixels
+    :param out: optional (>= n_scans, >= MAX_PIXELS) float64 buffer
+    :param timestamps: optional (>= n_scans,) uint32 buffer
+    :param wait: callable(handle) that returns once the next scan is ready,
+    wait_for_scan by default or ScanCompletion.wait
+    :return: (spectra, timestamps) views of shape (n_scans, pixels) and
+    (n_scans,), timestamps in 10 us device ticks
+    :raises RuntimeError: if the library fails to hand over a scan
+    """
+    if out is None:
+        out, _ = allocate_scans(n_scans)
+    elif (out.dtype != np.float64 or not out.flags.c_contiguous
+          or out.shape[0] < n_scans or out.shape[1] < MAX_PIXELS):
+        raise ValueError(f"readout buffer must be C-contiguous float64 with shape (>={n_scans}, >={MAX_PIXELS})")
+    if timestamps is None:
+        timestamps = np.empty(n_scans, dtype=np.uint32)
+
+    timelabel = ctypes.c_uint32()
+    row_bytes = out.strides[0]
+    address = out.ctypes.data
+    for i in range(n_scans):
+        with timing.span("poll_complete"):
+            wait(handle)
+        with timing.span("get_scope_data"):
+            ret = AVS_GetScopeDataBuffer(handle, timelabel, address + i * row_bytes)
+        if ret < 0:
+            # the row would still hold the previous scan
+            raise RuntimeError(f"AVS_GetScopeData failed with error {ret}")
+        timestamps[i] = timelabel.value
+
+    return out[:n_scans, :pixels], timestamps[:n_scans]
+
+
+def measure_async(handle, pixels, n_scans=1, use_callback=False, timeout=None):
+    """
+    Starts a measurement of n_scans and returns a Future that resolves to the
+    (spectra, timestamps) pair from read_scans. The scans are awaited on a
+    background thread, so the caller (e.g. the Qt event loop) is not blocked.
+    AVS_PrepareMeasure must have been called.
+
+    :param use_callback: start with AVS_MeasureCallback and wait on its
+    notifications instead of polling AVS_PollScan
+    :param timeout: per-scan timeout in seconds, None waits forever
+    """
+    future = Future()
+
+    if use_callback:
+        completion = ScanCompletion()
+        wait = lambda h: completion.wait(h, timeout)
+        AVS_MeasureCallback(handle, completion.callback, n_scans)
+    else:
+        wait = lambda h: wait_for_scan(h, timeout)
+        AVS_Measure(handle, 0, n_scans)
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(read_scans(handle, n_scans, pixels, wait=wait))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"avs-scan-{handle}", daemon=True).start()
+    return future
+
+
+def make_measconfig(pixels, integration_time=10.0, integration_delay=0, averages=1, trigger_mode=0,
+                    trigger_source=0, smooth_pixels=0, dynamic_dark=False, dark_forget=100):
+    """
+    MeasConfigType covering the whole detector, without saturation detection
+    or strobe. trigger_mode is 0 for software, 1 for hardware triggering;
+    trigger_source selects the external trigger input (0) or the
+    synchronisation input (1) for hardware triggers. smooth_pixels is the
+    number of neighbours either side averaged into each pixel, dynamic_dark
+    enables the correction from the detector's dark pixels, dark_forget the
+    percentage of the new dark value used in it.
+    """
+    measconfig = MeasConfigType()
+    measconfig.m_StartPixel = 0
+    measconfig.m_StopPixel = pixels - 1
+    measconfig.m_IntegrationTime = integration_time
+    measconfig.m_IntegrationDelay = integration_delay
+    measconfig.m_NrAverages = averages
+    measconfig.m_CorDynDark_m_Enable = int(dynamic_dark)
+    measconfig.m_CorDynDark_m_ForgetPercentage = dark_forget
+    measconfig.m_Smoothing_m_SmoothPix = smooth_pixels
+    measconfig.m_Smoothing_m_SmoothModel = 0
+    measconfig.m_SaturationDetection = 0
+    measconfig.m_Trigger_m_Mode = trigger_mode
+    measconfig.m_Trigger_m_Source = trigger_source
+    measconfig.m_Trigger_m_SourceType = 0
+    measconfig.m_Control_m_StrobeControl = 0
+    measconfig.m_Control_m_LaserDelay = 0
+    measconfig.m_Control_m_LaserWidth = 0
+    measconfig.m_Control_m_LaserWaveLength = 0.0
+    measconfig.m_Control_m_StoreToRam = 0
+    return measconfig
+
+
+# AVS_Init/AVS_Done are library wide, so open sessions are counted
+_library_lock = threading.Lock()
+_library_users = 0
+
+
+def _acquire_library(port):
+    global _library_users
+    with _library_lock:
+        if _library_users == 0:
+            found = AVS_Init(port)
+            if found < 0:
+                raise RuntimeError(f"AVS_Init failed with error {found}")
+        _library_users += 1
+
+
+def _release_library():
+    global _library_users
+    with _library_lock:
+        _library_users -= 1
+        if _library_users == 0:
+            AVS_Done()
+
+
+def open_library(port=0):
+    """
+    Initialises the library as an open session would and returns the
+    attached devices (AVS_GetList). Until close_library(), sessions skip
+    AVS_Init, the slow USB enumeration, so this can run on a background
+    thread while the GUI comes up.
+    """
+    _acquire_library(port)
+    try:
+        return AVS_GetList()
+    except Exception:
+        _release_library()
+        raise
+
+
+def close_library():
+    """Gives up the library initialised by open_library()."""
+    _release_library()
+
+
+class SpectrometerSession:
+    """
+    One activated spectrometer, kept open between measurements.
+
+    open() initialises the library, activates the device and reads its
+    configuration and wavelength calibration once; measure() then only
+    prepares and runs the scans. close() stops any measurement, deactivates
+    the device and, with the last open session, calls AVS_Done.
+
+    A MeasurementProfile (measurement_profile.py) sets averaging, smoothing
+    and dynamic dark correction; what the device cannot do is left in host,
+    a HostProcessing that read() applies, so measure(n) then runs
+    n * host.averages scans on the device.
+
+    calibration turns raw spectra into calibrated ones with the device's
+    nonlinearity, spectrum correction and irradiance data.
+
+    clock maps the scan timestamps to host time (host_times()). Every
+    software-started measurement anchors it on its first scan, taking the
+    integration to start while AVS_Measure is being sent; for hardware
+    triggered scans pass the trigger edge to add_anchor().
+
+    All calls on a session must come from one thread, e.g. the acquisition
+    engine's.
+    """
+
+    def __init__(self, device_index=0, port=0, integration_time=10.0, integration_delay=0, averages=1,
+                 trigger_mode=0, trigger_source=0, smooth_pixels=0, dynamic_dark=False, dark_forget=100):
+        """
+        :param device_index: position in AVS_GetList of the device to use
+        :param port: passed to AVS_Init, 0 for USB
+        :param integration_time: milliseconds
+        :param integration_delay: FPGA clock cycles
+        :param averages: scans averaged on the device per result
+        :param trigger_mode: 0 software, 1 hardware
+        :param trigger_source: hardware trigger input, 0 external trigger,
+        1 synchronisation input
+        :param smooth_pixels: neighbours either side averaged into each pixel
+        :param dynamic_dark: dark correction from the detector's dark pixels
+        :param dark_forget: percentage of the new dark value used
+        """
+        self.device_index = device_index
+        self.port = port
+        self._settings = dict(integration_time=integration_time, integration_delay=integration_delay,
+                              averages=averages, trigger_mode=trigger_mode, trigger_source=trigger_source,
+                              smooth_pixels=smooth_pixels, dynamic_dark=dynamic_dark, dark_forget=dark_forget)
+        self.handle = None
+        self.identity = None
+        self.device_config = None
+        self.pixels = None
+        self.wavelengths = None
+        self.measconfig = None
+        self.host = None
+        self._raw = None
+        self._calibration = None
+        self.clock = ClockSync(f"spectrometer {device_index}")
+        self._started = None
+        self._holds_library = False
+
+    @property
+    def is_open(self):
+        return self.handle is not None
+
+    def open(self):
+        if self.is_open:
+            return self
+        _acquire_library(self.port)
+        self._holds_library = True
+        try:
+            devices = AVS_GetList()
+            if self.device_index >= len(devices):
+                raise RuntimeError(f"Spectrometer {self.device_index} not found, {len(devices)} attached")
+            self.identity = devices[self.device_index]
+            handle = AVS_Activate(self.identity)
+            if handle < 0:
+                raise RuntimeError(f"AVS_Activate failed with error {handle}")
+            self.handle = handle
+            self.device_config = AVS_GetParameter(handle)
+            self._calibration = None
+            self.pixels = self.device_config.m_Detector_m_NrPixels
+            self.wavelengths = wavelength_array(AVS_GetLambda(handle), self.pixels).copy()
+            self.measconfig = make_measconfig(self.pixels, **self._settings)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    @property
+    def calibration(self):
+        """SpectrumCalibration of the device, built on first use and kept while the session is open."""
+        if self._calibration is None:
+            if self.device_config is None:
+                raise RuntimeError("Spectrometer session is not open")
+            self._calibration = SpectrumCalibration.from_session(self)
+        return self._calibration
+
+    def configure(self, **settings):
+        """
+        Changes integration_time, integration_delay, averages, trigger_mode,
+        trigger_source, smooth_pixels, dynamic_dark or dark_forget for the
+        following measurements.
+        """
+        unknown = set(settings) - set(self._settings)
+        if unknown:
+            raise TypeError(f"Unknown spectrometer settings: {sorted(unknown)}")
+        self._settings.update(settings)
+        if self.measconfig is not None:
+            self.measconfig.m_IntegrationTime = self._settings["integration_time"]
+            self.measconfig.m_IntegrationDelay = self._settings["integration_delay"]
+            self.measconfig.m_NrAverages = self._settings["averages"]
+            self.measconfig.m_Trigger_m_Mode = self._settings["trigger_mode"]
+            self.measconfig.m_Trigger_m_Source = self._settings["trigger_source"]
+            self.measconfig.m_Smoothing_m_SmoothPix = self._settings["smooth_pixels"]
+            self.measconfig.m_CorDynDark_m_Enable = int(self._settings["dynamic_dark"])
+            self.measconfig.m_CorDynDark_m_ForgetPercentage = self._settings["dark_forget"]
+
+    def prepare(self):
+        """Sends the measurement configuration, e.g. before starting a SpectrumStream on the handle."""
+        if not self.is_open:
+            raise RuntimeError("Spectrometer session is not open")
+        with timing.span("prepare_measure"):
+            ret = AVS_PrepareMeasure(self.handle, self.measconfig)
+        if ret < 0:
+            raise RuntimeError(f"AVS_PrepareMeasure failed with error {ret}")
+
+    def start(self, n_scans=1):
+        """Prepares and starts a measurement without reading it, e.g. to arm for a hardware trigger."""
+        self.prepare()
+        with timing.span("measure"):
+            before = time.perf_counter()
+            ret = AVS_Measure(self.handle, 0, self._device_scans(n_scans))
+            after = time.perf_counter()
+        self._started = (before, after) if self._settings["trigger_mode"] == 0 else None
+        if ret < 0:
+            raise RuntimeError(f"AVS_Measure failed with error {ret}")
+
+    def measure(self, n_scans=1, out=None, timestamps=None, timeout=None):
+        """
+        Runs n_scans and reads them, see read_scans.
+
+        :return: (spectra, timestamps) of shapes (n_scans, pixels) and (n_scans,)
+        """
+        # checked before the device is started for nothing
+        if n_scans < 1:
+            raise ValueError(f"n_scans must be at least 1, got {n_scans}")
+        self.start(n_scans)
+        return self.read(n_scans, out, timestamps, timeout)
+
+    def _device_scans(self, n_scans):
+        return n_scans if self.host is None else n_scans * self.host.averages
+
+    def _waiter(self, timeout, margin=1e-3):
+        # a software-started scan cannot be ready before its integration (all
+        # averages of it) has ended, so sleep through most of that instead of
+        # polling; hardware-triggered ones are polled from the start
+        if self._started is None:
+            return lambda h: wait_for_scan(h, timeout)
+        settings = self._settings
+        period = settings["integration_time"] * max(1, settings["averages"]) / 1e3
+        due = [self._started[0] + period - margin]
+
+        def wait(handle):
+            remaining = due[0] - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            due[0] += period
+            wait_for_scan(handle, timeout)
+        return wait
+
+    def read(self, n_scans=1, out=None, timestamps=None, timeout=None):
+        """Reads n_scans of a measurement started with start()."""
+        if n_scans < 1:
+            raise ValueError(f"n_scans must be at least 1, got {n_scans}")
+        wait = self._waiter(timeout)
+        if self.host is None:
+            spectra, timestamps = read_scans(self.handle, n_scans, self.pixels, out, timestamps, wait=wait)
+            first = timestamps[0]
+        else:
+            # the device scans go to a scratch buffer, the host's results to out
+            device_scans = self._device_scans(n_scans)
+            if self._raw is None or len(self._raw[1]) < device_scans:
+                self._raw = allocate_scans(device_scans)
+            raw, raw_timestamps = read_scans(self.handle, device_scans, self.pixels, *self._raw, wait=wait)
+            first = raw_timestamps[0]
+            spectra, timestamps = self.host.process(raw, raw_timestamps, out, timestamps)
+        if self._started is not None:
+            before, after = self._started
+            self._started = None
+            self.add_anchor(first, (before + after) / 2, (after - before) / 2)
+        return spectra, timestamps
+
+    def add_anchor(self, timestamp, start_time, uncertainty=1e-6):
+        """
+        Anchors clock on a scan whose integration started at start_time
+        (time.perf_counter()), e.g. a hardware trigger edge. The device
+        stamps the end of the integration (of the last average), which is
+        what gets anchored. Averages done on the host are separate scans,
+        so only the device's count is included.
+        """
+        settings = self._settings
+        duration = settings["integration_time"] * max(1, settings["averages"]) / 1e3
+        self.clock.add_anchor(timestamp, start_time + duration, uncertainty)
+
+    def host_times(self, timestamps):
+        """time.perf_counter() at the end of each scan's integration, for AvaSpec timestamps."""
+        return self.clock.to_host(timestamps)
+
+    def measure_one(self, timeout=None):
+        """One scan as (timestamp, spectrum), the spectrum a (pixels,) array."""
+        spectra, timestamps = self.measure(1, timeout=timeout)
+        return int(timestamps[0]), spectra[0]
+
+    def close(self):
+        try:
+            if self.handle is not None:
+                AVS_StopMeasure(self.handle)
+                AVS_Deactivate(self.handle)
+        finally:
+            self.handle = None
+            if self._holds_library:
+                self._holds_library = False
+                _release_library()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_scans_to_buffer(handle, n_scans, buffer, wait=wait_for_scan):
+    """
+    Like read_scans, but writes into the slots of a SpectrumRingBuffer, so
+    memory stays fixed however many scans are read. The buffer must be
+    float64 with rows of at least MAX_PIXELS.
+
+    :return: (first_seq, stop_seq), the sequence numbers written
+    :raises RuntimeError: if the library fails to hand over a scan; the
+    scans before it stay committed
+    """
+    _check_direct_buffer(buffer)
+    timelabel = ctypes.c_uint32()
+    first_seq = buffer.next_seq
+    for _ in range(n_scans):
+        with timing.span("poll_complete"):
+            wait(handle)
+        seq, row = buffer.reserve()
+        with timing.span("get_scope_data"):
+            ret = AVS_GetScopeDataBuffer(handle, timelabel, row.ctypes.data)
+        if ret < 0:
+            # the slot stays uncommitted, and the next reserve() reuses it
+            raise RuntimeError(f"AVS_GetScopeData failed with error {ret}")
+        buffer.commit(seq, timelabel.value)
+    return first_seq, buffer.next_seq
+
+
+def _check_direct_buffer(buffer):
+    if buffer.spectra.dtype != np.float64 or buffer.spectra.shape[1] < MAX_PIXELS:
+        raise ValueError(f"spectrum buffer must be float64 with rows of at least {MAX_PIXELS} pixels")
+
+
+class SpectrumStream:
+    """
+    Continuous acquisition: starts an infinite (nummeas=-1), Dynamic
+    StoreToRam (nummeas=-2) or fixed-length measurement and drains scans on a
+    background thread as fast as the device produces them into a
+    SpectrumRingBuffer. Iterate over the stream to get (timestamp, spectrum)
+    pairs; iteration ends after stop() once all scans have been read.
+
+    Spectra are returned as views into the ring, valid until capacity newer
+    scans arrive; other readers (plotting, saving) can use stream.buffer
+    directly. When the iterator falls behind, the scans it never saw are
+    counted in overruns. Gaps in the device timestamps longer than
+    expected_period are counted in missed, which catches scans lost before
+    they reached the host.
+
+    AVS_PrepareMeasure must have been called.
+    """
+
+    def __init__(self, handle, pixels, capacity=256, nummeas=-1, expected_period=None, buffer=None):
+        """
+        :param handle: AvsHandle of the spectrometer
+        :param pixels: number of detector pixels, m_Detector_m_NrPixels
+        :param capacity: number of scans the ring holds
+        :param nummeas: passed to AVS_Measure; -1 infinite, -2 Dynamic
+        StoreToRam, or a positive scan count
+        :param expected_period: seconds between scans (integration time plus
+        delay), used for missed-scan detection; None disables it
+        :param buffer: optional SpectrumRingBuffer to fill instead of a new one
+        """
+        self.handle = handle
+        self.pixels = pixels
+        self.nummeas = nummeas
+        self.expected_ticks = None if expected_period is None else expected_period * 100_000
+
+        if buffer is None:
+            buffer = SpectrumRingBuffer(capacity, pixels, width=MAX_PIXELS)
+        _check_direct_buffer(buffer)
+        self.buffer = buffer
+        self._read_seq = buffer.next_seq
+        self._running = False
+        self._thread = None
+        self._error = None
+        self._last_timestamp = None
+
+        self.received = 0
+        self.overruns = 0
+        self.missed = 0
+
+    def start(self):
+        ret = AVS_Measure(self.handle, 0, self.nummeas)
+        if ret < 0:
+            raise RuntimeError(f"AVS_Measure failed with error {ret}")
+        self._running = True
+        self._thread = threading.Thread(target=self._drain, name=f"avs-stream-{self.handle}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        AVS_StopMeasure(self.handle)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def error(self):
+        """The exception that stopped the drain thread, if any."""
+        return self._error
+
+    def stats(self):
+        return {"received": self.received, "overruns": self.overruns, "missed": self.missed,
+                "backlog": min(self.buffer.next_seq - self._read_seq, self.buffer.capacity)}
+
+    def _drain(self):
+        timelabel = ctypes.c_uint32()
+        try:
+            while self._running and (self.nummeas < 0 or self.received < self.nummeas):
+                try:
+                    wait_for_scan(self.handle, timeout=0.1)
+                except TimeoutError:
+                    continue
+
+                seq, row = self.buffer.reserve()
+                with timing.span("get_scope_data"):
+                    ret = AVS_GetScopeDataBuffer(self.handle, timelabel, row.ctypes.data)
+                if ret < 0:
+                    # stops the stream; read() raises it
+                    raise RuntimeError(f"AVS_GetScopeData failed with error {ret}")
+                timestamp = timelabel.value
+
+                if self.expected_ticks and self._last_timestamp is not None:
+                    gap = (timestamp - self._last_timestamp) & 0xFFFFFFFF
+                    self.missed += max(0, round(gap / self.expected_ticks) - 1)
+                self._last_timestamp = timestamp
+                self.received += 1
+                self.buffer.commit(seq, timestamp)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._running = False
+            self.buffer.notify_all()
+
+    def read(self, timeout=None, copy=False):
+        """
+        Returns the oldest unread (timestamp, spectrum) pair, or None if the
+        stream has stopped and everything has been read. The spectrum is a
+        view into the ring unless copy is set. Raises TimeoutError if nothing
+        arrives within timeout seconds.
+        """
+        while True:
+            if not self.buffer.wait_for(self._read_seq, timeout, abort=lambda: not self._running):
+                raise TimeoutError(f"No scan from spectrometer {self.handle} within {timeout} s")
+            if self._error is not None:
+                raise self._error
+            if self._read_seq >= self.buffer.next_seq:
+                return None
+
+            oldest = self.buffer.oldest_seq
+            if self._read_seq < oldest:
+                self.overruns += oldest - self._read_seq
+                self._read_seq = oldest
+            seq = self._read_seq
+            self._read_seq += 1
+            scan = self.buffer.get(seq)
+            if scan is None:
+                # overwritten between the checks above
+                self.overruns += 1
+                continue
+            if copy:
+                timestamp, spectrum = scan
+                spectrum = spectrum.copy()
+                if not self.buffer.valid(seq):
+                    self.overruns += 1
+                    continue
+                return timestamp, spectrum
+            return scan
+
+    def __iter__(self):
+        while True:
+            scan = self.read()
+            if scan is None:
+                return
+            yield scan
@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+
+'''
+Fixed-capacity ring buffer for spectra
+'''
+
+
+class SpectrumRingBuffer:
+    """
+    Preallocated ring of spectra with timestamp and sequence columns.
+
+    Every write gets the next sequence number; slot = sequence % capacity.
+    The producer writes into the slot in place (see reserve/commit), and
+    readers take views of the arrays without copying. Memory use is fixed at
+    construction, however long the capture runs.
+
+    One producer, any number of readers. A view stays valid until capacity
+    newer scans have been written; check with valid(seq) after using it if
+    the producer may have lapped the reader.
+    """
+
+    def __init__(self, capacity, pixels, dtype=np.float64, width=None):
+        """
+        :param capacity: number of spectra held
+        :param pixels: detector pixels; views are trimmed to this length
+        :param dtype: storage type, float64, or uint16 for raw counts at a
+        quarter of the memory
+        :param width: allocated row length, at least pixels. Use MAX_PIXELS
+        when the AvaSpec library writes into the rows directly.
+        """
+        width = width or pixels
+        if width < pixels:
+            raise ValueError(f"row width {width} is smaller than {pixels} pixels")
+        self.capacity = capacity
+        self.pixels = pixels
+        self.spectra = np.zeros((capacity, width), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.uint32)
+        self.sequence = np.full(capacity, -1, dtype=np.int64)
+        self.next_seq = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return min(self.next_seq, self.capacity)
+
+    @property
+    def oldest_seq(self):
+        return max(0, self.next_seq - self.capacity)
+
+    # === Producer ===
+
+    def reserve(self):
+        """
+        Claims the next slot for writing and returns (seq, row), where row is
+        the full-width view of the slot. The slot is marked invalid until
+        commit(seq, timestamp) is called.
+        """
+        with self._cond:
+            seq = self.next_seq
+            slot = seq % self.capacity
+            self.sequence[slot] = -1
+        return seq, self.spectra[slot]
+
+    def commit(self, seq, timestamp):
+        slot = seq % self.capacity
+        with self._cond:
+            self.timestamps[slot] = timestamp
+            self.sequence[slot] = seq
+            self.next_seq = seq + 1
+            self._cond.notify_all()
+
+    def write(self, spectrum, timestamp):
+        """Copies one spectrum into the next slot, casting to the storage dtype."""
+        seq, row = self.reserve()
+        np.copyto(row[:len(spectrum)], spectrum, casting="unsafe")
+        self.commit(seq, timestamp)
+        return seq
+
+    # === Readers ===
+
+    def valid(self, seq):
+        """True while the scan with this sequence number is still in the buffer."""
+        return self.sequence[seq % self.capacity] == seq
+
+    def get(self, seq):
+        """
+        Returns (timestamp, spectrum view) for a sequence number, or None if it
+        has been overwritten or not written yet.
+        """
+        slot = seq % self.capacity
+        if self.sequence[slot] != seq:
+            return None
+        return int(self.timestamps[slot]), self.spectra[slot, :self.pixels]
+
+    def latest(self):
+        """Returns (seq, timestamp, spectrum view) of the newest scan, or None."""
+        with self._cond:
+            seq = self.next_seq - 1
+        if seq < 0:
+            return None
+        scan = self.get(seq)
+        if scan is None:
+            return None
+        return (seq,) + scan
+
+    def segments(self, start_seq, stop_seq=None):
+        """
+        Returns the scans with sequence numbers in [start_seq, stop_seq) that
+        are still buffered, as at most two contiguous pieces (two when the
+        range wraps around the end of the ring). Each piece is a
+        (spectra, timestamps, sequence) tuple of views.
+        """
+        with self._cond:
+            if stop_seq is None or stop_seq > self.next_seq:
+                stop_seq = self.next_seq
+            start_seq = max(start_seq, self.next_seq - self.capacity)
+        if start_seq >= stop_seq:
+            return []
+        pieces = []
+        seq = start_seq
+        while seq < stop_seq:
+            slot = seq % self.capacity
+            end = min(slot + stop_seq - seq, self.capacity)
+            pieces.append((self.spectra[slot:end, :self.pixels],
+                           self.timestamps[slot:end],
+                           self.sequence[slot:end]))
+            seq += end - slot
+        return pieces
+
+    def wait_for(self, seq, timeout=None, abort=None):
+        """
+        Blocks until scan seq has been written or abort() returns true (it is
+        re-checked on every commit and notify_all). Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.next_seq > seq or (abort is not None and abort()), timeout)
+
+    def notify_all(self):
+        """Wakes waiting readers, e.g. when the producer stops."""
+        with self._cond:
+            self._cond.notify_all()
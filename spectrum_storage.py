@@ -0,0 +1,359 @@
+import abc
+import csv
+import json
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:  # HDF5 output is optional, NPZ always works
+    h5py = None
+
+'''
+Binary spectrum storage: many spectra per file, wavelength axis stored once
+'''
+
+
+class SpectrumWriter(abc.ABC):
+    """
+    Appends spectra to a single file. Spectra are collected into chunks of
+    chunk_size rows in a preallocated block and written a chunk at a time.
+
+    Per spectrum the file holds the intensities (one row of the 2-D
+    "spectra" array), the device timestamp in 10 us ticks, the host time
+    (seconds since the epoch) and any extra float columns named at open.
+    The wavelength axis and the metadata dict are stored once.
+    """
+
+    def __init__(self, path, wavelengths, metadata=None, columns=(), chunk_size=256, dtype=np.float64):
+        self.path = path
+        self.wavelengths = np.array(wavelengths, dtype=np.float64)
+        self.pixels = len(self.wavelengths)
+        self.metadata = dict(metadata or {})
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+
+        self._spectra = np.empty((chunk_size, self.pixels), dtype=self.dtype)
+        self._timestamps = np.empty(chunk_size, dtype=np.uint32)
+        self._host_time = np.empty(chunk_size, dtype=np.float64)
+        self._columns = {name: np.empty(chunk_size, dtype=np.float64) for name in self.columns}
+        self._pending = 0
+        self._open()
+
+    def append(self, spectrum, timestamp=0, host_time=None, **columns):
+        """
+        Adds one spectrum. spectrum may be a NumPy array or the ctypes array
+        from AVS_GetScopeData; it is trimmed to the wavelength axis length.
+        """
+        row = self._pending
+        self._spectra[row] = np.asarray(spectrum)[:self.pixels]
+        self._timestamps[row] = timestamp
+        self._host_time[row] = time.time() if host_time is None else host_time
+        for name in self.columns:
+            self._columns[name][row] = columns.get(name, np.nan)
+        self._pending += 1
+        self.count += 1
+        if self._pending == self.chunk_size:
+            self.flush()
+
+    def append_many(self, spectra, timestamps, host_times=None, **columns):
+        """Adds an (n, >= pixels) block of spectra with their per-row columns."""
+        spectra = np.asarray(spectra)
+        n = len(spectra)
+        if host_times is None:
+            host_times = np.full(n, time.time())
+        start = 0
+        while start < n:
+            row = self._pending
+            take = min(self.chunk_size - row, n - start)
+            stop = start + take
+            self._spectra[row:row + take] = spectra[start:stop, :self.pixels]
+            self._timestamps[row:row + take] = timestamps[start:stop]
+            self._host_time[row:row + take] = host_times[start:stop]
+            for name in self.columns:
+                self._columns[name][row:row + take] = columns[name][start:stop] if name in columns else np.nan
+            self._pending += take
+            self.count += take
+            start = stop
+            if self._pending == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self._pending:
+            n = self._pending
+            self._write_chunk(self._spectra[:n], self._timestamps[:n], self._host_time[:n],
+                              {name: values[:n] for name, values in self._columns.items()})
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abc.abstractmethod
+    def _open(self):
+        """Create the file and write the wavelength axis and metadata"""
+
+    @abc.abstractmethod
+    def _write_chunk(self, spectra, timestamps, host_time, columns):
+        """Append one chunk of rows to the open file"""
+
+    def _close(self):
+        pass
+
+
+class HDF5SpectrumWriter(SpectrumWriter):
+    """
+    HDF5 file with resizable, chunked datasets: wavelengths (pixels,),
+    spectra (n, pixels), timestamps (n,), host_time (n,) and one dataset per
+    extra column. Metadata goes into the file attributes. Needs h5py.
+    """
+
+    def _open(self):
+        if h5py is None:
+            raise RuntimeError("h5py is not installed; use a .npz path or install h5py")
+        self._file = h5py.File(self.path, "w")
+        self._file.create_dataset("wavelengths", data=self.wavelengths)
+        self._file.create_dataset("spectra", shape=(0, self.pixels), maxshape=(None, self.pixels),
+                                  chunks=(self.chunk_size, self.pixels), dtype=self.dtype)
+        for name, dtype in [("timestamps", np.uint32), ("host_time", np.float64)] + \
+                           [(name, np.float64) for name in self.columns]:
+            self._file.create_dataset(name, shape=(0,), maxshape=(None,), chunks=(self.chunk_size,), dtype=dtype)
+        self._file.attrs["columns"] = json.dumps(list(self.columns))
+        self._file.attrs["metadata"] = json.dumps(self.metadata)
+
+    def _write_chunk(self, spectra, timestamps, host_time, columns):
+        start = self._file["spectra"].shape[0]
+        stop = start + len(spectra)
+        for name, values in [("spectra", spectra), ("timestamps", timestamps), ("host_time", host_time)] + \
+                            list(columns.items()):
+            dataset = self._file[name]
+            dataset.resize(stop, axis=0)
+            dataset[start:stop] = values
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class NpzSpectrumWriter(SpectrumWriter):
+    """
+    NumPy .npz archive that is appended to one chunk at a time: every flush
+    adds spectra_NNNNN.npy, timestamps_NNNNN.npy, ... members to the zip.
+    load_spectra joins the chunks back together. Needs only NumPy.
+    """
+
+    def _open(self):
+        self._chunks = 0
+        with zipfile.ZipFile(self.path, "w") as archive:
+            self._write_member(archive, "wavelengths", self.wavelengths)
+            archive.writestr("metadata.json", json.dumps({"metadata": self.metadata, "columns": list(self.columns)}))
+
+    def _write_chunk(self, spectra, timestamps, host_time, columns):
+        with zipfile.ZipFile(self.path, "a") as archive:
+            # zero-padded for readable listings; past 99999 it just gets longer,
+            # load_spectra orders the chunks by number, not by name
+            suffix = f"_{self._chunks:05d}"
+            self._write_member(archive, "spectra" + suffix, spectra)
+            self._write_member(archive, "timestamps" + suffix, timestamps)
+            self._write_member(archive, "host_time" + suffix, host_time)
+            for name, values in columns.items():
+                self._write_member(archive, name + suffix, values)
+        self._chunks += 1
+
+    @staticmethod
+    def _write_member(archive, name, array):
+        with archive.open(name + ".npy", "w", force_zip64=True) as member:
+            np.lib.format.write_array(member, np.ascontiguousarray(array), allow_pickle=False)
+
+
+WRITERS = {".h5": HDF5SpectrumWriter, ".hdf5": HDF5SpectrumWriter, ".npz": NpzSpectrumWriter}
+
+
+def default_spectrum_path(prefix="spectra"):
+    """Timestamped file name, HDF5 when h5py is available, otherwise NPZ."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{prefix}_{timestamp}{'.h5' if h5py is not None else '.npz'}"
+
+
+def open_spectrum_writer(path, wavelengths, **kwargs):
+    """
+    Opens a SpectrumWriter for path, choosing the backend from the extension
+    (.h5/.hdf5 or .npz). kwargs are passed to SpectrumWriter.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported spectrum file type '{extension}', use one of {sorted(WRITERS)}")
+    return WRITERS[extension](path, wavelengths, **kwargs)
+
+
+def load_spectra(path):
+    """
+    Reads a file written by a SpectrumWriter.
+
+    :return: dict with wavelengths, spectra, timestamps, host_time, metadata
+    and columns (dict of the extra per-spectrum columns)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if WRITERS.get(extension) is HDF5SpectrumWriter:
+        if h5py is None:
+            raise RuntimeError("h5py is not installed")
+        with h5py.File(path, "r") as f:
+            names = json.loads(f.attrs["columns"])
+            return {
+                "wavelengths": f["wavelengths"][:],
+                "spectra": f["spectra"][:],
+                "timestamps": f["timestamps"][:],
+                "host_time": f["host_time"][:],
+                "metadata": json.loads(f.attrs["metadata"]),
+                "columns": {name: f[name][:] for name in names},
+            }
+
+    with zipfile.ZipFile(path) as archive:
+        header = json.loads(archive.read("metadata.json"))
+    with np.load(path) as data:
+        def joined(name, empty_shape, dtype):
+            # members <name>_<chunk number>, in chunk order
+            prefix = name + "_"
+            chunks = sorted((int(key[len(prefix):]), key) for key in data.files
+                            if key.startswith(prefix) and key[len(prefix):].isdigit())
+            if not chunks:
+                return np.empty(empty_shape, dtype=dtype)
+            return np.concatenate([data[key] for _, key in chunks])
+        wavelengths = data["wavelengths"]
+        return {
+            "wavelengths": wavelengths,
+            "spectra": joined("spectra", (0, len(wavelengths)), np.float64),
+            "timestamps": joined("timestamps", (0,), np.uint32),
+            "host_time": joined("host_time", (0,), np.float64),
+            "metadata": header["metadata"],
+            "columns": {name: joined(name, (0,), np.float64) for name in header["columns"]},
+        }
+
+
+def export_csv(path, out_dir=".", prefix="spectrum"):
+    """
+    Compatibility export: writes every spectrum in a binary file as its own
+    two-column CSV, the same layout DataSaver.save_spectrum used to produce.
+    The index is appended to the timestamped name so fast captures within
+    one second do not collide.
+
+    :return: list of CSV paths
+    """
+    data = load_spectra(path)
+    paths = []
+    for i, (spectrum, host_time) in enumerate(zip(data["spectra"], data["host_time"])):
+        timestamp = datetime.fromtimestamp(host_time).strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join(out_dir, f"{prefix}_{timestamp}_{i:05d}.csv")
+        with open(filename, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Wavelength (nm)", "Intensity"])
+            writer.writerows(zip(data["wavelengths"].tolist(), spectrum.tolist()))
+        paths.append(filename)
+    return paths
+
+
+class DataSaver:
+    """
+    Saves spectra from the GUI scripts. Every spectrum is appended to one
+    binary file per session instead of a new CSV per shot. Spectra are
+    written a chunk at a time, and a partial chunk once flush_interval has
+    passed since the last write, so a crash loses at most the spectra of the
+    last few seconds; close() writes the rest. A new file is started if the
+    wavelength axis changes (e.g. another spectrometer), named after the
+    first one with a _001, _002, ... suffix; existing files are never
+    overwritten except a path given explicitly, for the first file.
+
+    Safe to use from several threads, e.g. the workers of a
+    WriteBehindQueue; saves are appended one at a time.
+    """
+
+    def __init__(self, path=None, prefix="spectra", metadata=None, columns=(), chunk_size=16,
+                 flush_interval=2.0):
+        """
+        :param path: file of the first wavelength axis; timestamped by default
+        :param columns: names of extra float columns saved with each
+        spectrum, e.g. ("trigger_time",)
+        :param chunk_size: spectra written to the file at a time
+        :param flush_interval: seconds after which a save also writes a
+        partial chunk; None only writes full chunks
+        """
+        self.path = path
+        self._first_path = None
+        self.prefix = prefix
+        self.metadata = metadata
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.writer = None
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def save_spectrum(self, wavelengths, intensities, timestamp=0, host_time=None, **columns):
+        """
+        :param wavelengths: wavelength axis, trimmed to the detector pixels
+        :param intensities: spectrum, at least len(wavelengths) values
+        :param timestamp: device timestamp from AVS_GetScopeData
+        :param host_time: time.time() of the scan, e.g. from its timestamp
+        through a ClockSync; now by default
+        :param columns: values for the extra columns, NaN when left out
+        :return: path of the file the spectrum was appended to
+        """
+        wavelengths = np.asarray(wavelengths)
+        with self._lock:
+            if self.writer is not None and not np.array_equal(self.writer.wavelengths, wavelengths):
+                self._close()
+            if self.writer is None:
+                self.path = self._next_path()
+                self.writer = open_spectrum_writer(self.path, wavelengths, metadata=self.metadata,
+                                                   columns=self.columns, chunk_size=self.chunk_size)
+                self._flushed = time.monotonic()
+            # the writer writes full chunks itself
+            self.writer.append(intensities, timestamp, host_time, **columns)
+            if self.flush_interval is not None and time.monotonic() - self._flushed >= self.flush_interval:
+                self._flush()
+            return self.path
+
+    def _next_path(self):
+        # the first file keeps the given name; later ones, and a default name
+        # already taken (it only changes once a second), count on from it
+        if self._first_path is None:
+            self._first_path = self.path or default_spectrum_path(self.prefix)
+            if self.path is not None or not os.path.exists(self._first_path):
+                return self._first_path
+        root, extension = os.path.splitext(self._first_path)
+        n = 1
+        while os.path.exists(f"{root}_{n:03d}{extension}"):
+            n += 1
+        return f"{root}_{n:03d}{extension}"
+
+    def flush(self):
+        """Writes the spectra collected so far to the file."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
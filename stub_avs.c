@@ -0,0 +1,410 @@
+/*
+ * Minimal stand-in for the AvaSpec library, used by the benchmarks and by
+ * ACQ_SIMULATE (see simulation.py) so the Python side of avaspec.py can be
+ * run and timed without a spectrometer attached. Scans become ready one
+ * integration time apart after AVS_Measure, like a free-running device, and
+ * hold a synthetic spectrum: a dark level, a broad continuum and a few
+ * emission lines growing with the integration time, plus a little noise.
+ * Initialisation and the configuration transfer take rough USB-like times
+ * (STUB_*_MS below) so session setup costs show up in the benchmarks;
+ * AVS_STUB_TRANSFER_MS and AVS_STUB_READOUT_MS in the environment override
+ * the per-scan ones.
+ *
+ * AVS_STUB_DEVICES in the environment sets the number of attached devices
+ * (default 1, at most STUB_MAX_DEVICES). Each covers its own, overlapping
+ * wavelength band. With AVS_SetSyncMode on a master, devices prepared for a
+ * hardware trigger from the sync input (m_Trigger_m_Source 1) wait after
+ * AVS_Measure until the master starts and then scan at the master's period.
+ * Devices prepared for an external hardware trigger (m_Trigger_m_Mode 1,
+ * m_Trigger_m_Source 0) likewise wait after AVS_Measure, until
+ * AVS_STUB_ExternalTrigger reports an edge on the trigger input; the
+ * measurement starts at the edge and further scans follow at the
+ * integration period. simulation.py calls it for edges on a fake_ljm line.
+ *
+ * Timestamps come from a tick counter with its own origin and a rate error
+ * of STUB_CLOCK_PPM (AVS_STUB_CLOCK_PPM overrides it), as from a device
+ * crystal, so host-time mapping has an offset and a drift to find.
+ *
+ * m_NrAverages scans are averaged on the device: a result takes that many
+ * integration times and is read out in one transfer, with the noise down by
+ * the square root of the count. m_Smoothing_m_SmoothPix applies a moving
+ * average over that many pixels either side, fewer at the detector ends.
+ * The simulated detector has no dark pixels, so dynamic dark correction is
+ * rejected with ERR_INVALID_MEASPARAM_DYNDARK, as on a detector that lacks
+ * them.
+ */
+#include <math.h>
+#include <pthread.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#define STUB_PIXELS 2048
+#define STUB_CONFIG_SIZE 63484
+#define STUB_NRPIXELS_OFFSET 69 /* m_Len, m_ConfigVersion, m_aUserFriendlyId, m_SensorType */
+#define STUB_TRANSFER_MS 0.6 /* detector readout and USB transfer after integration */
+#define STUB_INIT_MS 50.0     /* AVS_Init: USB enumeration */
+#define STUB_ACTIVATE_MS 20.0 /* AVS_Activate: open the device, read calibration */
+#define STUB_PARAM_MS 15.0    /* AVS_GetParameter/AVS_SetParameter: 63 KB transfer */
+#define STUB_COMMAND_MS 0.5   /* AVS_PrepareMeasure: one USB command round trip */
+#define STUB_READOUT_MS 0.3   /* AVS_GetScopeData: spectrum upload, blocks the caller */
+#define STUB_MAX_DEVICES 8
+#define STUB_BAND_STEP_NM 900.0 /* start of each device's band; 1024 nm wide, so neighbours overlap */
+#define STUB_DARK_COUNTS 1000.0
+#define STUB_MAX_COUNTS 65535.0
+#define STUB_CLOCK_PPM 30.0   /* rate error of the device's tick counter against the host clock */
+#define STUB_ERR_DYNDARK -116 /* ERR_INVALID_MEASPARAM_DYNDARK */
+
+struct stub_device {
+    uint32_t ticks;
+    double inttime_ms;
+    uint32_t averages;  /* m_NrAverages: scans averaged into each result */
+    int smooth_pix;     /* m_Smoothing_m_SmoothPix */
+    double period_ms;   /* between result starts: inttime * averages, or the master's when synced */
+    double start_ms;    /* 0 until AVS_Measure, so scans are always ready */
+    int scans_read;
+    bool sync_input;    /* prepared for a hardware trigger from the sync input */
+    bool external_input; /* prepared for a hardware trigger on the trigger input */
+    bool waiting;       /* armed by AVS_Measure, waiting for the sync master or a trigger edge */
+    bool sync_master;
+    uint32_t noise;     /* state of the noise generator */
+    float signal[STUB_PIXELS]; /* counts per ms of integration */
+};
+
+static unsigned char g_config[STUB_CONFIG_SIZE];
+static struct stub_device g_devices[STUB_MAX_DEVICES];
+static int g_nr_devices = 1;
+static double g_transfer_ms = STUB_TRANSFER_MS;
+static double g_readout_ms = STUB_READOUT_MS;
+static double g_clock_origin_ms = 0.0; /* host time at which the tick counter was 0 */
+static double g_clock_ppm = STUB_CLOCK_PPM;
+
+/* emission lines (nm) of a Hg-Ar calibration lamp */
+static const double g_lines_nm[] = {404.7, 435.8, 546.1, 577.0, 696.5, 763.5, 811.5, 912.3, 1013.9, 1529.6, 1694.0};
+
+typedef void (*measure_callback)(int *handle, int *result);
+static measure_callback g_callback = NULL;
+static int g_callback_handle = 0;
+static int g_callback_nummeas = 0;
+
+static double now_ms(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1e3 + ts.tv_nsec / 1e6;
+}
+
+static void sleep_ms(double ms)
+{
+    struct timespec ts;
+    if (ms <= 0)
+        return;
+    ts.tv_sec = (time_t)(ms / 1e3);
+    ts.tv_nsec = (long)((ms - ts.tv_sec * 1e3) * 1e6);
+    nanosleep(&ts, NULL);
+}
+
+static double env_ms(const char *name, double fallback)
+{
+    const char *value = getenv(name);
+    return value ? atof(value) : fallback;
+}
+
+static double pixel_nm(int handle, int i)
+{
+    return 200.0 + STUB_BAND_STEP_NM * (handle - 1) + 0.5 * i;
+}
+
+static void fill_signal(struct stub_device *dev, int handle)
+{
+    for (int i = 0; i < STUB_PIXELS; i++) {
+        double nm = pixel_nm(handle, i);
+        double x = (nm - 900.0) / 450.0;
+        double counts = 20.0 * exp(-x * x);
+        for (size_t l = 0; l < sizeof(g_lines_nm) / sizeof(g_lines_nm[0]); l++) {
+            double d = (nm - g_lines_nm[l]) / 1.2;
+            counts += 400.0 * exp(-d * d);
+        }
+        dev->signal[i] = (float)counts;
+    }
+    dev->noise = 12345u + handle;
+}
+
+static struct stub_device *device(int handle)
+{
+    if (handle < 1 || handle > g_nr_devices)
+        return NULL;
+    return &g_devices[handle - 1];
+}
+
+/* the device's free-running 10 us tick counter at host time ms; it starts
+ * with the first AVS_Init, runs g_clock_ppm fast and wraps at 2^32 */
+static uint32_t device_ticks(double ms)
+{
+    return (uint32_t)(uint64_t)((ms - g_clock_origin_ms) * 100.0 * (1.0 + g_clock_ppm * 1e-6));
+}
+
+/* one result: an integration per average */
+static double result_ms(const struct stub_device *dev)
+{
+    return dev->inttime_ms * dev->averages;
+}
+
+/* when scan n (counting from 0) is in the device's memory */
+static double scan_done_ms(const struct stub_device *dev, int n)
+{
+    return dev->start_ms + n * dev->period_ms + result_ms(dev);
+}
+
+/* moving average over smooth_pix pixels either side, as the library does */
+static void smooth(double *spectrum, int smooth_pix)
+{
+    double sums[STUB_PIXELS + 1];
+    sums[0] = 0.0;
+    for (int i = 0; i < STUB_PIXELS; i++)
+        sums[i + 1] = sums[i] + spectrum[i];
+    for (int i = 0; i < STUB_PIXELS; i++) {
+        int lo = i - smooth_pix < 0 ? 0 : i - smooth_pix;
+        int hi = i + smooth_pix + 1 > STUB_PIXELS ? STUB_PIXELS : i + smooth_pix + 1;
+        spectrum[i] = (sums[hi] - sums[lo]) / (hi - lo);
+    }
+}
+
+static void *callback_thread(void *arg)
+{
+    struct stub_device *dev = device(g_callback_handle);
+    for (int i = 0; i < g_callback_nummeas; i++) {
+        int result = 0;
+        sleep_ms(scan_done_ms(dev, i) + g_transfer_ms - now_ms());
+        g_callback(&g_callback_handle, &result);
+    }
+    return NULL;
+}
+
+int AVS_Init(int port)
+{
+    uint16_t len = STUB_CONFIG_SIZE;
+    uint16_t pixels = STUB_PIXELS;
+    const char *devices = getenv("AVS_STUB_DEVICES");
+    sleep_ms(STUB_INIT_MS);
+    memset(g_config, 0, sizeof(g_config));
+    memcpy(&g_config[0], &len, sizeof(len));
+    memcpy(&g_config[STUB_NRPIXELS_OFFSET], &pixels, sizeof(pixels));
+    g_transfer_ms = env_ms("AVS_STUB_TRANSFER_MS", STUB_TRANSFER_MS);
+    g_readout_ms = env_ms("AVS_STUB_READOUT_MS", STUB_READOUT_MS);
+    g_clock_ppm = env_ms("AVS_STUB_CLOCK_PPM", STUB_CLOCK_PPM);
+    if (g_clock_origin_ms == 0.0)
+        g_clock_origin_ms = now_ms();
+    g_nr_devices = devices ? atoi(devices) : 1;
+    if (g_nr_devices < 1 || g_nr_devices > STUB_MAX_DEVICES)
+        g_nr_devices = 1;
+    memset(g_devices, 0, sizeof(g_devices));
+    for (int i = 0; i < g_nr_devices; i++) {
+        g_devices[i].inttime_ms = g_devices[i].period_ms = 1.0;
+        g_devices[i].averages = 1;
+        fill_signal(&g_devices[i], i + 1);
+    }
+    return g_nr_devices;
+}
+
+int AVS_Done(void) { return 0; }
+int AVS_GetNrOfDevices(void) { return g_nr_devices; }
+int AVS_UpdateUSBDevices(void) { return g_nr_devices; }
+
+int AVS_GetList(int listsize, int *requiredsize, unsigned char *idlist)
+{
+    *requiredsize = 75 * g_nr_devices;
+    if (listsize < *requiredsize)
+        return -9; /* ERR_INVALID_SIZE */
+    memset(idlist, 0, *requiredsize);
+    for (int i = 0; i < g_nr_devices; i++) {
+        unsigned char *id = idlist + 75 * i;
+        memcpy(id, "STUB00000", 9);
+        id[9] = '1' + i;
+        id[74] = 1; /* USB_AVAILABLE */
+    }
+    return g_nr_devices;
+}
+
+int AVS_Activate(const char *deviceid)
+{
+    int handle = deviceid[9] - '0'; /* STUB00000<n> */
+    sleep_ms(STUB_ACTIVATE_MS);
+    return device(handle) ? handle : -5; /* ERR_DEVICE_NOT_FOUND */
+}
+
+int AVS_GetHandleFromSerial(const char *serial)
+{
+    int handle = serial[9] - '0';
+    return device(handle) ? handle : -5;
+}
+
+bool AVS_Deactivate(int handle) { return device(handle) != NULL; }
+int AVS_UseHighResAdc(int handle, bool enable) { return 0; }
+
+int AVS_SetSyncMode(int handle, bool enable)
+{
+    struct stub_device *dev = device(handle);
+    if (!dev)
+        return -4; /* ERR_INVALID_DEVICE_ID */
+    dev->sync_master = enable;
+    return 0;
+}
+
+int AVS_PrepareMeasure(int handle, const unsigned char *measconf)
+{
+    struct stub_device *dev = device(handle);
+    float inttime;
+    uint32_t averages;
+    uint16_t smooth_pix;
+    if (!dev)
+        return -4;
+    sleep_ms(STUB_COMMAND_MS);
+    if (measconf[16]) /* m_CorDynDark_m_Enable */
+        return STUB_ERR_DYNDARK;
+    memcpy(&inttime, measconf + 4, sizeof(inttime)); /* m_IntegrationTime */
+    memcpy(&averages, measconf + 12, sizeof(averages)); /* m_NrAverages */
+    memcpy(&smooth_pix, measconf + 18, sizeof(smooth_pix)); /* m_Smoothing_m_SmoothPix */
+    dev->inttime_ms = inttime;
+    dev->averages = averages ? averages : 1;
+    dev->smooth_pix = smooth_pix;
+    dev->period_ms = result_ms(dev);
+    dev->sync_input = measconf[22] == 1 && measconf[23] == 1; /* m_Trigger_m_Mode, m_Trigger_m_Source */
+    dev->external_input = measconf[22] == 1 && measconf[23] == 0;
+    return 0;
+}
+
+/* starts the scans of dev at start_ms and, from a sync master, those of every armed slave */
+static void start_scans(struct stub_device *dev, double start_ms)
+{
+    dev->waiting = false;
+    dev->start_ms = start_ms;
+    dev->period_ms = result_ms(dev);
+    if (dev->sync_master) {
+        /* the master's sync output starts every armed slave at its own pace */
+        for (int i = 0; i < g_nr_devices; i++) {
+            struct stub_device *slave = &g_devices[i];
+            if (slave->waiting && slave->sync_input) {
+                slave->waiting = false;
+                slave->start_ms = dev->start_ms;
+                slave->period_ms = dev->period_ms;
+            }
+        }
+    }
+}
+
+int AVS_Measure(int handle, int windowhandle, uint16_t nummeas)
+{
+    struct stub_device *dev = device(handle);
+    if (!dev)
+        return -4;
+    dev->scans_read = 0;
+    if (dev->external_input || (dev->sync_input && !dev->sync_master)) {
+        dev->waiting = true;
+        return 0;
+    }
+    start_scans(dev, now_ms());
+    return 0;
+}
+
+/*
+ * Not part of the AvaSpec API: a rising edge on the trigger input of every
+ * device, at host_ms on CLOCK_MONOTONIC (time.perf_counter() on Linux).
+ * Devices armed for an external trigger start measuring; the others ignore
+ * it, as a device that is not armed does.
+ */
+void AVS_STUB_ExternalTrigger(double host_ms)
+{
+    for (int i = 0; i < g_nr_devices; i++) {
+        struct stub_device *dev = &g_devices[i];
+        if (dev->waiting && dev->external_input)
+            start_scans(dev, host_ms);
+    }
+}
+
+int AVS_MeasureCallback(int handle, measure_callback callback, uint16_t nummeas)
+{
+    pthread_t thread;
+    AVS_Measure(handle, 0, nummeas);
+    g_callback = callback;
+    g_callback_handle = handle;
+    g_callback_nummeas = nummeas;
+    if (pthread_create(&thread, NULL, callback_thread, NULL) != 0)
+        return -1;
+    pthread_detach(thread);
+    return 0;
+}
+
+int AVS_StopMeasure(int handle)
+{
+    struct stub_device *dev = device(handle);
+    if (dev)
+        dev->waiting = false;
+    return 0;
+}
+
+bool AVS_PollScan(int handle)
+{
+    struct stub_device *dev = device(handle);
+    if (!dev || dev->waiting)
+        return false;
+    return now_ms() >= scan_done_ms(dev, dev->scans_read) + g_transfer_ms;
+}
+
+int AVS_GetScopeData(int handle, uint32_t *timelabel, double *spectrum)
+{
+    struct stub_device *dev = device(handle);
+    double noise_scale;
+    if (!dev)
+        return -4;
+    sleep_ms(g_readout_ms);
+    /* 10 us ticks at the end of the integration (of the last average) */
+    *timelabel = device_ticks(scan_done_ms(dev, dev->scans_read));
+    dev->scans_read++;
+    dev->ticks++;
+    noise_scale = 1.0 / sqrt((double)dev->averages);
+    for (int i = 0; i < STUB_PIXELS; i++) {
+        double counts = STUB_DARK_COUNTS + dev->signal[i] * dev->inttime_ms;
+        dev->noise = dev->noise * 1664525u + 1013904223u;
+        if (dev->averages == 1)
+            counts = floor(counts + (double)(dev->noise >> 26) - 32.0); /* +-32 counts */
+        else
+            counts += ((double)(dev->noise >> 26) - 31.5) * noise_scale;
+        spectrum[i] = counts < STUB_MAX_COUNTS ? counts : STUB_MAX_COUNTS;
+    }
+    if (dev->smooth_pix > 0)
+        smooth(spectrum, dev->smooth_pix);
+    return 0;
+}
+
+int AVS_GetLambda(int handle, double *wavelength)
+{
+    for (int i = 0; i < STUB_PIXELS; i++)
+        wavelength[i] = pixel_nm(handle, i);
+    return 0;
+}
+
+int AVS_GetNumPixels(int handle, short *numpixels)
+{
+    *numpixels = STUB_PIXELS;
+    return 0;
+}
+
+int AVS_GetParameter(int handle, uint32_t size, uint32_t *reqsize, unsigned char *deviceconfig)
+{
+    *reqsize = STUB_CONFIG_SIZE;
+    if (size < STUB_CONFIG_SIZE)
+        return -9; /* ERR_INVALID_SIZE */
+    sleep_ms(STUB_PARAM_MS);
+    memcpy(deviceconfig, g_config, STUB_CONFIG_SIZE);
+    return 0;
+}
+
+int AVS_SetParameter(int handle, const unsigned char *deviceconfig)
+{
+    sleep_ms(STUB_PARAM_MS);
+    memcpy(g_config, deviceconfig, STUB_CONFIG_SIZE);
+    return 0;
+}
@@ -0,0 +1,213 @@
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+'''
+Acquisition timing: per-stage latency histograms for the hot path
+
+Code on the acquisition path marks its stages with span(stage) around a call
+or add(stage, seconds) / since(stage, start) for a latency measured from an
+earlier time.perf_counter() value, such as the trigger edge. Nothing is
+recorded unless timing is enabled (ACQ_TIMING=1, or enable()); disabled, a
+span costs one flag check and a shared do-nothing context manager.
+
+Stages recorded by the acquisition modules:
+  trigger           LabJack trigger command round trip
+  prepare_measure   AVS_PrepareMeasure
+  measure           AVS_Measure
+  poll_complete     AVS_Measure returned until the scan was ready
+  get_scope_data    reading one scan out of the library
+  frame_arrival     trigger edge until the frame reached the pool
+  disk_write        one write-behind job (image or spectrum)
+  plot_spectrum, plot_histogram, show_frame
+                    drawing on the GUI thread
+  trigger_to_saved  trigger edge until the spectrum of the cycle was written
+'''
+
+TIMING_ENV = "ACQ_TIMING"
+
+# histogram bucket upper bounds in seconds: 1 us to about 17 minutes, four
+# buckets per doubling (19 % wide), plus an overflow bucket
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** (i / 4) for i in range(121))
+
+
+class LatencyHistogram:
+    """
+    Latencies of one stage: counts in BUCKET_BOUNDS for everything recorded,
+    plus the last `recent` values for exact percentiles.
+    """
+
+    def __init__(self, recent=4096):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.recent.append(seconds)
+
+    def stats(self):
+        """count, mean, p50, p99 and max in milliseconds; percentiles over the recent values."""
+        with self._lock:
+            values = np.array(self.recent)
+            count, total, largest = self.count, self.total, self.max
+        if not count:
+            return {"count": 0}
+        p50, p99 = np.percentile(values, [50, 99]) * 1e3
+        return {"count": count, "mean_ms": total / count * 1e3, "p50_ms": float(p50), "p99_ms": float(p99),
+                "max_ms": largest * 1e3}
+
+    def cumulative(self):
+        """(upper bound, count of values up to it) for the non-empty buckets and +Inf, as Prometheus expects."""
+        with self._lock:
+            counts = list(self.counts)
+        buckets, running = [], 0
+        for bound, n in zip(BUCKET_BOUNDS, counts):
+            running += n
+            if n:
+                buckets.append((bound, running))
+        buckets.append((float("inf"), running + counts[-1]))
+        return buckets
+
+
+class _Span:
+    __slots__ = ("timings", "stage", "start")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings.add(self.stage, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Timings:
+    """
+    LatencyHistograms by stage name, created on first use. Safe to record
+    into from any thread.
+    """
+
+    def __init__(self, enabled=False, recent=4096):
+        self.enabled = enabled
+        self.stages = {}
+        self._recent = recent
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, LatencyHistogram(self._recent))
+        return histogram
+
+    def add(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).add(seconds)
+
+    def since(self, stage, start):
+        """Records the time from start (a time.perf_counter() value) until now."""
+        if self.enabled:
+            self.histogram(stage).add(time.perf_counter() - start)
+
+    def span(self, stage):
+        """Context manager recording the time spent inside it."""
+        return _Span(self, stage) if self.enabled else _NULL_SPAN
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def stats(self):
+        """{stage: LatencyHistogram.stats()} in the order the stages were first seen."""
+        return {stage: histogram.stats() for stage, histogram in list(self.stages.items())}
+
+    def summary(self):
+        """Table of the stage statistics, one line per stage."""
+        lines = [f"{'stage':<18}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, stats in self.stats().items():
+            if stats["count"]:
+                lines.append(f"{stage:<18}{stats['count']:>8}{stats['p50_ms']:>10.3f}"
+                             f"{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+        return "\n".join(lines)
+
+    def to_json(self, indent=2):
+        return json.dumps({"stages": self.stats(), "bucket_bounds_s": BUCKET_BOUNDS}, indent=indent)
+
+    def to_prometheus(self, name="acquisition_stage_seconds"):
+        """
+        The histograms in the Prometheus text exposition format, one series
+        per stage with a stage label. Empty buckets are left out, which
+        Prometheus accepts since the counts are cumulative.
+        """
+        lines = [f"# HELP {name} Latency of the acquisition stages.", f"# TYPE {name} histogram"]
+        for stage, histogram in list(self.stages.items()):
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else f"{bound:.9g}"
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        """Writes to_prometheus() for a .prom or .txt path, to_json() otherwise."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+
+# the process-wide timings the acquisition modules record into
+timings = Timings(enabled=os.environ.get(TIMING_ENV, "").lower() not in ("", "0", "no", "false"))
+
+
+def enabled():
+    return timings.enabled
+
+
+def enable(on=True):
+    timings.enabled = on
+
+
+# the module functions check the flag themselves, saving a call when disabled
+def span(stage):
+    return _Span(timings, stage) if timings.enabled else _NULL_SPAN
+
+
+def add(stage, seconds):
+    if timings.enabled:
+        timings.histogram(stage).add(seconds)
+
+
+def since(stage, start):
+    if timings.enabled:
+        timings.histogram(stage).add(time.perf_counter() - start)
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+import timing
+
+'''
+Write-behind queue: images and spectra are handed over here and written to
+disk on background threads, so the acquisition thread never waits on storage
+'''
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of save jobs drained by worker threads.
+
+    Saving takes ownership of the data (arrays are copied unless copy=False),
+    so the caller may reuse its buffers straight away. When max_pending jobs
+    are waiting, submitting blocks until a worker catches up; that
+    backpressure keeps memory bounded when the disk is slower than the
+    acquisition. Jobs run in submission order with the default single worker,
+    which keeps spectra in one file in order.
+
+    Failures never reach the acquisition path: they are counted, kept in
+    errors and passed to on_error(message) on the worker thread (use a Qt
+    signal's emit to get them onto the GUI thread). flush() and close() raise
+    RuntimeError if any save has failed since the last check.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_pending=64, workers=1, on_error=None, name="write-behind"):
+        """
+        :param max_pending: jobs that may wait before submit blocks
+        :param workers: number of writer threads. cv2.imwrite and the file
+        writers release the GIL, so more than one helps for large images, at
+        the cost of ordering between jobs. A DataSaver appends one spectrum
+        at a time whatever the number of workers
+        :param on_error: optional callable(message) for failed saves
+        """
+        self.on_error = on_error
+        self.errors = []
+        self.written = 0
+        self.failed = 0
+        self.blocked_time = 0.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._unchecked = 0
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, description, fn, *args, timeout=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a Future for its result.
+
+        :param description: what is being saved, used in error messages
+        :param timeout: seconds to wait for room in the queue before raising
+        queue.Full, None waits as long as it takes
+        """
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        future = Future()
+        job = (description, fn, args, kwargs, future)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(job, timeout=timeout)
+            self.blocked_time += time.perf_counter() - start
+        return future
+
+    def save_image(self, path, image, copy=True, params=()):
+        """Writes image with cv2.imwrite in the background; the format follows the extension."""
+        if copy:
+            image = np.array(image, copy=True)
+        return self.submit(f"image {path}", _write_image, path, image, params)
+
+    def save_spectrum(self, saver, wavelengths, intensities, timestamp=0, copy=True, **columns):
+        """
+        Calls saver.save_spectrum (a spectrum_storage.DataSaver) in the
+        background, passing on any extra columns. The Future resolves to the
+        file path.
+        """
+        if copy:
+            intensities = np.array(intensities, copy=True)
+        return self.submit("spectrum", saver.save_spectrum, wavelengths, intensities, timestamp, **columns)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def stats(self):
+        return {"pending": self.pending(), "written": self.written, "failed": self.failed,
+                "blocked_time": self.blocked_time}
+
+    def flush(self):
+        """Waits until every queued job has run, then reports failures."""
+        self._queue.join()
+        self._raise_errors()
+
+    def close(self):
+        """Flushes the queue and stops the workers. Safe to call twice."""
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(self._STOP)
+            for thread in self._threads:
+                thread.join()
+        self._raise_errors()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_errors(self):
+        with self._lock:
+            new = self.errors[len(self.errors) - self._unchecked:] if self._unchecked else []
+            self._unchecked = 0
+        if new:
+            raise RuntimeError(f"{len(new)} save(s) failed, first: {new[0]}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is self._STOP:
+                    return
+                description, fn, args, kwargs, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with timing.span("disk_write"):
+                        result = fn(*args, **kwargs)
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+                    self._report(f"{description}: {e}")
+                else:
+                    with self._lock:
+                        self.written += 1
+            finally:
+                self._queue.task_done()
+
+    def _report(self, message):
+        with self._lock:
+            self.failed += 1
+            self.errors.append(message)
+            self._unchecked += 1
+        if self.on_error is not None:
+            try:
+                self.on_error(message)
+            except Exception:
+                traceback.print_exc()
+
+
+def _write_image(path, image, params):
+    if not cv2.imwrite(path, image, list(params)):
+        raise OSError(f"cv2.imwrite could not write {path}")
+    return path